@@ -0,0 +1,199 @@
+"""
+Benchmark of the copy pipeline (copy_preview + copy_dataset) against local
+geonetwork and geoserver stubs
+
+Usage (from the backend folder):
+
+    python -m benchmarks.bench_copy --layers 1,10,100,500 --mef-mb 1,10,50 \\
+        --iterations 5 --latency-ms 5 --output bench_copy.json
+
+Reports for each scenario the throughput, p50/p99 latency of the preview and
+copy steps, the number of upstream requests and the peak RSS of the process.
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+from io import BytesIO
+from time import perf_counter
+from typing import Any
+from zipfile import ZipFile
+import yaml
+from maelstro.core import CopyManager
+from maelstro.core.georchestra import GeorchestraHandler
+from maelstro.core.operations import LogCollectionHandler
+from maelstro.core.record_cache import get_record_cache
+from .data import get_metadata_path, synthetic_mef
+from .stubs import GeonetworkStub, GeoserverStub
+
+SRC_NAME = "BenchSource"
+DST_NAME = "BenchDestination"
+WORKSPACE = "bench"
+UUID = "bench"
+
+
+def write_config(stubs: list[Any], use_cache: bool) -> str:
+    """
+    Config of the stubs (source geonetwork and geoserver, destination
+    geonetwork and geoserver), read by maelstro on first use
+    """
+    gn_src, gs_src, gn_dst, gs_dst = stubs
+    credentials = {"login": "bench", "password": "bench"}
+    bench_config: dict[str, Any] = {
+        "sources": {
+            "geonetwork_instances": [
+                {"name": SRC_NAME, "api_url": gn_src.api_url, **credentials}
+            ],
+            "geoserver_instances": [{"url": gs_src.url, **credentials}],
+        },
+        "destinations": {
+            DST_NAME: {
+                "geonetwork": {"api_url": gn_dst.api_url, **credentials},
+                "geoserver": {"url": gs_dst.url, **credentials},
+            }
+        },
+    }
+    if not use_cache:
+        bench_config["caching"] = {"records": {"ttl": 0}}
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".yaml", delete=False, encoding="utf8"
+    ) as cf:
+        yaml.dump(bench_config, cf)
+    return cf.name
+
+
+def percentile(values: list[float], pct: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is given in kB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_scenario(
+    stubs: list[Any],
+    layer_count: int,
+    mef_size: int,
+    iterations: int,
+    include_layers: bool,
+    include_styles: bool,
+) -> dict[str, Any]:
+    gn_src, gs_src, _, _ = stubs
+    gn_src.mef = synthetic_mef(
+        layer_count=layer_count,
+        mef_size=mef_size,
+        gs_url=gs_src.url,
+        workspace=WORKSPACE,
+    )
+    with ZipFile(BytesIO(gn_src.mef)) as zf:
+        gn_src.xml = zf.read(get_metadata_path(gn_src.mef))
+    get_record_cache().clear()
+
+    durations: dict[str, list[float]] = {"preview": [], "copy": [], "total": []}
+    request_counts = []
+    start = perf_counter()
+    for _ in range(iterations):
+        count_before = sum(stub.request_count for stub in stubs)
+        geo_hnd = GeorchestraHandler(LogCollectionHandler())
+        t0 = perf_counter()
+        CopyManager(SRC_NAME, DST_NAME, UUID, geo_hnd).copy_preview(
+            True, include_layers, include_styles
+        )
+        t1 = perf_counter()
+        CopyManager(SRC_NAME, DST_NAME, UUID, geo_hnd).copy_dataset(
+            True, include_layers, include_styles
+        )
+        t2 = perf_counter()
+        geo_hnd.log_handler.close()
+        durations["preview"].append(t1 - t0)
+        durations["copy"].append(t2 - t1)
+        durations["total"].append(t2 - t0)
+        request_counts.append(sum(stub.request_count for stub in stubs) - count_before)
+    wall_time = perf_counter() - start
+
+    return {
+        "layers": layer_count,
+        "mef_bytes": len(gn_src.mef),
+        "iterations": iterations,
+        "throughput_per_s": round(iterations / wall_time, 3),
+        "latency_ms": {
+            step: {
+                "p50": round(percentile(values, 50) * 1000, 1),
+                "p99": round(percentile(values, 99) * 1000, 1),
+            }
+            for step, values in durations.items()
+        },
+        "upstream_requests": max(request_counts),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv: list[str] | None = None) -> list[dict[str, Any]]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--layers", type=int_list, default=[1, 10, 100])
+    parser.add_argument("--mef-mb", type=int_list, default=[1, 10])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--no-layers", action="store_true")
+    parser.add_argument("--no-styles", action="store_true")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="deactivate the records cache"
+    )
+    parser.add_argument("--output", help="json file for the results")
+    args = parser.parse_args(argv)
+
+    latency = args.latency_ms / 1000
+    stubs: list[Any] = [
+        GeonetworkStub(b"", b"", latency).start(),
+        GeoserverStub(latency).start(),
+        GeonetworkStub(b"", b"", latency).start(),
+        GeoserverStub(latency, existing=True).start(),
+    ]
+    config_path = write_config(stubs, use_cache=not args.no_cache)
+    os.environ["MAELSTRO_CONFIG"] = config_path
+    results = []
+    try:
+        for mef_mb in args.mef_mb:
+            for layer_count in args.layers:
+                result = run_scenario(
+                    stubs,
+                    layer_count,
+                    mef_mb * 1024 * 1024,
+                    args.iterations,
+                    not args.no_layers,
+                    not args.no_styles,
+                )
+                results.append(result)
+                print(
+                    f"layers={result['layers']:4d} mef={mef_mb:3d}MB "
+                    f"copies/s={result['throughput_per_s']:8.3f} "
+                    f"total p50={result['latency_ms']['total']['p50']:9.1f}ms "
+                    f"p99={result['latency_ms']['total']['p99']:9.1f}ms "
+                    f"requests={result['upstream_requests']:5d} "
+                    f"rss={result['peak_rss_mb']:.0f}MB",
+                    file=sys.stderr,
+                )
+    finally:
+        for stub in stubs:
+            stub.stop()
+        os.remove(config_path)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as of:
+            json.dump(results, of, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Micro-benchmarks of the metadata processing (parsing, XPath queries, XSLT and zip update)
+
+Usage (from the backend folder):
+
+    python -m benchmarks.bench_meta --resources 0,1000,5000 --repeat 5 \\
+        --query-backends lxml,saxon \\
+        --output bench_meta.json [--compare previous_bench_meta.json]
+
+The records are the test MEF archives, optionally enlarged with synthetic
+online resources. Each operation runs on a fresh copy of the parsed record,
+the copy is not included in the timings. Each record is measured with each
+backend of the read-only queries, the XSLT chain and url replacement always
+use Saxon.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+from typing import Any, Callable
+from saxonche import PySaxonProcessor
+from maelstro.metadata import Meta, MetaXml
+from maelstro.metadata.queries import DEFAULT_QUERY_BACKEND, QUERY_BACKENDS
+from .data import TESTS_DIR, read_test_mef, synthetic_mef
+
+XSLT_CHAIN = [
+    os.path.join(TESTS_DIR, "test_public_to_prod.xsl"),
+    os.path.join(TESTS_DIR, "test_prod_to_final_prod.xsl"),
+]
+URL_MAPPING = {
+    "sources": ["https://public.sig.rennesmetropole.fr/geoserver"],
+    "destinations": ["https://prod.sig.rennesmetropole.fr/geoserver"],
+}
+TEST_MEFS = {
+    "iso19139": "demo_iso19139.zip",
+    "iso19115-3.2018": "lille_iso19115-3.zip",
+}
+
+
+def operations() -> dict[str, Callable[[Meta], Any]]:
+    # the MetaXml operations do not update the zip archive,
+    # so that update_zip is measured separately
+    return {
+        "get_title": lambda meta: meta.get_title(),
+        "get_ogc_geoserver_layers": lambda meta: meta.get_ogc_geoserver_layers(),
+        "apply_xslt_chain": lambda meta: MetaXml.apply_xslt_chain(meta, XSLT_CHAIN),
+        "replace_geoserver_src_by_dst_urls": (
+            lambda meta: MetaXml.replace_geoserver_src_by_dst_urls(meta, URL_MAPPING)
+        ),
+        "update_zip": lambda meta: meta.update_zip(),
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> dict[str, float]:
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        durations.append((perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(durations), 3),
+        "median_ms": round(statistics.median(durations), 3),
+        "mean_ms": round(statistics.mean(durations), 3),
+    }
+
+
+def bench_record(
+    schema: str,
+    resources: int,
+    repeat: int,
+    query_backend: str = DEFAULT_QUERY_BACKEND,
+) -> dict[str, Any]:
+    if resources:
+        mef = synthetic_mef(schema, resources)
+    else:
+        mef = read_test_mef(TEST_MEFS[schema])
+    meta = Meta(mef, query_backend)
+    results = {"parse": measure(lambda: Meta(mef, query_backend), repeat)}
+    for name, operation in operations().items():
+        copies = [meta.clone() for _ in range(repeat)]
+        results[name] = measure(lambda: operation(copies.pop()), repeat)
+    return {
+        "schema": schema,
+        "resources": resources,
+        "query_backend": query_backend,
+        "xml_bytes": len(meta.xml_bytes),
+        "ogc_layers": len(meta.get_ogc_geoserver_layers()),
+        "operations": results,
+    }
+
+
+def get_version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def record_key(record: dict[str, Any]) -> tuple[str, int, str]:
+    # runs without query_backend predate the lxml backend
+    return record["schema"], record["resources"], record.get("query_backend", "saxon")
+
+
+def print_ratios(label: str, record: dict[str, Any], reference: dict[str, Any]) -> None:
+    for name, timing in record["operations"].items():
+        ref_timing = reference["operations"].get(name)
+        if ref_timing is None or not ref_timing["median_ms"]:
+            continue
+        ratio = timing["median_ms"] / ref_timing["median_ms"]
+        print(
+            f"{record['schema']:16s} {record['resources']:6d} {label:12s} {name:34s} "
+            f"{ref_timing['median_ms']:10.3f}ms -> {timing['median_ms']:10.3f}ms "
+            f"x{ratio:.2f}",
+            file=sys.stderr,
+        )
+
+
+def compare(results: list[dict[str, Any]], previous: list[dict[str, Any]]) -> None:
+    """
+    Print the ratio of the median durations to those of a previous run
+    """
+    previous_records = {record_key(rec): rec for rec in previous}
+    for record in results:
+        prev = previous_records.get(record_key(record))
+        if prev is not None:
+            print_ratios(record_key(record)[2], record, prev)
+
+
+def compare_backends(results: list[dict[str, Any]]) -> None:
+    """
+    Print the ratio of the median durations of each query backend to those
+    of the saxon backend on the same record
+    """
+    saxon_records = {
+        record_key(rec)[:2]: rec for rec in results if record_key(rec)[2] == "saxon"
+    }
+    for record in results:
+        saxon = saxon_records.get(record_key(record)[:2])
+        if saxon is not None and saxon is not record:
+            print_ratios(f"{record['query_backend']}/saxon", record, saxon)
+
+
+def main(argv: list[str] | None = None) -> dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--resources",
+        type=lambda value: [int(v) for v in value.split(",") if v],
+        default=[0, 1000, 5000],
+        help="number of synthetic online resources, 0 for the original records",
+    )
+    parser.add_argument(
+        "--schemas", type=lambda v: v.split(","), default=list(TEST_MEFS)
+    )
+    parser.add_argument(
+        "--query-backends",
+        type=lambda v: v.split(","),
+        default=list(QUERY_BACKENDS),
+        help="backends of the read-only queries (title, links, schema)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="json file for the results")
+    parser.add_argument("--compare", help="json file of a previous run")
+    args = parser.parse_args(argv)
+
+    records = []
+    for schema in args.schemas:
+        for resources in args.resources:
+            for query_backend in args.query_backends:
+                record = bench_record(schema, resources, args.repeat, query_backend)
+                records.append(record)
+                for name, timing in record["operations"].items():
+                    print(
+                        f"{schema:16s} {resources:6d} {query_backend:6s} {name:34s} "
+                        f"median={timing['median_ms']:10.3f}ms "
+                        f"min={timing['min_ms']:10.3f}ms",
+                        file=sys.stderr,
+                    )
+
+    report = {
+        "version": get_version(),
+        "python": platform.python_version(),
+        "saxon": PySaxonProcessor(license=False).version,
+        "repeat": args.repeat,
+        "records": records,
+    }
+    compare_backends(records)
+    if args.compare:
+        with open(args.compare, encoding="utf8") as pf:
+            compare(records, json.load(pf)["records"])
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as of:
+            json.dump(report, of, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
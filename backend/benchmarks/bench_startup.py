@@ -0,0 +1,183 @@
+"""
+Benchmark of the cold start of the backend
+
+Usage (from the backend folder):
+
+    python -m benchmarks.bench_startup --repeat 5 [--unreachable-db] --output bench_startup.json
+
+Each run starts a new python process, as a new worker or pod would. Reports the
+import time of maelstro.main with the slowest imports of the maelstro modules
+(from `python -X importtime`), and the time until a uvicorn server answers on /health.
+With --unreachable-db, the config contains a DB which cannot be reached, which
+must not delay the startup.
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+import requests
+import yaml
+
+# self and cumulative times in us, nested imports are indented by 2 spaces per level
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+HEALTH_TIMEOUT = 60
+
+
+def write_config(unreachable_db: bool) -> str:
+    bench_config: dict[str, Any] = {
+        "sources": {"geonetwork_instances": [], "geoserver_instances": []},
+        "destinations": {},
+    }
+    if unreachable_db:
+        # nothing listens on port 1
+        bench_config["db_logging"] = {"host": "127.0.0.1", "port": 1}
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".yaml", delete=False, encoding="utf8"
+    ) as cf:
+        yaml.dump(bench_config, cf)
+    return cf.name
+
+
+def measure_import(
+    env: dict[str, str], module: str = "maelstro.main"
+) -> tuple[float, dict[str, float]]:
+    """
+    Import time of the module in ms, and cumulative time in ms of each module
+    directly imported by the maelstro modules
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    total = 0.0
+    imports: dict[str, float] = {}
+    children: dict[str, float] = {}
+    # nested imports are listed before the module which imports them
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        duration = int(match.group(2)) / 1000
+        if len(match.group(3)) == 2:
+            children[match.group(4)] = duration
+        elif not match.group(3):
+            # the maelstro package is imported before the module itself
+            if match.group(4).split(".")[0] == "maelstro":
+                total += duration
+                imports.update(children)
+            children = {}
+    return total, imports
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def measure_health(env: dict[str, str]) -> float:
+    """
+    Time in ms from the start of the server process to the first answer on /health
+    """
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "maelstro.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < HEALTH_TIMEOUT:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                    return (time.perf_counter() - start) * 1000
+            except requests.ConnectionError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("Server process exited during startup")
+            time.sleep(0.01)
+        raise RuntimeError(f"Server not healthy after {HEALTH_TIMEOUT}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv: list[str] | None = None) -> dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--unreachable-db",
+        action="store_true",
+        help="configure DB logging with a DB which cannot be reached",
+    )
+    parser.add_argument("--top", type=int, default=10, help="number of imports shown")
+    parser.add_argument("--output", help="json file for the results")
+    args = parser.parse_args(argv)
+
+    config_path = write_config(args.unreachable_db)
+    env = {**os.environ, "MAELSTRO_CONFIG": config_path}
+    import_ms: list[float] = []
+    health_ms: list[float] = []
+    imports: dict[str, list[float]] = {}
+    try:
+        for _ in range(args.repeat):
+            total, top_level = measure_import(env)
+            import_ms.append(total)
+            for name, duration in top_level.items():
+                imports.setdefault(name, []).append(duration)
+            health_ms.append(measure_health(env))
+    finally:
+        os.remove(config_path)
+
+    slowest = sorted(
+        ((name, statistics.median(values)) for name, values in imports.items()),
+        key=lambda item: -item[1],
+    )[: args.top]
+    report = {
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "unreachable_db": args.unreachable_db,
+        "import_ms": {
+            "median": round(statistics.median(import_ms), 1),
+            "max": round(max(import_ms), 1),
+        },
+        "health_ms": {
+            "median": round(statistics.median(health_ms), 1),
+            "max": round(max(health_ms), 1),
+        },
+        "slowest_imports_ms": {name: round(value, 1) for name, value in slowest},
+    }
+    print(
+        f"import maelstro.main: {report['import_ms']['median']:8.1f}ms   "
+        f"first /health answer: {report['health_ms']['median']:8.1f}ms",
+        file=sys.stderr,
+    )
+    for name, value in report["slowest_imports_ms"].items():
+        print(f"  {name:40s} {value:8.1f}ms", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as of:
+            json.dump(report, of, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Synthetic metadata records for benchmarks, derived from the test MEF archives
+"""
+
+import os
+import re
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests")
+
+ONLINE_RESOURCE_ISO19139 = """<gmd:onLine>
+            <gmd:CI_OnlineResource>
+              <gmd:linkage>
+                <gmd:URL>{url}</gmd:URL>
+              </gmd:linkage>
+              <gmd:protocol>
+                <gco:CharacterString>{protocol}</gco:CharacterString>
+              </gmd:protocol>
+              <gmd:name>
+                <gco:CharacterString>{name}</gco:CharacterString>
+              </gmd:name>
+              <gmd:description>
+                <gco:CharacterString>{description}</gco:CharacterString>
+              </gmd:description>
+            </gmd:CI_OnlineResource>
+          </gmd:onLine>"""
+
+ONLINE_RESOURCE_ISO19115_3 = """<mrd:onLine>
+            <cit:CI_OnlineResource>
+              <cit:linkage>
+                <gco:CharacterString>{url}</gco:CharacterString>
+              </cit:linkage>
+              <cit:protocol>
+                <gco:CharacterString>{protocol}</gco:CharacterString>
+              </cit:protocol>
+              <cit:name>
+                <gco:CharacterString>{name}</gco:CharacterString>
+              </cit:name>
+              <cit:description>
+                <gco:CharacterString>{description}</gco:CharacterString>
+              </cit:description>
+            </cit:CI_OnlineResource>
+          </mrd:onLine>"""
+
+ONLINE_RESOURCE_TEMPLATES = {
+    "iso19139": (ONLINE_RESOURCE_ISO19139, r"<gmd:onLine>.*?</gmd:onLine>"),
+    "iso19115-3.2018": (ONLINE_RESOURCE_ISO19115_3, r"<mrd:onLine>.*?</mrd:onLine>"),
+}
+
+
+def read_test_mef(file_name: str = "demo_iso19139.zip") -> bytes:
+    with open(os.path.join(TESTS_DIR, file_name), "rb") as zf:
+        return zf.read()
+
+
+def get_metadata_path(mef: bytes) -> str:
+    with ZipFile(BytesIO(mef)) as zf:
+        return next(n for n in zf.namelist() if n.endswith("/metadata/metadata.xml"))
+
+
+def online_resources(
+    schema: str,
+    count: int,
+    url: str = "https://public.sig.rennesmetropole.fr/geoserver/ows",
+    workspace: str = "bench",
+    ogc_ratio: float = 1.0,
+) -> list[str]:
+    """
+    Online resources for layers <workspace>:layer_<i>, only the first
+    count * ogc_ratio resources use an OGC protocol
+    """
+    template = ONLINE_RESOURCE_TEMPLATES[schema][0]
+    return [
+        template.format(
+            url=url,
+            protocol="OGC:WMS" if i < count * ogc_ratio else "WWW:LINK",
+            name=f"{workspace}:layer_{i}",
+            description=f"Layer {i}",
+        )
+        for i in range(count)
+    ]
+
+
+def with_online_resources(xml: str, schema: str, resources: list[str]) -> str:
+    """
+    Replace the online resources of the record by the given ones
+    """
+    pattern = ONLINE_RESOURCE_TEMPLATES[schema][1]
+    first = re.search(pattern, xml, re.S)
+    if first is None:
+        raise ValueError("No online resource in template record")
+    tail = re.sub(pattern, "", xml[first.start() :], flags=re.S)
+    return xml[: first.start()] + "\n".join(resources) + tail
+
+
+def build_mef(template: bytes, xml: str | None = None, padding_bytes: int = 0) -> bytes:
+    """
+    Copy of the template MEF archive with the given metadata and an optional
+    incompressible attachment to reach a given archive size
+    """
+    md_path = get_metadata_path(template)
+    new_bytes = BytesIO()
+    with ZipFile(BytesIO(template)) as zf_src:
+        with ZipFile(new_bytes, "w", compression=ZIP_DEFLATED) as zf_dst:
+            for file_info in zf_src.infolist():
+                if file_info.is_dir():
+                    zf_dst.mkdir(file_info)
+                elif file_info.filename == md_path and xml is not None:
+                    zf_dst.writestr(file_info.filename, xml.encode("utf-8"))
+                else:
+                    zf_dst.writestr(file_info, zf_src.read(file_info))
+            if padding_bytes > 0:
+                zf_dst.writestr(
+                    md_path.replace("metadata/metadata.xml", "public/padding.bin"),
+                    os.urandom(padding_bytes),
+                    compress_type=ZIP_STORED,
+                )
+    return new_bytes.getvalue()
+
+
+def synthetic_mef(
+    schema: str = "iso19139",
+    layer_count: int = 1,
+    mef_size: int = 0,
+    gs_url: str = "https://public.sig.rennesmetropole.fr/geoserver",
+    workspace: str = "bench",
+    ogc_ratio: float = 1.0,
+) -> bytes:
+    template_name = {
+        "iso19139": "demo_iso19139.zip",
+        "iso19115-3.2018": "lille_iso19115-3.zip",
+    }[schema]
+    template = read_test_mef(template_name)
+    with ZipFile(BytesIO(template)) as zf:
+        xml = zf.read(get_metadata_path(template)).decode("utf-8")
+    resources = online_resources(
+        schema, layer_count, f"{gs_url}/ows", workspace, ogc_ratio
+    )
+    mef = build_mef(template, with_online_resources(xml, schema, resources))
+    if len(mef) < mef_size:
+        mef = build_mef(
+            template,
+            with_online_resources(xml, schema, resources),
+            mef_size - len(mef),
+        )
+    return mef
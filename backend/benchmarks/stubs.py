@@ -0,0 +1,271 @@
+"""
+Local stand-ins for the geonetwork and geoserver REST APIs used by the copy pipeline
+
+Each stub runs in a background thread on a free local port and answers with
+synthetic data after a configurable latency.
+"""
+
+import json
+import re
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Any
+from urllib.parse import urlparse
+
+GN_PATH = "/geonetwork/srv/api"
+GS_PATH = "/geoserver"
+HOST = "127.0.0.1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    stub: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=W0622
+        pass
+
+    def reply(
+        self,
+        status: int = 200,
+        body: bytes | str | dict[str, Any] = b"",
+        content_type: str = "application/json",
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        if isinstance(body, dict):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_any(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.stub.request_count += 1
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        self.stub.route(self, self.command, urlparse(self.path).path)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_any
+
+
+class StubServer(ABC):
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.request_count = 0
+        handler = type("Handler", (StubHandler,), {"stub": self})
+        self.server = ThreadingHTTPServer((HOST, 0), handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{HOST}:{self.server.server_port}"
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @abstractmethod
+    def route(self, hnd: StubHandler, method: str, path: str) -> None:
+        """
+        Answer the request of the handler
+        """
+
+
+class GeonetworkStub(StubServer):
+    """
+    Serves the same MEF archive for every record uuid
+    """
+
+    def __init__(self, mef: bytes, xml: bytes, latency: float = 0):
+        super().__init__(latency)
+        self.mef = mef
+        self.xml = xml
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}{GN_PATH}"
+
+    def route(self, hnd: StubHandler, method: str, path: str) -> None:
+        path = path.removeprefix(GN_PATH)
+        cookie = {"Set-Cookie": "XSRF-TOKEN=bench; Path=/"}
+        if path == "/site":
+            hnd.reply(body={"system/platform/version": "4.2.2"}, headers=cookie)
+        elif path == "/me":
+            hnd.reply(body={"username": "bench"}, headers=cookie)
+        elif path.endswith("/_search"):
+            hnd.reply(
+                body={
+                    "hits": {
+                        "total": {"value": 1},
+                        "hits": [
+                            {
+                                "_id": "bench",
+                                "_source": {
+                                    "uuid": "bench",
+                                    "dateStamp": "2025-01-01T00:00:00",
+                                },
+                            }
+                        ],
+                    }
+                }
+            )
+        elif method == "POST" and path == "/records":
+            hnd.reply(
+                body={"errors": [], "metadataInfos": {"101": [{"uuid": "101"}]}},
+                headers=cookie,
+            )
+        elif path.endswith("/formatters/xml"):
+            hnd.reply(body=self.xml, content_type="application/xml")
+        elif path.startswith("/records/"):
+            if "json" in (hnd.headers.get("Accept") or ""):
+                hnd.reply(body={"gmd:fileIdentifier": {}})
+            else:
+                hnd.reply(body=self.mef, content_type="application/zip")
+        else:
+            hnd.reply(body={}, headers=cookie)
+
+
+class GeoserverStub(StubServer):
+    """
+    Synthetic geoserver in which every layer <ws>:<name> exists, with one
+    featureType in the datastore <ws>_store and one style <name>_style.
+    As a destination, `existing` tells whether resources and layers already exist.
+    """
+
+    def __init__(self, latency: float = 0, existing: bool = True):
+        super().__init__(latency)
+        self.existing = existing
+        self.write_count = 0
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}{GS_PATH}"
+
+    def layer(self, workspace: str, name: str) -> dict[str, Any]:
+        rest = f"{self.url}/rest"
+        return {
+            "layer": {
+                "name": name,
+                "type": "VECTOR",
+                "defaultStyle": {
+                    "name": f"{workspace}:{name}_style",
+                    "workspace": workspace,
+                    "href": f"{rest}/workspaces/{workspace}/styles/{name}_style.json",
+                },
+                "resource": {
+                    "@class": "featureType",
+                    "name": f"{workspace}:{name}",
+                    "href": (
+                        f"{rest}/workspaces/{workspace}/datastores/{workspace}_store"
+                        f"/featuretypes/{name}.json"
+                    ),
+                },
+            }
+        }
+
+    def feature_type(self, workspace: str, name: str) -> dict[str, Any]:
+        return {
+            "featureType": {
+                "name": name,
+                "nativeName": name,
+                "store": {
+                    "@class": "dataStore",
+                    "name": f"{workspace}:{workspace}_store",
+                    "href": (
+                        f"{self.url}/rest/workspaces/{workspace}"
+                        f"/datastores/{workspace}_store.json"
+                    ),
+                },
+            }
+        }
+
+    def route(self, hnd: StubHandler, method: str, path: str) -> None:
+        path = path.removeprefix(GS_PATH)
+        if method in ["POST", "PUT", "DELETE"]:
+            self.write_count += 1
+            hnd.reply(
+                201 if method == "POST" else 200, body="", content_type="text/plain"
+            )
+            return
+        if path == "/rest/about/version.json":
+            hnd.reply(
+                body={
+                    "about": {"resource": [{"@name": "GeoServer", "Version": "2.26.0"}]}
+                }
+            )
+        elif match := re.fullmatch(r"/rest/layers/([^:/]+):([^/]+?)(\.json)?", path):
+            if not self.existing and match.group(3) is None:
+                hnd.reply(404, body="", content_type="text/plain")
+            else:
+                hnd.reply(body=self.layer(match.group(1), match.group(2)))
+        elif match := re.fullmatch(
+            r"/rest/workspaces/([^/]+)/datastores/[^/]+/featuretypes/([^/]+)\.(json|xml)",
+            path,
+        ):
+            workspace, name, ext = match.groups()
+            if ext == "xml":
+                hnd.reply(
+                    body=(
+                        f"<featureType><name>{name}</name><nativeName>{name}</nativeName>"
+                        "<attributes><attribute><name>geom</name></attribute>"
+                        "</attributes></featureType>"
+                    ),
+                    content_type="application/xml",
+                )
+            elif not self.existing:
+                hnd.reply(404, body="", content_type="text/plain")
+            else:
+                hnd.reply(body=self.feature_type(workspace, name))
+        elif match := re.fullmatch(
+            r"/rest/workspaces/([^/]+)/datastores/([^/]+)\.json", path
+        ):
+            workspace, store = match.groups()
+            hnd.reply(
+                body={
+                    "dataStore": {
+                        "name": store,
+                        "workspace": {
+                            "name": workspace,
+                            "href": f"{self.url}/rest/workspaces/{workspace}.json",
+                        },
+                    }
+                }
+            )
+        elif match := re.fullmatch(
+            r"/rest/workspaces/([^/]+)/styles/([^/]+)\.(json|sld)", path
+        ):
+            workspace, style, ext = match.groups()
+            if ext == "sld":
+                hnd.reply(
+                    body=f"<StyledLayerDescriptor><Name>{style}</Name></StyledLayerDescriptor>",
+                    content_type="application/vnd.ogc.sld+xml",
+                )
+            else:
+                hnd.reply(
+                    body={
+                        "style": {
+                            "name": style,
+                            "workspace": {"name": workspace},
+                            "format": "sld",
+                            "languageVersion": {"version": "1.0.0"},
+                            "filename": f"{style}.sld",
+                        }
+                    }
+                )
+        elif match := re.fullmatch(r"/rest/workspaces/([^/.]+)(\.json)?", path):
+            hnd.reply(body={"workspace": {"name": match.group(1)}})
+        else:
+            hnd.reply(404, body="", content_type="text/plain")
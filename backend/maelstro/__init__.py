@@ -1,9 +1,11 @@
 """
 Entry point scripts for maelstro backend server
+
+uvicorn is only imported by the entry points: importing any maelstro module
+(e.g. maelstro.main in a worker) does not load it.
 """
 
-import uvicorn
-from fastapi_cli.utils.cli import get_uvicorn_log_config
+# pylint: disable=import-outside-toplevel
 
 
 def dev() -> None:
@@ -13,6 +15,9 @@ def dev() -> None:
     - listens only on localhost
     - restarts on code change
     """
+    import uvicorn
+    from fastapi_cli.utils.cli import get_uvicorn_log_config
+
     uvicorn.run(
         app="maelstro.main:app",
         host="127.0.0.1",
@@ -31,6 +36,9 @@ def docker_dev() -> None:
     special configuration:
     - restarts on code change
     """
+    import uvicorn
+    from fastapi_cli.utils.cli import get_uvicorn_log_config
+
     uvicorn.run(
         app="maelstro.main:app",
         host="0.0.0.0",
@@ -47,6 +55,9 @@ def prod() -> None:
     """
     Server entrypoint for running the server inside a docker container:
     """
+    import uvicorn
+    from fastapi_cli.utils.cli import get_uvicorn_log_config
+
     uvicorn.run(
         app="maelstro.main:app",
         host="0.0.0.0",
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from time import monotonic
+from typing import Callable, Generic, Hashable, TypeVar
+from maelstro.metrics import CACHE_REQUESTS
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TtlCache(Generic[K, V]):
+    """
+    Thread-safe in-memory cache with a time-to-live per entry.
+    When more than max_entries are stored, or when the total size of the entries
+    (computed with sizeof) exceeds max_bytes, the least recently used entries are dropped.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 128,
+        max_bytes: int | None = None,
+        sizeof: Callable[[V], int] | None = None,
+        name: str | None = None,
+    ):
+        self.ttl = ttl
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries: OrderedDict[K, tuple[float, int, V]] = OrderedDict()
+        self._pending: dict[K, Future[V]] = {}
+        self._lock = Lock()
+
+    def get(self, key: K) -> V | None:
+        value = self._get(key)
+        if self.name is not None:
+            CACHE_REQUESTS.labels(self.name, "miss" if value is None else "hit").inc()
+        return value
+
+    def _get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expiry, _, value = entry
+            if expiry < monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.ttl <= 0:
+            return
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # never evict the whole cache for a single oversized entry
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (monotonic() + self.ttl, size, value)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def get_or_compute(self, key: K, compute: Callable[[], V]) -> V:
+        """
+        Return the cached value or compute it. Concurrent calls for the same missing
+        key are coalesced: only the first one computes, the others wait for its result.
+        Exceptions are propagated to all waiting callers and not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            pending = self._pending.get(key)
+            is_owner = pending is None
+            if pending is None:
+                pending = Future()
+                self._pending[key] = pending
+        if not is_owner:
+            return pending.result()
+        try:
+            value = compute()
+            self.set(key, value)
+            pending.set_result(value)
+            return value
+        except BaseException as err:
+            pending.set_exception(err)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def _pop(self, key: K) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,85 @@
+from concurrent.futures import (
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+)
+from contextvars import copy_context
+from typing import Any, Callable, Hashable, Iterable, TypeVar
+
+
+T = TypeVar("T")
+
+
+def submit_in_context(
+    executor: Executor, fn: Callable[..., T], *args: Any, **kwargs: Any
+) -> Future[T]:
+    """
+    Submit a call to the executor within a copy of the current context.
+
+    Worker threads do not inherit context vars, which are needed by the
+    LogCollectionHandler to attribute API calls to the current request.
+    """
+    ctx = copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+class TaskGraph:
+    """
+    Tasks with dependencies between them: each task is started once all the tasks
+    it depends on are finished, independent tasks run concurrently.
+
+    When a task fails, no further task is started and the first error is raised
+    once the running tasks are finished.
+    """
+
+    def __init__(self) -> None:
+        self.tasks: dict[Hashable, tuple[Callable[[], Any], set[Hashable]]] = {}
+
+    def add(
+        self,
+        key: Hashable,
+        task: Callable[[], Any],
+        depends_on: Iterable[Hashable] = (),
+    ) -> None:
+        self.tasks[key] = (task, set(depends_on))
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def run(self, max_workers: int) -> None:
+        for key, (_, depends_on) in self.tasks.items():
+            unknown = depends_on - self.tasks.keys()
+            if unknown:
+                raise ValueError(f"Task {key} depends on unknown tasks {unknown}")
+
+        pending = dict(self.tasks)
+        done: set[Hashable] = set()
+        running: dict[Future[Any], Hashable] = {}
+        error: BaseException | None = None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                if error is None:
+                    ready = [
+                        key
+                        for key, (_, depends_on) in pending.items()
+                        if depends_on <= done
+                    ]
+                    for key in ready:
+                        task, _ = pending.pop(key)
+                        running[submit_in_context(executor, task)] = key
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    task_error = future.exception()
+                    if task_error is None:
+                        done.add(key)
+                    elif error is None:
+                        error = task_error
+        if error is not None:
+            raise error
+        if pending:
+            raise ValueError(f"Cyclic dependencies between tasks {set(pending)}")
@@ -69,6 +69,25 @@ class TransformationResponse(BaseModel):
     ]
 
 
+class ServerCheck(BaseModel):
+    role: Literal["source", "destination"]
+    kind: Literal["geonetwork", "geoserver"]
+    name: str
+    url: str
+    reachable: bool
+    auth: Literal["valid", "invalid", "anonymous", "unchecked"]
+    version: Optional[str] = None
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ConfigCheckResponse(BaseModel):
+    valid: bool
+    checked_at: datetime
+    cached: bool = False
+    servers: list[ServerCheck]
+
+
 class Metadata(BaseModel):
     title: str
     iso_standard: Optional[str] = ""
@@ -81,10 +100,24 @@ class LinkedLayer(BaseModel):
     protocol: str
 
 
+class LayersQuery(BaseModel):
+    uuids: list[str] = []
+    search: Optional[SearchQuery] = None
+
+
+class RecordLayers(BaseModel):
+    uuid: str
+    layers: list[LinkedLayer] = []
+    error: Optional[str] = None
+    # operations logged while the layers of a failed record were fetched
+    operations: list[dict[str, Any]] = []
+
+
 class PreviewGN(BaseModel):
     src: str
     dst: str
     metadata: list[Metadata]
+    transformations: list[str] = []
 
 
 class PreviewGS(BaseModel):
@@ -92,11 +125,60 @@ class PreviewGS(BaseModel):
     dst: str
     layers: list[str]
     styles: list[str]
+    stores: list[str] = []
+    workspaces: list[str] = []
 
 
 class CopyPreview(BaseModel):
+    plan_id: Optional[str] = None
     geonetwork_resources: list[PreviewGN]
     geoserver_resources: list[PreviewGS]
+    expected_writes: list[str] = []
+
+
+class SyncRecord(BaseModel):
+    uuid: str
+    change_date: Optional[str] = None
+    status: Literal["pending", "copied", "failed"] = "pending"
+    summary: Optional[str] = None
+
+
+class SyncResponse(BaseModel):
+    since: Optional[str]
+    watermark: Optional[str]
+    changed: int
+    copied: int = 0
+    failed: int = 0
+    records: list[SyncRecord] = []
+
+
+class WorkspaceItem(BaseModel):
+    kind: Literal["style", "layer"]
+    name: str
+    status: Literal["pending", "copied", "skipped", "failed"] = "pending"
+    summary: Optional[str] = None
+
+
+class WorkspaceCopyResponse(BaseModel):
+    src_url: str
+    dst_name: str
+    workspace: str
+    copied: int = 0
+    skipped: int = 0
+    failed: int = 0
+    items: list[WorkspaceItem] = []
+
+
+class JobStatus(BaseModel):
+    name: str
+    schedule: str
+    next_run: datetime
+    running: bool = False
+    skipped_runs: int = 0
+    last_start: Optional[datetime] = None
+    last_end: Optional[datetime] = None
+    last_error: Optional[str] = None
+    last_result: Optional[SyncResponse] = None
 
 
 context_type = Literal["General", "Meta", "Layer", "Style"]
@@ -114,9 +196,12 @@ class ApiRecord(OperationsRecord):
     method: str
     status_code: int
     url: str
+    duration_ms: Optional[float] = None
+    size: Optional[int] = None
 
     def string_format(self) -> str:
-        return f"[{self.method}] - ({self.status_code}) : {self.url}"
+        duration = f" ({self.duration_ms} ms)" if self.duration_ms is not None else ""
+        return f"[{self.method}] - ({self.status_code}) : {self.url}{duration}"
 
 
 class GnApiRecord(ApiRecord):
@@ -136,10 +221,22 @@ class SuccessRecord(InfoRecord):
     status: str = "OK"
 
 
+class TimingRecord(InfoRecord):
+    message: str = "Timings"
+
+    def string_format(self) -> str:
+        phases = ", ".join(
+            f"{phase}: {duration} ms"
+            for phase, duration in self.detail.get("phases", {}).items()
+        )
+        return f"Timings - total: {self.detail.get('total_ms')} ms ({phases})"
+
+
 class DetailedResponse(BaseModel):
     summary: str
     info: dict[str, Any] = {}
     operations: list[dict[str, Any]]
+    timings: dict[str, Any] = {}
 
 
 class ExceptionDetail(BaseModel):
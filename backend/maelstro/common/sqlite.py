@@ -0,0 +1,32 @@
+import os
+import sqlite3
+from threading import Lock
+
+
+class SqliteStore:
+    """
+    Local sqlite database shared by the threads of the backend (in memory if no
+    path is given). The database is opened and its table created on first use,
+    so that creating a store at import time has no side effect.
+    Subclasses access the connection with the lock held.
+    """
+
+    create_table_sql = ""
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.path is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(
+                self.path or ":memory:", check_same_thread=False
+            )
+            with connection:
+                connection.execute(self.create_table_sql)
+            self._connection = connection
+        return self._connection
@@ -1,5 +1,6 @@
 from collections import namedtuple
 from dataclasses import dataclass
+from typing import Any
 
 
 Credentials = namedtuple("Credentials", ["login", "password"])
@@ -17,3 +18,75 @@ class DbConfig:
     database: str = "georchestra"
     schema: str = "maelstro"
     table: str = "logs"
+
+
+@dataclass
+class CheckConfig:
+    timeout: float = 5
+    cache_ttl: float = 30
+    max_workers: int = 16
+
+
+@dataclass
+class CacheConfig:
+    ttl: float = 60
+    max_entries: int = 128
+    max_bytes: int | None = None
+    directory: str | None = None
+
+
+@dataclass
+class ThrottlingConfig:
+    max_concurrency: int = 8
+    min_concurrency: int = 1
+    rate: float | None = None
+    burst: int = 1
+    backoff: float = 1
+    max_backoff: float = 30
+
+
+@dataclass
+class RetryConfig:
+    max_attempts: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 10
+
+
+@dataclass
+class CheckpointConfig:
+    ttl: float = 86400
+    path: str | None = None
+
+
+@dataclass
+class SyncConfig:
+    path: str | None = None
+    page_size: int = 100
+    max_records: int = 1000
+
+
+@dataclass
+class WorkspaceCopyConfig:
+    path: str | None = None
+
+
+@dataclass
+class XsltPoolConfig:
+    # 0: transformations run in the thread of the request
+    workers: int = 0
+    timeout: float = 60
+    max_memory_mb: int | None = None
+
+
+@dataclass
+class JobConfig:
+    name: str
+    src_name: str
+    dst_name: str
+    schedule: str
+    # copy of the listed records, or incremental sync of the records matching the query
+    uuids: list[str] | None = None
+    query: dict[str, Any] | None = None
+    copy_meta: bool = True
+    copy_layers: bool = True
+    copy_styles: bool = True
@@ -0,0 +1,133 @@
+"""
+Validation of the configured servers: reachability, version and credentials
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import cache
+from time import perf_counter
+from typing import Any
+import requests
+from maelstro.common.cache import TtlCache
+from maelstro.common.models import ConfigCheckResponse, ServerCheck
+from maelstro.config import app_config as config
+
+
+@cache
+def get_check_cache() -> TtlCache[bool, ConfigCheckResponse]:
+    return TtlCache(config.get_check_config().cache_ttl, name="check_config")
+
+
+def get_geonetwork_version(resp: requests.Response) -> str | None:
+    return resp.json().get("system/platform/version")  # type: ignore
+
+
+def get_geoserver_version(resp: requests.Response) -> str | None:
+    resources: list[dict[str, Any]] = resp.json()["about"]["resource"]
+    version: str | None = next(
+        (res.get("Version") for res in resources if res.get("@name") == "GeoServer"),
+        resources[0].get("Version"),
+    )
+    return version
+
+
+def check_server(
+    server: dict[str, Any], check_credentials: bool, timeout: float
+) -> ServerCheck:
+    """
+    Check a single server, the auth status is only checked if credentials are given
+    """
+    is_geonetwork = server["kind"] == "geonetwork"
+    url = server["url"].rstrip("/")
+    auth = server["auth"] if check_credentials else None
+    result: dict[str, Any] = {
+        "role": server["role"],
+        "kind": server["kind"],
+        "name": server["name"],
+        "url": server["url"],
+        "reachable": False,
+        "auth": "anonymous" if server["auth"] is None else "unchecked",
+    }
+    start = perf_counter()
+    try:
+        if is_geonetwork:
+            resp = requests.get(
+                f"{url}/site",
+                headers={"Accept": "application/json"},
+                timeout=timeout,
+                verify=server["verifytls"],
+            )
+        else:
+            resp = requests.get(
+                f"{url}/rest/about/version.json",
+                auth=auth,
+                timeout=timeout,
+                verify=server["verifytls"],
+            )
+        result["latency_ms"] = round((perf_counter() - start) * 1000, 1)
+        result["reachable"] = True
+        if resp.status_code in [401, 403]:
+            if auth is not None:
+                result["auth"] = "invalid"
+            return ServerCheck(**result)
+        resp.raise_for_status()
+        if is_geonetwork:
+            result["version"] = get_geonetwork_version(resp)
+            if auth is not None:
+                # geonetwork returns 204 on /me if the request is not authenticated
+                me_resp = requests.get(
+                    f"{url}/me",
+                    auth=auth,
+                    headers={"Accept": "application/json"},
+                    timeout=timeout,
+                    verify=server["verifytls"],
+                )
+                result["auth"] = "valid" if me_resp.status_code == 200 else "invalid"
+        else:
+            result["version"] = get_geoserver_version(resp)
+            if auth is not None:
+                result["auth"] = "valid"
+    except (requests.RequestException, ValueError, KeyError, IndexError) as err:
+        result["error"] = f"{err.__class__.__name__}: {err}"
+    return ServerCheck(**result)
+
+
+def check_servers(
+    servers: list[dict[str, Any]],
+    check_credentials: bool,
+    timeout: float,
+    max_workers: int = 16,
+) -> list[ServerCheck]:
+    if not servers:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(servers))) as executor:
+        return list(
+            executor.map(
+                lambda server: check_server(server, check_credentials, timeout),
+                servers,
+            )
+        )
+
+
+def check_all_servers(check_credentials: bool) -> ConfigCheckResponse:
+    """
+    Check all servers of the app config concurrently, results are cached for a short TTL
+    """
+    cached_result = get_check_cache().get(check_credentials)
+    if cached_result is not None:
+        return cached_result.model_copy(update={"cached": True})
+
+    check_config = config.get_check_config()
+    servers = check_servers(
+        config.get_all_servers(),
+        check_credentials,
+        check_config.timeout,
+        check_config.max_workers,
+    )
+    result = ConfigCheckResponse(
+        valid=all(srv.reachable and srv.auth != "invalid" for srv in servers),
+        checked_at=datetime.now(),
+        servers=servers,
+    )
+    get_check_cache().set(check_credentials, result)
+    return result
@@ -2,8 +2,21 @@ import os
 import re
 import yaml
 from functools import cache
+from threading import Lock
 from typing import Any
-from maelstro.common.types import Credentials, DbConfig
+from maelstro.common.types import (
+    Credentials,
+    DbConfig,
+    CheckConfig,
+    CacheConfig,
+    CheckpointConfig,
+    SyncConfig,
+    WorkspaceCopyConfig,
+    XsltPoolConfig,
+    JobConfig,
+    ThrottlingConfig,
+    RetryConfig,
+)
 from maelstro.common.models import SourcesResponseElement, DestinationsResponseElement
 
 
@@ -23,30 +36,46 @@ REGEX_ENV_VAR = r"^\${(.*)}$"
 
 class Config:
     def __init__(self, env_var_name: str | None = None):
-        self.config = EMPTY_CONFIG
-        if env_var_name is not None:
-            config_path = os.environ.get(env_var_name)
+        self.env_var_name = env_var_name
+        self._config: dict[str, Any] | None = None
+        self._lock = Lock()
+
+    @property
+    def config(self) -> dict[str, Any]:
+        """
+        The config file is read on first use, not when the backend is imported
+        """
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._config = self.load()
+        return self._config
+
+    def load(self) -> dict[str, Any]:
+        config: dict[str, Any] = EMPTY_CONFIG
+        if self.env_var_name is not None:
+            config_path = os.environ.get(self.env_var_name)
             if config_path is not None:
                 config_file = config_path
                 with open(config_file, encoding="utf8") as cf:
-                    self.config = yaml.load(cf, yaml.Loader)
+                    config = yaml.load(cf, yaml.Loader)
 
-        self.read_all_credentials()
-        db_config = self.config.get("db_logging")
+        self.read_all_credentials(config)
+        db_config = config.get("db_logging")
         if db_config is not None:
             substitute_single_credentials_from_env(db_config)
+        return config
 
-    def read_all_credentials(self) -> None:
-        common_credentials = substitute_single_credentials_from_env(
-            self.config["sources"]
-        )
-        for gn_instance in self.config["sources"]["geonetwork_instances"]:
+    @staticmethod
+    def read_all_credentials(config: dict[str, Any]) -> None:
+        common_credentials = substitute_single_credentials_from_env(config["sources"])
+        for gn_instance in config["sources"]["geonetwork_instances"]:
             substitute_single_credentials_from_env(gn_instance, common_credentials)
 
-        for gs_instance in self.config["sources"]["geoserver_instances"]:
+        for gs_instance in config["sources"]["geoserver_instances"]:
             substitute_single_credentials_from_env(gs_instance, common_credentials)
 
-        for geor_instance in self.config["destinations"].values():
+        for geor_instance in config["destinations"].values():
             common_credentials = substitute_single_credentials_from_env(geor_instance)
 
             substitute_single_credentials_from_env(
@@ -75,12 +104,90 @@ class Config:
             for k, v in self.config["destinations"].items()
         ]
 
+    def get_gs_max_workers(self, dst_name: str) -> int:
+        """
+        Maximum number of concurrent writes to the geoserver of a destination
+        """
+        gs_config = self.config["destinations"].get(dst_name, {}).get("geoserver", {})
+        return int(gs_config.get("max_workers", 4))
+
     def has_db_logging(self) -> bool:
         return "db_logging" in self.config
 
     def get_db_config(self) -> DbConfig:
         return DbConfig(**self.config.get("db_logging", {}))
 
+    def get_check_config(self) -> CheckConfig:
+        return CheckConfig(**self.config.get("check_config", {}))
+
+    def get_checkpoint_config(self) -> CheckpointConfig:
+        return CheckpointConfig(**self.config.get("checkpoints", {}))
+
+    def get_sync_config(self) -> SyncConfig:
+        return SyncConfig(**self.config.get("sync", {}))
+
+    def get_workspace_copy_config(self) -> WorkspaceCopyConfig:
+        return WorkspaceCopyConfig(**self.config.get("workspace_copy", {}))
+
+    def get_xslt_pool_config(self) -> XsltPoolConfig:
+        return XsltPoolConfig(**self.config.get("xslt_pool", {}))
+
+    def get_job_configs(self) -> list[JobConfig]:
+        jobs = [JobConfig(**job) for job in self.config.get("jobs", [])]
+        gn_sources = [gn.name for gn in self.get_gn_sources()]
+        names = set()
+        for job in jobs:
+            if job.name in names:
+                raise ConfigError(f"Duplicate job name: {job.name}")
+            names.add(job.name)
+            if job.src_name not in gn_sources:
+                raise ConfigError(f"Job {job.name}: unknown source {job.src_name}")
+            if job.dst_name not in self.config["destinations"]:
+                raise ConfigError(f"Job {job.name}: unknown destination {job.dst_name}")
+        return jobs
+
+    def get_cache_config(self, cache_name: str, **defaults: Any) -> CacheConfig:
+        """
+        Read the named subsection of the `caching` section, missing keys are taken
+        from the given defaults, then from the CacheConfig defaults
+        """
+        cache_config = self.config.get("caching", {}).get(cache_name, {})
+        return CacheConfig(**{**defaults, **cache_config})
+
+    def get_all_servers(self) -> list[dict[str, Any]]:
+        """
+        List all configured servers (sources and destinations) with their access info
+        """
+        servers = [
+            {
+                "role": "source",
+                "kind": "geonetwork",
+                "name": gn["name"],
+                **self.get_access_info(True, True, gn["name"]),
+            }
+            for gn in self.config["sources"]["geonetwork_instances"]
+        ]
+        servers += [
+            {
+                "role": "source",
+                "kind": "geoserver",
+                "name": gs["url"],
+                **self.get_access_info(True, False, gs["url"]),
+            }
+            for gs in self.config["sources"]["geoserver_instances"]
+        ]
+        for dst_name in self.config["destinations"]:
+            servers += [
+                {
+                    "role": "destination",
+                    "kind": "geonetwork" if is_geonetwork else "geoserver",
+                    "name": dst_name,
+                    **self.get_access_info(False, is_geonetwork, dst_name),
+                }
+                for is_geonetwork in [True, False]
+            ]
+        return servers
+
     def get_transformations(self) -> dict[str, Any]:
         return self.config.get("transformations", {})  # type: ignore
 
@@ -106,64 +213,73 @@ class Config:
                     )
         return transformations
 
-    def get_access_info(
+    def get_instance_config(
         self, is_src: bool, is_geonetwork: bool, instance_id: str
     ) -> dict[str, Any]:
-        info = None
+        """
+        Config item of a server: source geonetworks are identified by name,
+        source geoservers by url and destinations by the name of the destination
+        """
         if is_src:
             if is_geonetwork:
-                infos = (
-                    {
-                        "auth": Credentials(gn.get("login"), gn.get("password")),
-                        "url": gn["api_url"],
-                        "verifytls": gn.get("verify", True),
-                    }
+                instances = (
+                    gn
                     for gn in self.config["sources"]["geonetwork_instances"]
                     if gn["name"] == instance_id
                 )
             else:
-                infos = (
-                    {
-                        "auth": Credentials(gs.get("login"), gs.get("password")),
-                        "url": gs["url"],
-                        "verifytls": gs.get("verify", True),
-                    }
+                instances = (
+                    gs
                     for gs in self.config["sources"]["geoserver_instances"]
                     if gs["url"] == instance_id
                 )
-            try:
-                info = next(infos)
-            except StopIteration as exc:
-                raise ConfigError(
-                    f"Key '{instance_id}' could not be found among "
-                    f"configured {'geonetwork' if is_geonetwork else 'geoserver'} "
-                    "source servers."
-                ) from exc
         else:
             inst_type = "geonetwork" if is_geonetwork else "geoserver"
-            url_key = "api_url" if is_geonetwork else "url"
-            try:
-                instance = next(
-                    inst
-                    for name, inst in self.config["destinations"].items()
-                    if name == instance_id
-                )[inst_type]
-            except StopIteration as exc:
-                raise ConfigError(
-                    f"Key '{instance_id}' could not be found among "
-                    f"configured {'geonetwork' if is_geonetwork else 'geoserver'} "
-                    "destination servers."
-                ) from exc
-            info = {
-                "auth": Credentials(instance.get("login"), instance.get("password")),
-                "url": instance[url_key],
-                "verifytls": instance.get("verify", True),
-            }
+            instances = (
+                inst[inst_type]
+                for name, inst in self.config["destinations"].items()
+                if name == instance_id
+            )
+        try:
+            return next(instances)
+        except StopIteration as exc:
+            raise ConfigError(
+                f"Key '{instance_id}' could not be found among "
+                f"configured {'geonetwork' if is_geonetwork else 'geoserver'} "
+                f"{'source' if is_src else 'destination'} servers."
+            ) from exc
 
+    def get_access_info(
+        self, is_src: bool, is_geonetwork: bool, instance_id: str
+    ) -> dict[str, Any]:
+        instance = self.get_instance_config(is_src, is_geonetwork, instance_id)
+        info = {
+            "auth": Credentials(instance.get("login"), instance.get("password")),
+            "url": instance["api_url" if is_geonetwork else "url"],
+            "verifytls": instance.get("verify", True),
+        }
         if (info["auth"].login is None) or (info["auth"].password is None):
             info["auth"] = None
         return info
 
+    def get_throttling_config(
+        self, is_src: bool, is_geonetwork: bool, instance_id: str
+    ) -> ThrottlingConfig:
+        instance = self.get_instance_config(is_src, is_geonetwork, instance_id)
+        return ThrottlingConfig(**instance.get("throttling", {}))
+
+    def get_retry_config(
+        self, is_src: bool, is_geonetwork: bool, instance_id: str
+    ) -> RetryConfig:
+        instance = self.get_instance_config(is_src, is_geonetwork, instance_id)
+        return RetryConfig(**instance.get("retries", {}))
+
+    def get_timeout(
+        self, is_src: bool, is_geonetwork: bool, instance_id: str
+    ) -> float | None:
+        instance = self.get_instance_config(is_src, is_geonetwork, instance_id)
+        return instance.get("timeout")
+
 
 def substitute_single_credentials_from_env(
     server_instance: dict[str, Any],
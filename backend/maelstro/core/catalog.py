@@ -0,0 +1,214 @@
+"""
+Snapshots of the stores, resources and layers of geoserver workspaces
+
+On the source side, finding the store of the resource of a layer, then the
+workspace of the store, takes two requests per layer. A snapshot lists the
+stores of a workspace and their resources with one request per store instead,
+and is kept for a short time (see `caching.catalog`) so that the copies of
+several records of the same workspace share it. Resources missing from a
+snapshot are looked up one by one.
+
+On the destination side, a copy of several layers lists the existing resources
+of each store and layers of each workspace once, instead of probing each
+resource and layer before writing it.
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import cache, partial
+from typing import Any
+from geoservercloud.services import RestService  # type: ignore
+from maelstro.config import app_config as config
+from maelstro.common.cache import TtlCache
+from maelstro.common.types import CacheConfig, GsLayer
+from .operations import raise_for_status
+
+# list routes of the stores and of their resources, with the keys of their items
+STORE_LISTS = [
+    (
+        ("datastores", "dataStores", "dataStore"),
+        ("featuretypes", "featureTypes", "featureType"),
+    ),
+    (
+        ("coveragestores", "coverageStores", "coverageStore"),
+        ("coverages", "coverages", "coverage"),
+    ),
+]
+
+# list routes of the resources of a store, with the keys of their items
+RESOURCE_LISTS = {
+    res_list: (res_collection, res_item)
+    for _, (res_list, res_collection, res_item) in STORE_LISTS
+}
+# e.g. /rest/workspaces/ws/datastores/db/featuretypes/roads.json
+RESOURCE_ROUTE = re.compile(
+    r"^/?(rest/workspaces/[^/]+/[^/]+/[^/]+)/(featuretypes|coverages)/([^/]+)\.json$"
+)
+
+
+@dataclass
+class WorkspaceSnapshot:
+    workspace: str
+    # store name -> store reference, as in the descriptions of the resources
+    stores: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # resource name -> store name
+    resource_stores: dict[str, str] = field(default_factory=dict)
+
+
+def get_list(
+    gs_src: RestService,
+    route: str,
+    collection: str,
+    item: str,
+    missing_ok: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Items of a list route of the REST API, e.g. {"layers": {"layer": [...]}}.
+    Empty lists are returned as an empty string and single items may be
+    returned as a dict instead of a list. With missing_ok, the list of a
+    missing workspace or store is empty.
+    """
+    resp = gs_src.rest_client.get(route)
+    if missing_ok and resp.status_code == 404:
+        return []
+    raise_for_status(resp)
+    items = (resp.json().get(collection) or {}).get(item, [])
+    if isinstance(items, dict):
+        return [items]
+    return list(items)
+
+
+def get_workspace_snapshot(gs_src: RestService, workspace: str) -> WorkspaceSnapshot:
+    """
+    Stores and resources of a workspace, names are prefixed with the workspace
+    """
+    workspace_route = f"/rest/workspaces/{workspace}"
+    snapshot = WorkspaceSnapshot(workspace)
+    for store_keys, res_keys in STORE_LISTS:
+        store_list, store_collection, store_class = store_keys
+        res_list, res_collection, res_item = res_keys
+        for store in get_list(
+            gs_src,
+            f"{workspace_route}/{store_list}.json",
+            store_collection,
+            store_class,
+        ):
+            store_name = f"{workspace}:{store['name']}"
+            snapshot.stores[store_name] = {
+                "@class": store_class,
+                "name": store_name,
+                "href": store["href"],
+            }
+            for res in get_list(
+                gs_src,
+                f"{workspace_route}/{store_list}/{store['name']}/{res_list}.json",
+                res_collection,
+                res_item,
+            ):
+                snapshot.resource_stores[f"{workspace}:{res['name']}"] = store_name
+    return snapshot
+
+
+class CatalogSnapshots:
+    def __init__(self, cache_config: CacheConfig):
+        self.ttl = cache_config.ttl
+        self.snapshots: TtlCache[tuple[str, str], WorkspaceSnapshot] = TtlCache(
+            cache_config.ttl, max_entries=cache_config.max_entries, name="catalog"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, gs_src: RestService, workspace: str) -> WorkspaceSnapshot:
+        return self.snapshots.get_or_compute(
+            (gs_src.url, workspace),
+            partial(get_workspace_snapshot, gs_src, workspace),
+        )
+
+    def get_resource_store(
+        self, gs_src: RestService, resource_name: str
+    ) -> dict[str, Any] | None:
+        """
+        Store of a resource, None when snapshots are disabled or the resource
+        is not in the snapshot of its workspace
+        """
+        if not self.enabled or ":" not in resource_name:
+            return None
+        snapshot = self.get(gs_src, resource_name.split(":")[0])
+        store_name = snapshot.resource_stores.get(resource_name)
+        if store_name is None:
+            return None
+        return snapshot.stores.get(store_name)
+
+    def get_store_workspace(
+        self, gs_src: RestService, store: dict[str, Any]
+    ) -> str | None:
+        """
+        Workspace of a store, None when snapshots are disabled or the store is
+        not in the snapshot of its workspace
+        """
+        if not self.enabled or ":" not in store["name"]:
+            return None
+        workspace = store["name"].split(":")[0]
+        if store["name"] not in self.get(gs_src, workspace).stores:
+            return None
+        return str(workspace)
+
+    def clear(self) -> None:
+        self.snapshots.clear()
+
+
+class DestinationSnapshot:
+    """
+    Names of the existing resources of the stores and of the layers of the
+    workspaces of a destination geoserver. Each store and workspace is listed
+    at most once by a copy, instead of probing each resource and layer.
+    The snapshot is not updated by the writes of the copy.
+    """
+
+    def __init__(self, gs_dst: RestService):
+        self.gs_dst = gs_dst
+        # kept for the whole copy
+        self.names: TtlCache[str, set[str]] = TtlCache(float("inf"), max_entries=1024)
+
+    def get_names(self, route: str, collection: str, item: str) -> set[str]:
+        return self.names.get_or_compute(
+            route,
+            lambda: {
+                entry["name"]
+                for entry in get_list(
+                    self.gs_dst, route, collection, item, missing_ok=True
+                )
+            },
+        )
+
+    def has_resource(self, resource_route: str) -> bool | None:
+        """
+        None when the route is not the route of a resource of a store
+        """
+        match = RESOURCE_ROUTE.match(resource_route)
+        if match is None:
+            return None
+        store_route, res_list, res_name = match.groups()
+        res_collection, res_item = RESOURCE_LISTS[res_list]
+        return res_name in self.get_names(
+            f"/{store_route}/{res_list}.json", res_collection, res_item
+        )
+
+    def has_layer(self, layer_name: GsLayer) -> bool | None:
+        """
+        None for a layer without workspace
+        """
+        if layer_name.workspace_name is None:
+            return None
+        return layer_name.layer_name in self.get_names(
+            f"/rest/workspaces/{layer_name.workspace_name}/layers.json",
+            "layers",
+            "layer",
+        )
+
+
+@cache
+def get_catalog_snapshots() -> CatalogSnapshots:
+    return CatalogSnapshots(config.get_cache_config("catalog", ttl=0, max_entries=32))
@@ -0,0 +1,89 @@
+"""
+Checkpoints of the completed steps (styles and layers) of copies
+
+When a copy fails, the steps which were completed are kept so that a new copy
+of the same record with the same parameters resumes with the remaining steps.
+The checkpoints of a copy are removed when it succeeds.
+"""
+
+from functools import cache
+from time import time
+from maelstro.config import app_config as config
+from maelstro.common.sqlite import SqliteStore
+from maelstro.common.types import CheckpointConfig
+
+
+class CheckpointStore(SqliteStore):
+    """
+    Completed steps per copy key, in a local sqlite database
+    (in memory if no path is configured)
+    """
+
+    create_table_sql = (
+        "CREATE TABLE IF NOT EXISTS checkpoints ("
+        "copy_key TEXT NOT NULL, step TEXT NOT NULL, done_at REAL NOT NULL, "
+        "PRIMARY KEY (copy_key, step))"
+    )
+
+    def __init__(self, checkpoint_config: CheckpointConfig):
+        self.ttl = checkpoint_config.ttl
+        super().__init__(checkpoint_config.path)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_completed(self, copy_key: str) -> set[str]:
+        if not self.enabled:
+            return set()
+        with self._lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM checkpoints WHERE done_at < ?", (time() - self.ttl,)
+            )
+            rows = self.connection.execute(
+                "SELECT step FROM checkpoints WHERE copy_key = ?", (copy_key,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_completed(self, copy_key: str, step: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                (copy_key, step, time()),
+            )
+
+    def clear(self, copy_key: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM checkpoints WHERE copy_key = ?", (copy_key,)
+            )
+
+
+class CopyCheckpoint:
+    """
+    Checkpoints of a single copy
+    """
+
+    def __init__(self, store: CheckpointStore, copy_key: str, resume: bool = True):
+        self.store = store
+        self.copy_key = copy_key
+        if not resume:
+            store.clear(copy_key)
+        self.completed = store.get_completed(copy_key)
+
+    def is_completed(self, step: str) -> bool:
+        return step in self.completed
+
+    def mark_completed(self, step: str) -> None:
+        self.store.mark_completed(self.copy_key, step)
+
+    def clear(self) -> None:
+        self.store.clear(self.copy_key)
+        self.completed = set()
+
+
+@cache
+def get_checkpoint_store() -> CheckpointStore:
+    return CheckpointStore(config.get_checkpoint_config())
@@ -1,31 +1,51 @@
 import re
 import logging
 import json
-from functools import cache
+from functools import cache, partial
 from io import BytesIO
-from typing import Any
+from typing import Any, Callable
 from geonetwork import GnApi
 from geoservercloud.services import RestService  # type: ignore
 from maelstro.metadata import Meta
 from maelstro.config import app_config as config
 from maelstro.common.types import GsLayer
-from maelstro.common.models import CopyPreview, InfoRecord, SuccessRecord
+from maelstro.common.models import (
+    CopyPreview,
+    InfoRecord,
+    SuccessRecord,
+    context_type,
+)
+from maelstro.common.concurrency import TaskGraph
 from maelstro.common.exceptions import ParamError
-from requests import HTTPError
+from requests import HTTPError, Response
 from .georchestra import GeorchestraHandler
 from .operations import raise_for_status
-from saxonche import PySaxonProcessor  # type: ignore
+from .record_cache import get_record_cache
+from .catalog import DestinationSnapshot, get_catalog_snapshots
+from .copy_plan import CopyPlan, GsServerPlan, get_plan_cache
+from .checkpoints import CopyCheckpoint, get_checkpoint_store
+from .xslt_pool import get_xslt_pool
 
 logger = logging.getLogger()
 
+# below, probing the destination for each layer costs less than listing it
+DST_SNAPSHOT_MIN_LAYERS = 2
+
 
 class CopyManager:
     def __init__(
-        self, src_name: str, dst_name: str, uuid: str, geo_hnd: GeorchestraHandler
+        self,
+        src_name: str,
+        dst_name: str,
+        uuid: str,
+        geo_hnd: GeorchestraHandler,
+        change_date: str | None = None,
     ):
         self.src_name = src_name
         self.dst_name = dst_name
         self.uuid = uuid
+        # change date of the record in the source index, if already known
+        self.change_date = change_date
         self.include_meta = False
         self.include_layers = False
         self.include_styles = False
@@ -33,6 +53,8 @@ class CopyManager:
         self.geo_hnd: GeorchestraHandler = geo_hnd
         self.checked_workspaces: set[str] = set()
         self.checked_datastores: set[str] = set()
+        self.checkpoint: CopyCheckpoint
+        self.dst_snapshot: DestinationSnapshot | None = None
 
     @property
     @cache  # pylint: disable=method-cache-max-size-none
@@ -51,6 +73,104 @@ class CopyManager:
     def gs_dst(self) -> RestService:
         return self.geo_hnd.get_gs_service(self.dst_name, is_source=False)
 
+    def get_plan(
+        self,
+        include_meta: bool,
+        include_layers: bool,
+        include_styles: bool,
+    ) -> CopyPlan:
+        """
+        Discover everything needed for the copy on the source side
+        """
+        with self.geo_hnd.log_handler.timer("Fetch"):
+            meta = get_record_cache().get_meta(
+                self.gn_src, self.src_name, self.uuid, self.change_date
+            )
+
+        servers = []
+        with self.geo_hnd.log_handler.timer("Discovery"):
+            server_layers = meta.get_gs_layers(config.get_gs_sources())
+            for server_url, layer_names in server_layers.items():
+                server = GsServerPlan(server_url, list(layer_names))
+                servers.append(server)
+                if not layer_names or not (include_layers or include_styles):
+                    continue
+
+                gs_src = self.geo_hnd.get_gs_service(server_url, True)
+                for layer_name in layer_names:
+                    resp = gs_src.rest_client.get(f"/rest/layers/{layer_name}.json")
+                    raise_for_status(resp)
+                    server.layers[layer_name] = resp.json()
+
+                # fill in workspaces used in styles
+                if include_styles:
+                    for layer_data in server.layers.values():
+                        server.styles.update(self.get_styles_from_layer(layer_data))
+
+                    for style in server.styles.values():
+                        try:
+                            server.workspaces.update(
+                                self.get_workspaces_from_style(style)
+                            )
+                        except KeyError:
+                            # skip styles without a workspace
+                            pass
+
+                # fill in workspaces  and datastores used in layers
+                if include_layers:
+                    resource_stores = self.get_resource_stores(gs_src, server.layers)
+                    server.stores = {
+                        store["name"]: store for store in resource_stores.values()
+                    }
+                    server.resource_stores = {
+                        resource_name: store["name"]
+                        for resource_name, store in resource_stores.items()
+                    }
+
+                    for store in server.stores.values():
+                        server.workspaces.update(
+                            self.get_workspaces_from_store(gs_src, store)
+                        )
+
+        return CopyPlan(
+            src_name=self.src_name,
+            dst_name=self.dst_name,
+            uuid=self.uuid,
+            include_meta=include_meta,
+            include_layers=include_layers,
+            include_styles=include_styles,
+            meta=meta,
+            transformations=config.get_transformation_pair(
+                self.src_name, self.dst_name
+            ),
+            servers=servers,
+        )
+
+    def get_cached_plan(
+        self,
+        plan_id: str | None,
+        include_meta: bool,
+        include_layers: bool,
+        include_styles: bool,
+    ) -> CopyPlan | None:
+        if plan_id is None:
+            return None
+        plan = get_plan_cache().get(plan_id)
+        if plan is None or not plan.matches(
+            self.src_name,
+            self.dst_name,
+            self.uuid,
+            include_meta,
+            include_layers,
+            include_styles,
+        ):
+            # expired, computed by another worker or for other parameters
+            return None
+        self.geo_hnd.log_handler.log_info(
+            InfoRecord(message="Reuse copy plan", detail={"plan_id": plan_id})
+        )
+        return plan
+
     def copy_preview(
         self,
         include_meta: bool,
@@ -61,99 +181,58 @@ class CopyManager:
         self.include_layers = include_layers
         self.include_styles = include_styles
 
-        zipdata = self.gn_src.get_record_zip(self.uuid).read()
-        self.meta = Meta(zipdata)
-
-        preview: dict[str, list[dict[str, Any]]] = {
-            "geonetwork_resources": [],
-            "geoserver_resources": [],
-        }
-
-        preview["geonetwork_resources"].append(
-            {
-                "src": self.src_name,
-                "dst": self.dst_name,
-                "metadata": (
-                    [
-                        {
-                            "title": self.meta.get_title(),
-                            "iso_standard": self.meta.schema,
-                        }
-                    ]
-                    if self.include_meta
-                    else []
-                ),
-            }
-        )
+        plan = self.get_plan(include_meta, include_layers, include_styles)
+        get_plan_cache().set(plan.plan_id, plan)
 
         dst_gs_info = self.geo_hnd.get_service_info(
             self.dst_name, is_source=False, is_geonetwork=False
         )
-        dst_gs_url = dst_gs_info["url"]
-
-        geoservers = self.meta.get_gs_layers(config.get_gs_sources())
-        for server_url, layer_names in geoservers.items():
-            styles: set[str] = set()
-            for layer_name in layer_names:
-
-                gs_src = self.geo_hnd.get_gs_service(server_url, True)
-                layers = {}
-                for layer_name in layer_names:
-                    resp = gs_src.rest_client.get(f"/rest/layers/{layer_name}.json")
-                    raise_for_status(resp)
-                    layers[layer_name] = resp.json()
-
-                for layer in layers.values():
-                    styles.update(self.get_styles_from_layer(layer).keys())
-
-            if layer_names or styles:
-                # only output servers where some layers or styles have been identified
-                preview["geoserver_resources"].append(
-                    {
-                        "src": server_url,
-                        "dst": dst_gs_url,
-                        "layers": (
-                            [str(layer_name) for layer_name in layer_names]
-                            if self.include_layers
-                            else []
-                        ),
-                        "styles": list(styles) if self.include_styles else [],
-                    }
-                )
-
-        return CopyPreview(**preview)  # type: ignore
+        return plan.to_preview(dst_gs_info["url"])
 
     def copy_dataset(
         self,
         include_meta: bool,
         include_layers: bool,
         include_styles: bool,
+        plan_id: str | None = None,
+        resume: bool = True,
     ) -> str:
         self.include_meta = include_meta
         self.include_layers = include_layers
         self.include_styles = include_styles
 
-        if self.uuid:
-            zipdata = self.gn_src.get_record_zip(self.uuid).read()
-            self.meta = Meta(zipdata)
-            self.geo_hnd.log_handler.set_property("src_title", self.meta.get_title())
+        plan = self.get_cached_plan(
+            plan_id, include_meta, include_layers, include_styles
+        ) or self.get_plan(include_meta, include_layers, include_styles)
+        # the plan may be executed again, its metadata must not be modified
+        self.meta = plan.meta.clone()
+        self.geo_hnd.log_handler.set_property("src_title", self.meta.get_title())
 
-        if self.meta is None:
-            return []
+        self.checkpoint = CopyCheckpoint(
+            get_checkpoint_store(), plan.checkpoint_key, resume
+        )
+        if self.checkpoint.completed:
+            self.geo_hnd.log_handler.log_info(
+                InfoRecord(
+                    message="Resume copy: skip the steps completed by a previous attempt",
+                    detail={"completed": sorted(self.checkpoint.completed)},
+                )
+            )
 
         if self.include_layers or self.include_styles:
-            self.copy_layers()
+            self.copy_layers(plan)
 
         if self.include_meta:
-            xsl_transformations = config.get_transformation_pair(
-                self.src_name, self.dst_name
-            )
+            xsl_transformations = plan.transformations
             if xsl_transformations:
                 transformation_paths = [
                     trans["xsl_path"] for trans in xsl_transformations
                 ]
 
-                pre_info, post_info = self.meta.apply_xslt_chain(transformation_paths)
+                with self.geo_hnd.log_handler.timer("Xslt"):
+                    pre_info, post_info = self.meta.apply_xslt_chain(
+                        transformation_paths, get_xslt_pool().get_transform()
+                    )
                 self.geo_hnd.log_handler.log_info(
                     InfoRecord(
                         message="Apply XSL transformations in zip archive",
@@ -195,70 +274,102 @@ class CopyManager:
                         detail={"info": results["detail"]},
                     )
                 )
+            self.checkpoint.clear()
             return f"{results['msg']} ({uuid})"
+        self.checkpoint.clear()
         return "copy_successful"
 
-    def copy_layers(self) -> None:
-        server_layers = self.meta.get_gs_layers(config.get_gs_sources())
-        for gs_url, layer_names in server_layers.items():
-            if layer_names:
-                gs_src = self.geo_hnd.get_gs_service(gs_url, True)
-                layers = {}
-                for layer_name in layer_names:
-                    resp = gs_src.rest_client.get(f"/rest/layers/{layer_name}.json")
-                    raise_for_status(resp)
-                    layers[layer_name] = resp.json()
-
-                stores = {}
-                workspaces = {}
-                styles = {}
+    def copy_layers(self, plan: CopyPlan) -> None:
+        # resolve the services before they are used by concurrent tasks
+        _ = self.gs_dst, self.gn_src, self.gn_dst
+        self.set_dst_snapshot(sum(len(server.layers) for server in plan.servers))
+        for server in plan.servers:
+            if server.layer_names:
+                gs_src = self.geo_hnd.get_gs_service(server.src_url, True)
+                graph = self.get_publish_graph(gs_src, server)
+                with self.geo_hnd.log_handler.timer("Publish"):
+                    graph.run(config.get_gs_max_workers(self.dst_name))
 
-                # fill in workspaces used in styles
                 if self.include_styles:
-                    for layer_data in layers.values():
-                        styles.update(self.get_styles_from_layer(layer_data))
-
-                    for style in styles.values():
-                        try:
-                            workspaces.update(self.get_workspaces_from_style(style))
-                        except KeyError:
-                            # skip styles without a workspace
-                            pass
-
-                # fill in workspaces  and datastores used in layers
-                if self.include_layers:
-                    stores.update(self.get_stores_from_layers(gs_src, layers))
-
-                    for store in stores.values():
-                        workspaces.update(self.get_workspaces_from_store(gs_src, store))
-
-                self.check_workspaces(gs_src, workspaces)
-                self.check_datastores(gs_src, stores)
-
-                # styles must be copieed first
-                if self.include_styles:
-                    with self.geo_hnd.log_handler.logger_context("Style"):
-                        for style in styles.values():
-                            self.copy_style(gs_src, style)
+                    with self.geo_hnd.log_handler.data_context("Style"):
                         self.geo_hnd.log_handler.log_info(
                             SuccessRecord(
                                 message="Styles copied successfully",
-                                detail={"styles": list(styles.keys())},
+                                detail={"styles": list(server.styles.keys())},
                             )
                         )
-
-                # styles must be available when cloning layers
                 if self.include_layers:
-                    with self.geo_hnd.log_handler.logger_context("Layer"):
-                        for layer_name, layer_data in layers.items():
-                            self.copy_layer(gs_src, layer_name, layer_data)
+                    with self.geo_hnd.log_handler.data_context("Layer"):
                         self.geo_hnd.log_handler.log_info(
                             SuccessRecord(
                                 message="Layers copied successfully",
-                                detail={"layers": list(layers.keys())},
+                                detail={"layers": list(server.layers.keys())},
                             )
                         )
 
+    def get_publish_graph(self, gs_src: RestService, server: GsServerPlan) -> TaskGraph:
+        """
+        Checks and writes on the destination geoserver with their dependencies:
+        all workspace and store checks -> style -> layer (featureType, then layer).
+        No write starts before all checks succeeded, independent writes may run
+        concurrently.
+        """
+        graph = TaskGraph()
+        for workspace_name, workspace in server.workspaces.items():
+            graph.add(
+                ("workspace", workspace_name),
+                partial(self.check_workspaces, gs_src, {workspace_name: workspace}),
+            )
+        for store_name, store in server.stores.items():
+            graph.add(
+                ("store", store_name),
+                partial(self.check_datastores, gs_src, {store_name: store}),
+            )
+        checks = list(graph.tasks)
+
+        if self.include_styles:
+            for style_name, style in server.styles.items():
+                step = f"{server.src_url}|style|{style_name}"
+                if self.checkpoint.is_completed(step):
+                    continue
+                graph.add(
+                    ("style", style_name),
+                    self.publish_task("Style", step, self.copy_style, gs_src, style),
+                    checks,
+                )
+
+        if self.include_layers:
+            for layer_name, layer_data in server.layers.items():
+                step = f"{server.src_url}|layer|{layer_name}"
+                if self.checkpoint.is_completed(step):
+                    continue
+                styles = [
+                    ("style", style_name)
+                    for style_name in self.get_styles_from_layer(layer_data)
+                ]
+                graph.add(
+                    ("layer", layer_name),
+                    self.publish_task(
+                        "Layer", step, self.copy_layer, gs_src, layer_name, layer_data
+                    ),
+                    checks + [key for key in styles if key in graph.tasks],
+                )
+        return graph
+
+    def publish_task(
+        self,
+        context: context_type,
+        step: str,
+        func: Callable[..., None],
+        *args: Any,
+    ) -> Callable[[], None]:
+        def task() -> None:
+            with self.geo_hnd.log_handler.logger_context(context):
+                func(*args)
+            self.checkpoint.mark_completed(step)
+
+        return task
+
     def get_styles_from_layer(self, layer_data: dict[str, Any]) -> dict[str, Any]:
         default_style = layer_data["layer"]["defaultStyle"]
         additional_styles = layer_data["layer"].get("styles", {}).get("style", [])
@@ -280,24 +391,41 @@ class CopyManager:
     def get_stores_from_layers(
         self, gs_src: RestService, layers: dict[GsLayer, Any]
     ) -> dict[str, Any]:
-        stores = {}
+        return {
+            store["name"]: store
+            for store in self.get_resource_stores(gs_src, layers).values()
+        }
+
+    def get_resource_stores(
+        self, gs_src: RestService, layers: dict[GsLayer, Any]
+    ) -> dict[str, Any]:
+        """
+        Store of each resource (featureType or coverage) of the layers
+        """
+        resource_stores = {}
         resources = {
             layer_data["layer"]["resource"]["name"]: layer_data["layer"]["resource"]
             for layer_data in layers.values()
         }
-        for res in resources.values():
-            resource_class = res["@class"]
-            resource_route = res["href"].replace(gs_src.url, "")
-            resource_resp = gs_src.rest_client.get(resource_route)
-            raise_for_status(resource_resp)
-            resource_info = resource_resp.json()
-            store = resource_info[resource_class]["store"]
-            stores[store["name"]] = store
-        return stores
+        for res_name, res in resources.items():
+            store = get_catalog_snapshots().get_resource_store(gs_src, res_name)
+            if store is None:
+                resource_class = res["@class"]
+                resource_route = res["href"].replace(gs_src.url, "")
+                resource_resp = gs_src.rest_client.get(resource_route)
+                raise_for_status(resource_resp)
+                resource_info = resource_resp.json()
+                store = resource_info[resource_class]["store"]
+            resource_stores[res_name] = store
+        return resource_stores
 
     def get_workspaces_from_store(
         self, gs_src: RestService, store: dict[str, Any]
     ) -> dict[str, Any]:
+        workspace_name = get_catalog_snapshots().get_store_workspace(gs_src, store)
+        if workspace_name is not None:
+            # checked on the destination by name, as the workspaces of styles
+            return {workspace_name: None}
         store_class = store["@class"]
         store_route = store["href"].replace(gs_src.url, "")
         store_resp = gs_src.rest_client.get(store_route)
@@ -335,17 +463,11 @@ class CopyManager:
                 )
             raise_for_status(has_datastore)
 
-    def copy_layer(
-        self,
-        gs_src: RestService,
-        layer_name: GsLayer,
-        layer_data: dict[str, Any],
-    ) -> None:
-        resource_route = layer_data["layer"]["resource"]["href"].replace(gs_src.url, "")
-
-        layer_string = json.dumps(layer_data)
-        layer_data = json.loads(layer_string.replace(gs_src.url, self.gs_dst.url))
-
+    def get_gn_urls(self) -> tuple[str, str]:
+        """
+        Base urls of the source and destination geonetworks, the links to the
+        source geonetwork in the resources are replaced by the destination one
+        """
         regex_gnapiurl = r"(https?:\/\/.*)\/geonetwork\/srv\/api"
         # extract url from gn source url api
         gn_src_url = ""
@@ -357,9 +479,63 @@ class CopyManager:
         gn_dst_url_match = re.match(regex_gnapiurl, self.gn_dst.api_url)
         if gn_dst_url_match:
             gn_dst_url = gn_dst_url_match.group(1)
+        return gn_src_url, gn_dst_url
+
+    def set_dst_snapshot(self, layer_count: int) -> None:
+        """
+        Listing the stores and workspaces of the destination costs less than
+        probing the resource and layer of each layer as soon as there are several
+        """
+        if self.include_layers and layer_count >= DST_SNAPSHOT_MIN_LAYERS:
+            self.dst_snapshot = DestinationSnapshot(self.gs_dst)
+
+    def get_dst_existence(
+        self, resource_route: str, layer_name: GsLayer
+    ) -> tuple[bool, bool]:
+        """
+        Whether the resource and the layer exist on the destination geoserver
+        """
+        has_resource = has_layer = None
+        if self.dst_snapshot is not None:
+            has_resource = self.dst_snapshot.has_resource(resource_route)
+            has_layer = self.dst_snapshot.has_layer(layer_name)
+        if has_resource is None:
+            resp = self.gs_dst.rest_client.get(resource_route)
+            has_resource = resp.status_code == 200
+        if has_layer is None:
+            resp = self.gs_dst.rest_client.get(f"/rest/layers/{layer_name}")
+            has_layer = resp.status_code == 200
+        return has_resource, has_layer
+
+    def get_source_resource(
+        self, gs_src: RestService, layer_data: dict[str, Any]
+    ) -> Response:
+        """
+        XML description of the resource (featureType or coverage) of a source layer
+        """
+        resource_route = layer_data["layer"]["resource"]["href"].replace(gs_src.url, "")
+        resource: Response = gs_src.rest_client.get(
+            resource_route.replace(".json", ".xml")
+        )
+        return resource
 
-        has_resource = self.gs_dst.rest_client.get(resource_route)
-        has_layer = self.gs_dst.rest_client.get(f"/rest/layers/{layer_name}")
+    def copy_layer(
+        self,
+        gs_src: RestService,
+        layer_name: GsLayer,
+        layer_data: dict[str, Any],
+        resource: Response | None = None,
+    ) -> None:
+        resource_route = layer_data["layer"]["resource"]["href"].replace(gs_src.url, "")
+        if resource is None:
+            resource = self.get_source_resource(gs_src, layer_data)
+
+        layer_string = json.dumps(layer_data)
+        layer_data = json.loads(layer_string.replace(gs_src.url, self.gs_dst.url))
+
+        gn_src_url, gn_dst_url = self.get_gn_urls()
+
+        has_resource, has_layer = self.get_dst_existence(resource_route, layer_name)
 
         xml_resource_route = resource_route.replace(".json", ".xml")
         resource_post_route = re.sub(
@@ -367,15 +543,14 @@ class CopyManager:
             "",
             xml_resource_route,
         )
-        resource = gs_src.rest_client.get(xml_resource_route)
 
         # Clean <attributes> element to avoid "Custom attributes" checkbox being set
         # See issue #94
         cleaned_content = self.remove_attributes_element(
             resource.content.decode("utf-8").replace(gn_src_url, gn_dst_url)
         )
-        if has_resource.status_code == 200:
-            if has_layer.status_code != 200:
+        if has_resource:
+            if not has_layer:
                 resp = self.gs_dst.rest_client.delete(resource_route)
                 raise_for_status(resp)
                 resp = self.gs_dst.rest_client.post(
@@ -428,26 +603,39 @@ class CopyManager:
         )
         raise_for_status(resp)
 
+    def get_source_style(
+        self, gs_src: RestService, style: dict[str, Any]
+    ) -> tuple[dict[str, Any], str, Response]:
+        """
+        Description of a source style, route and content of its definition
+        """
+        style_route = style["href"].replace(gs_src.url, "")
+        resp = gs_src.rest_client.get(style_route)
+        raise_for_status(resp)
+        style_info = resp.json()
+        # differentiation of the style version :
+        # https://docs-archive.geoserver.org/stable/en/user/rest/api/styles.html#styles-post-and-put
+        if style_info["style"].get("languageVersion", {}).get("version") == "1.1.0":
+            style_format = "htlm"
+            headers = {"Accept": "application/vnd.ogc.se+xml"}
+        else:
+            style_format = style_info["style"]["format"]
+            headers = {"Accept": "application/vnd.ogc.sld+xml"}
+        style_def_route = style_route.replace(".json", f".{style_format}")
+        style_def = gs_src.rest_client.get(style_def_route, headers=headers)
+        return style_info, style_def_route, style_def
+
     def copy_style(
         self,
         gs_src: RestService,
         style: dict[str, Any],
+        source_style: tuple[dict[str, Any], str, Response] | None = None,
     ) -> None:
         if gs_src.url in style["href"]:
             style_route = style["href"].replace(gs_src.url, "")
-            resp = gs_src.rest_client.get(style_route)
-            raise_for_status(resp)
-            style_info = resp.json()
-            # differentiation of the style version :
-            # https://docs-archive.geoserver.org/stable/en/user/rest/api/styles.html#styles-post-and-put
-            if style_info["style"].get("languageVersion", {}).get("version") == "1.1.0":
-                style_format = "htlm"
-                headers = {"Accept": "application/vnd.ogc.se+xml"}
-            else:
-                style_format = style_info["style"]["format"]
-                headers = {"Accept": "application/vnd.ogc.sld+xml"}
-            style_def_route = style_route.replace(".json", f".{style_format}")
-            style_def = gs_src.rest_client.get(style_def_route, headers=headers)
+            style_info, style_def_route, style_def = (
+                source_style or self.get_source_style(gs_src, style)
+            )
             dst_style = self.gs_dst.rest_client.get(style_route)
             if dst_style.status_code == 200:
                 dst_style = self.gs_dst.rest_client.put(style_route, json=style_info)
@@ -471,6 +659,9 @@ class CopyManager:
             raise_for_status(dst_style_def)
 
     def remove_attributes_element(self, xml_content: str) -> bytes:
+        # pylint: disable-next=import-outside-toplevel
+        from saxonche import PySaxonProcessor  # type: ignore
+
         with PySaxonProcessor(license=False) as proc:
             root = proc.parse_xml(xml_text=xml_content)
 
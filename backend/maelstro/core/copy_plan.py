@@ -0,0 +1,144 @@
+"""
+Copy plan: everything discovered on the source side before a copy
+
+The plan is computed once for the preview, kept in a short-lived cache and
+executed by /copy without fetching the record, layers, stores and workspaces
+from the source servers again.
+"""
+
+import json
+from dataclasses import dataclass, field
+from functools import cache
+from hashlib import sha256
+from typing import Any
+from uuid import uuid4
+from maelstro.metadata import Meta
+from maelstro.config import app_config as config
+from maelstro.common.cache import TtlCache
+from maelstro.common.models import CopyPreview, Metadata, PreviewGN, PreviewGS
+from maelstro.common.types import GsLayer
+
+
+@dataclass
+class GsServerPlan:
+    src_url: str
+    layer_names: list[GsLayer]
+    layers: dict[GsLayer, dict[str, Any]] = field(default_factory=dict)
+    styles: dict[str, dict[str, Any]] = field(default_factory=dict)
+    stores: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # resource name -> store name, i.e. the store of each layer
+    resource_stores: dict[str, str] = field(default_factory=dict)
+    workspaces: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class CopyPlan:
+    src_name: str
+    dst_name: str
+    uuid: str
+    include_meta: bool
+    include_layers: bool
+    include_styles: bool
+    meta: Meta
+    transformations: list[dict[str, Any]]
+    servers: list[GsServerPlan]
+    plan_id: str = field(default_factory=lambda: uuid4().hex)
+
+    def matches(
+        self,
+        src_name: str,
+        dst_name: str,
+        uuid: str,
+        include_meta: bool,
+        include_layers: bool,
+        include_styles: bool,
+    ) -> bool:
+        return (
+            self.src_name,
+            self.dst_name,
+            self.uuid,
+            self.include_meta,
+            self.include_layers,
+            self.include_styles,
+        ) == (src_name, dst_name, uuid, include_meta, include_layers, include_styles)
+
+    @property
+    def checkpoint_key(self) -> str:
+        """
+        Identifies the copy of this version of the record with these parameters
+        """
+        return sha256(
+            json.dumps(
+                [
+                    self.src_name,
+                    self.dst_name,
+                    self.uuid,
+                    self.include_meta,
+                    self.include_layers,
+                    self.include_styles,
+                    sha256(self.meta.get_zip()).hexdigest(),
+                ]
+            ).encode()
+        ).hexdigest()
+
+    @property
+    def expected_writes(self) -> list[str]:
+        writes: list[str] = []
+        for server in self.servers:
+            if self.include_styles:
+                writes.extend(f"style {name}" for name in server.styles)
+            if self.include_layers:
+                writes.extend(f"layer {name}" for name in server.layers)
+        if self.include_meta:
+            writes.append(f"metadata {self.uuid}")
+        return writes
+
+    def to_preview(self, dst_gs_url: str) -> CopyPreview:
+        metadata = []
+        transformations = []
+        if self.include_meta:
+            metadata = [
+                Metadata(title=self.meta.get_title(), iso_standard=self.meta.schema)
+            ]
+            transformations = [trans["xsl_path"] for trans in self.transformations]
+        return CopyPreview(
+            plan_id=self.plan_id,
+            geonetwork_resources=[
+                PreviewGN(
+                    src=self.src_name,
+                    dst=self.dst_name,
+                    metadata=metadata,
+                    transformations=transformations,
+                )
+            ],
+            geoserver_resources=[
+                PreviewGS(
+                    src=server.src_url,
+                    dst=dst_gs_url,
+                    layers=(
+                        [str(layer_name) for layer_name in server.layer_names]
+                        if self.include_layers
+                        else []
+                    ),
+                    styles=list(server.styles) if self.include_styles else [],
+                    stores=list(server.stores) if self.include_layers else [],
+                    workspaces=list(server.workspaces),
+                )
+                # only output servers where some layers or styles have been identified
+                for server in self.servers
+                if server.layer_names or server.styles
+            ],
+            expected_writes=self.expected_writes,
+        )
+
+
+@cache
+def get_plan_cache() -> TtlCache[str, CopyPlan]:
+    plan_cache_config = config.get_cache_config("plans", ttl=600, max_entries=64)
+    return TtlCache(
+        plan_cache_config.ttl,
+        max_entries=plan_cache_config.max_entries,
+        max_bytes=plan_cache_config.max_bytes,
+        sizeof=lambda plan: len(plan.meta.get_zip()),
+        name="plans",
+    )
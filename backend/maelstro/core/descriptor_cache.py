@@ -0,0 +1,123 @@
+"""
+Cache of the descriptions fetched from the REST API of source geoservers
+
+Layers, resources, stores and styles rarely change on the source servers, yet
+each preview and copy fetches them again. Responses are kept with their ETag
+or Last-Modified header and revalidated with a conditional request on each use:
+a 304 answer reuses the cached body. Responses without these headers are reused
+without any request during the ttl of the cache (see `caching.descriptors`).
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import cache
+from typing import Any
+from requests import Response
+from maelstro.config import app_config as config
+from maelstro.common.cache import TtlCache
+from maelstro.common.types import CacheConfig
+
+# descriptions of layers, styles and of the content of workspaces
+CACHED_ROUTE = re.compile(r"^/?rest/(layers|workspaces|styles)/")
+# validator sent back in a conditional request, per response header
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+
+DescriptorKey = tuple[str, str, str]
+
+
+@dataclass
+class CachedDescriptor:
+    response: Response
+    # headers of the conditional request which revalidates the response
+    validators: dict[str, str]
+
+
+def get_validators(response: Response) -> dict[str, str]:
+    return {
+        request_header: response.headers[response_header]
+        for response_header, request_header in VALIDATORS.items()
+        if response_header in response.headers
+    }
+
+
+class DescriptorCache:
+    def __init__(self, cache_config: CacheConfig):
+        self.ttl = cache_config.ttl
+        self.descriptors: TtlCache[DescriptorKey, CachedDescriptor] = TtlCache(
+            cache_config.ttl,
+            max_entries=cache_config.max_entries,
+            max_bytes=cache_config.max_bytes,
+            sizeof=lambda descriptor: len(descriptor.response.content),
+            name="descriptors",
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(
+        self,
+        rest_client: Any,
+        path: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        """
+        GET with the signature of RestClient.get, served from the cache when
+        the description did not change
+        """
+        if not self.enabled or not CACHED_ROUTE.match(path):
+            response: Response = rest_client.get(path, params=params, headers=headers)
+            return response
+        key = (rest_client.url, path, json.dumps([params, headers], sort_keys=True))
+        cached = self.descriptors.get(key)
+        if cached is not None and not cached.validators:
+            return cached.response
+
+        if cached is not None:
+            headers = {**(headers or {}), **cached.validators}
+        response = rest_client.get(path, params=params, headers=headers)
+        if cached is not None and response.status_code == 304:
+            return cached.response
+        if response.status_code == 200:
+            self.descriptors.set(
+                key, CachedDescriptor(response, get_validators(response))
+            )
+        else:
+            self.descriptors.invalidate(key)
+        return response
+
+    def clear(self) -> None:
+        self.descriptors.clear()
+
+
+class CachedRestClient:
+    """
+    Proxy of the RestClient of a source geoserver whose GET calls go through
+    the descriptor cache
+    """
+
+    def __init__(self, target: Any, cache: DescriptorCache):
+        self._target = target
+        self._cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+    def get(
+        self,
+        path: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        return self._cache.get(self._target, path, params, headers)
+
+
+@cache
+def get_descriptor_cache() -> DescriptorCache:
+    return DescriptorCache(
+        config.get_cache_config(
+            "descriptors", ttl=60, max_entries=1024, max_bytes=50 * 1024 * 1024
+        )
+    )
@@ -1,15 +1,130 @@
 from contextlib import contextmanager
 import json
-from typing import Any, Iterator
+from typing import Any, Iterator, cast
 from geonetwork import GnApi
 from geonetwork.gn_logger import logger as gn_logger
 from geoservercloud.services import RestService  # type: ignore
+from geoservercloud.services.restclient import RestClient  # type: ignore
+from requests import PreparedRequest, Response, Session
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 from geoservercloud.services.restlogger import gs_logger as gs_logger  # type: ignore
 from maelstro.config import ConfigError, app_config as config
-from .operations import LogCollectionHandler
+from .operations import LogCollectionHandler, log_dispatcher
+from .descriptor_cache import CachedRestClient, get_descriptor_cache
+from .throttling import ThrottledProxy, get_limiter
+from .retry import RetryPolicy
 from maelstro.common.exceptions import ParamError, AuthError
 
+# timeout of the geoservers without a configured one
+GS_DEFAULT_TIMEOUT = 15
+
+
+class TimeoutAdapter(HTTPAdapter):
+    """
+    Apply the timeout configured for a server to all requests of a session
+    """
+
+    def __init__(self, timeout: float, **kwargs: Any):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:  # type: ignore
+        kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class SessionRestClient(RestClient):  # type: ignore
+    """
+    RestClient sending its requests through its own session, with the timeout
+    of its geoserver: the library applies a single module-level timeout to all
+    geoservers. The session also keeps the connections to the geoserver alive.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        auth: Any,
+        verifytls: bool = True,
+        timeout: float = GS_DEFAULT_TIMEOUT,
+    ):
+        super().__init__(url, auth, verifytls)
+        self.session = Session()
+        self.session.auth = auth
+        self.session.verify = verifytls
+        adapter = TimeoutAdapter(timeout)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, **kwargs: Any) -> Response:
+        full_url = f"{self.url}{path}"
+        if kwargs.get("json") is not None or kwargs.get("data") is not None:
+            self.log_payload(method, kwargs.get("json"), kwargs.get("data"))
+        else:
+            gs_logger.debug("Doing %s request to: %s", method, full_url)
+        response = self.session.request(method, full_url, **kwargs)
+        gs_logger.info(
+            "[%s] (%s) - %s",
+            method,
+            response.status_code,
+            full_url,
+            extra={"response": response},
+        )
+        return response
+
+    def get(
+        self,
+        path: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        response = self.request("GET", path, params=params, headers=headers)
+        self.restore_gwc_not_found_status(response)
+        if response.status_code != 404:
+            response.raise_for_status()
+        return response
+
+    def post(
+        self,
+        path: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        data: bytes | str | None = None,
+    ) -> Response:
+        response = self.request(
+            "POST", path, params=params, headers=headers, json=json, data=data
+        )
+        if response.status_code != 409:
+            response.raise_for_status()
+        return response
+
+    def put(
+        self,
+        path: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        data: bytes | str | None = None,
+    ) -> Response:
+        response = self.request(
+            "PUT", path, params=params, headers=headers, json=json, data=data
+        )
+        response.raise_for_status()
+        return response
+
+    def delete(
+        self,
+        path: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        response = self.request("DELETE", path, params=params, headers=headers)
+        self.restore_gwc_not_found_status(response)
+        if response.status_code != 404:
+            response.raise_for_status()
+        return response
+
 
 class GeorchestraHandler:
     def __init__(self, log_handler: LogCollectionHandler) -> None:
@@ -17,15 +132,44 @@ class GeorchestraHandler:
 
     def get_gn_service(self, instance_name: str, is_source: bool) -> GnApi:
         gn_info = self.get_service_info(instance_name, is_source, True)
-        return GnApi(gn_info["url"], gn_info["auth"], gn_info["verifytls"])
+        gnapi = GnApi(gn_info["url"], gn_info["auth"], gn_info["verifytls"])
+        timeout = config.get_timeout(is_source, True, instance_name)
+        if timeout is not None:
+            adapter = TimeoutAdapter(timeout)
+            gnapi.session.mount("http://", adapter)
+            gnapi.session.mount("https://", adapter)
+        limiter = get_limiter(
+            gn_info["url"],
+            config.get_throttling_config(is_source, True, instance_name),
+        )
+        retry = RetryPolicy(
+            gn_info["url"], config.get_retry_config(is_source, True, instance_name)
+        )
+        return cast(GnApi, ThrottledProxy(gnapi, limiter, retry))
 
     def get_gs_service(self, instance_name: str, is_source: bool) -> RestService:
         gs_info = self.get_service_info(instance_name, is_source, False)
         gsapi = RestService(gs_info["url"], gs_info["auth"])
+        timeout = config.get_timeout(is_source, False, instance_name)
+        gsapi.rest_client = SessionRestClient(
+            gs_info["url"],
+            gs_info["auth"],
+            timeout=timeout if timeout is not None else GS_DEFAULT_TIMEOUT,
+        )
+        limiter = get_limiter(
+            gs_info["url"],
+            config.get_throttling_config(is_source, False, instance_name),
+        )
+        retry = RetryPolicy(
+            gs_info["url"], config.get_retry_config(is_source, False, instance_name)
+        )
+        gsapi.rest_client = ThrottledProxy(gsapi.rest_client, limiter, retry)
+        if is_source:
+            # the destinations are written, their descriptions are never cached
+            gsapi.rest_client = CachedRestClient(
+                gsapi.rest_client, get_descriptor_cache()
+            )
         try:
-            import geoservercloud.services.restclient  # type: ignore
-
-            geoservercloud.services.restclient.TIMEOUT = 15
             resp = gsapi.rest_client.get("/rest/about/version.json")
         except HTTPError as err:
             if err.response.status_code == 401:
@@ -66,11 +210,19 @@ class GeorchestraHandler:
         return service_info
 
 
+def setup_log_dispatch() -> None:
+    """
+    Attach the single dispatch handler which routes log records of the
+    geonetwork and geoserver clients to the collector of the current request
+    """
+    gn_logger.addHandler(log_dispatcher)
+    gs_logger.addHandler(log_dispatcher)
+
+
 @contextmanager
 def get_georchestra_handler() -> Iterator[GeorchestraHandler]:
     log_handler = LogCollectionHandler()
-    gn_logger.addHandler(log_handler)
-    gs_logger.addHandler(log_handler)
-    yield GeorchestraHandler(log_handler)
-    gn_logger.removeHandler(log_handler)
-    gs_logger.removeHandler(log_handler)
+    try:
+        yield GeorchestraHandler(log_handler)
+    finally:
+        log_handler.close()
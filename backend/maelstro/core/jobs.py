@@ -0,0 +1,324 @@
+"""
+Recurring copy jobs declared in the `jobs` section of the config
+
+The scheduler runs in a background thread of each process of the backend:
+each job is started at the times given by its cron schedule, and a run is
+skipped while the previous run of the same job is still in progress. The
+processes take a lock per job run, in the DB of the logs when configured, else
+in a file of the host, so that a job is run by a single process.
+"""
+
+import fcntl
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from datetime import datetime, timedelta
+from functools import cache
+from threading import Event, Lock, Thread
+from typing import Iterator
+from urllib.parse import quote
+from geonetwork.exceptions import GnException
+from requests.exceptions import RequestException
+from maelstro.config import app_config as config
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.models import JobStatus, SearchQuery, SyncRecord, SyncResponse
+from maelstro.common.types import JobConfig
+from maelstro.logging.psql_logger import db_job_lock, db_ready
+from .georchestra import GeorchestraHandler
+from .operations import LogCollectionHandler
+from .sync import SyncManager, get_error_status
+
+logger = logging.getLogger(__name__)
+
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+# name and range of the 5 fields of a cron expression
+CRON_FIELDS = [
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+]
+# user name of the scheduled copies in the DB logs
+SCHEDULER_USER = "scheduler"
+
+
+def parse_cron_field(expr: str, low: int, high: int) -> set[int]:
+    values: set[int] = set()
+    for part in expr.split(","):
+        range_expr, _, step_expr = part.partition("/")
+        step = int(step_expr) if step_expr else 1
+        if range_expr == "*":
+            start, end = low, high
+        elif "-" in range_expr:
+            start, end = (int(v) for v in range_expr.split("-", 1))
+        else:
+            start = int(range_expr)
+            end = high if step_expr else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Invalid cron field: {expr}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    Standard 5 fields cron expression (minute hour day month weekday), in local time
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        fields = CRON_ALIASES.get(expr, expr).split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"Invalid cron expression: {expr}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_cron_field(field, low, high)
+            for field, (_, low, high) in zip(fields, CRON_FIELDS)
+        )
+        # 0 and 7 are both sunday
+        self.weekdays = {day % 7 for day in weekdays}
+        # as in cron, a restricted day or weekday matches either of them, a field
+        # starting with * (e.g. */2) is not restricted
+        self.any_day = fields[2].startswith("*") or fields[4].startswith("*")
+
+    def matches_day(self, date: datetime) -> bool:
+        day_match = date.day in self.days
+        weekday_match = (date.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return day_match and weekday_match
+        return day_match or weekday_match
+
+    def next_run(self, after: datetime) -> datetime:
+        """
+        First time after the given one which matches the schedule
+        """
+        date = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = date + timedelta(days=5 * 366)
+        while date < limit:
+            if date.month not in self.months:
+                month_start = date.replace(day=1, hour=0, minute=0)
+                date = (month_start + timedelta(days=32)).replace(day=1)
+            elif not self.matches_day(date):
+                date = date.replace(hour=0, minute=0) + timedelta(days=1)
+            elif date.hour not in self.hours:
+                date = date.replace(minute=0) + timedelta(hours=1)
+            elif date.minute not in self.minutes:
+                date += timedelta(minutes=1)
+            else:
+                return date
+        raise ValueError(f"Cron expression never matches: {self.expr}")
+
+
+class FileJobLock:
+    """
+    Locks of the job runs shared by the processes of one host: a lock file per
+    job, which keeps the time of its last scheduled run
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @contextmanager
+    def acquire(self, job_name: str, scheduled: datetime | None) -> Iterator[bool]:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{quote(job_name, safe='')}.lock")
+        with open(path, "a+", encoding="utf8") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                lock_file.seek(0)
+                last_run = lock_file.read().strip()
+                if (
+                    scheduled is not None
+                    and last_run
+                    and datetime.fromisoformat(last_run) >= scheduled
+                ):
+                    yield False
+                    return
+                if scheduled is not None:
+                    lock_file.truncate(0)
+                    lock_file.write(scheduled.isoformat())
+                    lock_file.flush()
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class DbJobLock:
+    """
+    Locks of the job runs in the DB of the logs, shared by the processes of
+    all the hosts of the backend
+    """
+
+    @contextmanager
+    def acquire(self, job_name: str, scheduled: datetime | None) -> Iterator[bool]:
+        if not db_ready.is_set():
+            logger.warning("DB not ready, run of job %s skipped", job_name)
+            yield False
+            return
+        with db_job_lock(job_name, scheduled) as acquired:
+            yield acquired
+
+
+@cache
+def get_job_lock() -> FileJobLock | DbJobLock:
+    if config.has_db_logging():
+        return DbJobLock()
+    return FileJobLock(os.path.join(tempfile.gettempdir(), "maelstro-jobs"))
+
+
+class Job:
+    def __init__(self, job_config: JobConfig):
+        self.config = job_config
+        self.schedule = CronSchedule(job_config.schedule)
+        self.status = JobStatus(
+            name=job_config.name,
+            schedule=job_config.schedule,
+            next_run=self.schedule.next_run(datetime.now()),
+        )
+        self._lock = Lock()
+
+    def try_start(self) -> bool:
+        """
+        Reserve the job for a run, unless the previous run is still in progress
+        """
+        if not self._lock.acquire(blocking=False):
+            self.status.skipped_runs += 1
+            logger.warning("Job %s still running, run skipped", self.config.name)
+            return False
+        self.status.running = True
+        return True
+
+    def run(self, scheduled: datetime | None = None) -> None:
+        """
+        Run the job reserved by try_start, unless another process of the backend
+        runs it, or has already started this scheduled run
+        """
+        try:
+            with get_job_lock().acquire(self.config.name, scheduled) as acquired:
+                if acquired:
+                    self.run_copy()
+                else:
+                    logger.info(
+                        "Job %s run by another process, run skipped", self.config.name
+                    )
+        except Exception:  # pylint: disable=broad-exception-caught
+            # the worker thread would silently drop it
+            logger.exception("Job %s lock failed", self.config.name)
+        finally:
+            self.status.running = False
+            self._lock.release()
+
+    def run_copy(self) -> None:
+        self.status.last_start = datetime.now()
+        self.status.last_error = None
+        geo_hnd = GeorchestraHandler(LogCollectionHandler())
+        try:
+            self.status.last_result = self.copy(geo_hnd)
+        except (MaelstroException, GnException, RequestException) as err:
+            self.status.last_error = get_error_status(err)[1]
+            logger.error("Job %s failed: %s", self.config.name, self.status.last_error)
+        finally:
+            geo_hnd.log_handler.close()
+            self.status.last_end = datetime.now()
+
+    def copy(self, geo_hnd: GeorchestraHandler) -> SyncResponse:
+        cfg = self.config
+        sync_mgr = SyncManager(
+            cfg.src_name,
+            cfg.dst_name,
+            geo_hnd,
+            (
+                SearchQuery.model_validate({"query": cfg.query})
+                if cfg.query is not None
+                else None
+            ),
+            (SCHEDULER_USER, cfg.name),
+        )
+        if cfg.uuids is None:
+            return sync_mgr.sync(cfg.copy_meta, cfg.copy_layers, cfg.copy_styles)
+        records = [SyncRecord(uuid=uuid) for uuid in cfg.uuids]
+        copied = sync_mgr.copy_records(
+            records, cfg.copy_meta, cfg.copy_layers, cfg.copy_styles
+        )
+        return SyncResponse(
+            since=None,
+            watermark=None,
+            changed=len(records),
+            copied=copied,
+            failed=len(records) - copied,
+            records=records,
+        )
+
+
+class JobScheduler:
+    """
+    Start the jobs when they are due, each job runs in its own worker thread
+    """
+
+    def __init__(self, job_configs: list[JobConfig]):
+        self.jobs = {cfg.name: Job(cfg) for cfg in job_configs}
+        self._stop = Event()
+        self._thread: Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self) -> None:
+        if not self.jobs or self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.jobs), thread_name_prefix="maelstro-job"
+        )
+        self._thread = Thread(target=self.loop, name="maelstro-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def loop(self) -> None:
+        while not self._stop.is_set():
+            now = datetime.now()
+            for job in self.jobs.values():
+                if job.status.next_run <= now:
+                    scheduled = job.status.next_run
+                    job.status.next_run = job.schedule.next_run(now)
+                    self.trigger(job, scheduled)
+            next_run = min(job.status.next_run for job in self.jobs.values())
+            # wake up at least every minute in case the clock is changed
+            self._stop.wait(min(max((next_run - now).total_seconds(), 0), 60))
+
+    def trigger(self, job: Job, scheduled: datetime | None = None) -> bool:
+        """
+        Start a run of the job, scheduled at the given time, or now when the
+        run is requested through the API
+        """
+        if self._executor is None or not job.try_start():
+            return False
+        # each run gets a fresh context, as a separate request
+        self._executor.submit(copy_context().run, job.run, scheduled)
+        return True
+
+    def get_status(self) -> list[JobStatus]:
+        return [job.status for job in self.jobs.values()]
+
+
+@cache
+def get_job_scheduler() -> JobScheduler:
+    return JobScheduler(config.get_job_configs())
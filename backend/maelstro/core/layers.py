@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator
+from geonetwork import GnApi
+from geonetwork.exceptions import GnException
+from requests.exceptions import RequestException
+from saxonche import PySaxonApiError  # type: ignore
+from maelstro.metadata import MetaXml
+from maelstro.common.concurrency import submit_in_context
+from maelstro.common.exceptions import MaelstroException, ParamError
+from maelstro.common.models import LayersQuery, LinkedLayer, RecordLayers
+from .operations import LogCollectionHandler, raise_for_status
+from .throttling import ThrottledProxy
+
+MAX_WORKERS = 8
+# uuids and search hits of a single request
+MAX_RECORDS = 500
+
+
+def get_record_xml(gn: ThrottledProxy, uuid: str) -> bytes:
+    """
+    Fetch only the xml of a record, without the attachments of the MEF archive.
+    The request is sent with the session of the geonetwork client (as returned
+    by GeorchestraHandler.get_gn_service), through its limiter and retry policy.
+    """
+    resp = gn.throttle(
+        gn.session.get,
+        f"{gn.api_url}/records/{uuid}/formatters/xml",
+        headers={"Accept": "application/xml"},
+    )
+    raise_for_status(resp)
+    return resp.content  # type: ignore
+
+
+def get_record_layers(gn: ThrottledProxy, uuid: str) -> list[LinkedLayer]:
+    meta = MetaXml(get_record_xml(gn, uuid), schema=None)
+    return meta.get_ogc_geoserver_layers()
+
+
+def collect_record_layers(gn: ThrottledProxy, uuid: str) -> RecordLayers:
+    """
+    Linked layers of a record, or its error with the operations logged while
+    fetching it. The operations are collected by the task itself: the stream
+    goes on after the collector of the request is closed.
+    """
+    log_handler = LogCollectionHandler()
+    try:
+        return RecordLayers(uuid=uuid, layers=get_record_layers(gn, uuid))
+    except MaelstroException as err:
+        return RecordLayers(
+            uuid=uuid,
+            error=err.details.err,
+            operations=log_handler.get_json_responses(),
+        )
+    except (GnException, RequestException, PySaxonApiError) as err:
+        return RecordLayers(
+            uuid=uuid,
+            error=f"{err.__class__.__name__}: {err}",
+            operations=log_handler.get_json_responses(),
+        )
+    finally:
+        log_handler.close()
+
+
+def get_query_uuids(gn: GnApi, layers_query: LayersQuery) -> list[str]:
+    requested = len(layers_query.uuids)
+    if layers_query.search is not None:
+        requested += layers_query.search.size or 0
+    if requested > MAX_RECORDS:
+        raise ParamError(
+            err=f"Too many records requested ({requested} uuids and search hits),"
+            f" at most {MAX_RECORDS} per request"
+        )
+    uuids = list(layers_query.uuids)
+    if layers_query.search is not None:
+        query = layers_query.search.model_dump(by_alias=True, exclude_unset=True)
+        query["_source"] = ["uuid"]
+        hits = gn.search(query).get("hits", {}).get("hits", [])
+        uuids += [hit.get("_source", {}).get("uuid", hit.get("_id")) for hit in hits]
+    # remove duplicates but keep order
+    return list(dict.fromkeys(uuid for uuid in uuids if uuid))
+
+
+def iter_records_layers(gn: ThrottledProxy, uuids: list[str]) -> Iterator[RecordLayers]:
+    """
+    Yield the linked layers of each record as soon as they are available
+    (not necessarily in the order of the uuids)
+    """
+    if not uuids:
+        return
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(uuids))) as executor:
+        futures = [
+            submit_in_context(executor, collect_record_layers, gn, uuid)
+            for uuid in uuids
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def iter_records_layers_ndjson(gn: ThrottledProxy, uuids: list[str]) -> Iterator[str]:
+    for record_layers in iter_records_layers(gn, uuids):
+        yield record_layers.model_dump_json() + "\n"
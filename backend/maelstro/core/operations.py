@@ -1,8 +1,11 @@
 from contextlib import contextmanager
 from contextvars import ContextVar
-from typing import Any, Iterator
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Iterator, NamedTuple
 import logging
 from uuid import UUID, uuid4
+from weakref import WeakValueDictionary
 from datetime import datetime
 from logging import Handler
 from requests import Response
@@ -12,6 +15,7 @@ from maelstro.common.models import (
     GnApiRecord,
     GsApiRecord,
     InfoRecord,
+    TimingRecord,
     context_type,
 )
 from maelstro.common.exceptions import MaelstroException
@@ -26,59 +30,204 @@ def raise_for_status(response: Response) -> None:
         )
 
 
+def get_response_size(response: Response) -> int | None:
+    content_length = response.headers.get("content-length")
+    if content_length is not None and content_length.isdigit():
+        return int(content_length)
+    try:
+        return len(response.content)
+    except (RuntimeError, TypeError):
+        # streamed content already consumed
+        return None
+
+
 logger_uuid: ContextVar[UUID] = ContextVar("logger_uuid")
+# data type of the operations, kept per context so that concurrent tasks of a
+# request (e.g. styles and layers) do not overwrite each other's
+log_context: ContextVar[context_type] = ContextVar("log_context", default="General")
+
+API_RECORD_CLASSES: dict[str, type[ApiRecord]] = {
+    "GN Session": GnApiRecord,
+    "GS Session": GsApiRecord,
+}
+
+
+class ApiEntry(NamedTuple):
+    """
+    Compact form of an ApiRecord, converted only when the operations are serialized
+    """
+
+    record_class: type[ApiRecord]
+    method: str
+    status_code: int
+    url: str
+    data_type: context_type
+    duration_ms: float | None
+    size: int | None
 
+    @property
+    def type(self) -> str:
+        return self.record_class.model_fields["type"].default  # type: ignore
+
+    def to_record(self) -> ApiRecord:
+        return self.record_class(
+            method=self.method,
+            status_code=self.status_code,
+            url=self.url,
+            data_type=self.data_type,
+            duration_ms=self.duration_ms,
+            size=self.size,
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        # same content as to_record().model_dump(), without validation
+        return {
+            "data_type": self.data_type,
+            "type": self.type,
+            "method": self.method,
+            "status_code": self.status_code,
+            "url": self.url,
+            "duration_ms": self.duration_ms,
+            "size": self.size,
+        }
+
+
+class LogDispatchHandler(Handler):
+    """
+    Single handler attached to the geonetwork and geoserver loggers, which routes
+    each log record to the collector of the current request (via the logger_uuid
+    context var)
+    """
 
-class LogCollectionHandler(Handler):
     def __init__(self) -> None:
         super().__init__()
-        self.responses: list[OperationsRecord] = []
+        self.collectors: WeakValueDictionary[UUID, LogCollectionHandler] = (
+            WeakValueDictionary()
+        )
+
+    def register(self, collector: "LogCollectionHandler") -> None:
+        self.collectors[collector.id] = collector
+
+    def unregister(self, collector: "LogCollectionHandler") -> None:
+        self.collectors.pop(collector.id, None)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        current_uuid = logger_uuid.get(None)
+        if current_uuid is None:
+            # log message outside of any request
+            return
+        collector = self.collectors.get(current_uuid)
+        if collector is not None:
+            collector.emit(record)
+
+
+log_dispatcher = LogDispatchHandler()
+
+
+class LogCollectionHandler:
+    """
+    Collect the operations of one request. Log records are routed here by the
+    log_dispatcher, the collector is registered on creation and can be closed
+    explicitly (it is unregistered anyway when garbage collected)
+    """
+
+    def __init__(self) -> None:
+        self.responses: list[OperationsRecord | ApiEntry] = []
+        self.listeners: list[Callable[[OperationsRecord | ApiEntry], None]] = []
         self.properties: dict[str, Any] = {"start_time": datetime.now()}
-        self.context: context_type = "General"
+        self.durations: dict[str, float] = {}
+        # timers of concurrent tasks (e.g. styles and layers) add to the same phase
+        self._durations_lock = Lock()
+        self.start = perf_counter()
         self.id = uuid4()
         logger_uuid.set(self.id)
+        log_dispatcher.register(self)
+
+    def close(self) -> None:
+        log_dispatcher.unregister(self)
+
+    def add_listener(
+        self, listener: Callable[[OperationsRecord | ApiEntry], None]
+    ) -> None:
+        """
+        Call the listener with each operation as soon as it is collected
+        (e.g. to stream the progress of a copy)
+        """
+        self.listeners.append(listener)
+
+    def append(self, record: OperationsRecord | ApiEntry) -> None:
+        self.responses.append(record)
+        for listener in self.listeners:
+            listener(record)
+
+    @property
+    def context(self) -> context_type:
+        return log_context.get()
+
+    @contextmanager
+    def data_context(self, new_context: context_type) -> Iterator[Any]:
+        """
+        Set the data type of the operations logged in the block, without timing
+        """
+        token = log_context.set(new_context)
+        try:
+            yield self
+        finally:
+            log_context.reset(token)
 
     @contextmanager
     def logger_context(self, new_context: context_type) -> Iterator[Any]:
-        old_context = self.context
-        self.context = new_context
-        yield self
-        self.context = old_context
+        with self.data_context(new_context), self.timer(new_context):
+            yield self
 
-    def emit(self, record: logging.LogRecord) -> None:
-        current_uuid = logger_uuid.get()
-        if current_uuid != self.id:
-            # Discard log message from different context / thread /request
-            return
+    @contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        """
+        Add the wall-clock duration of the block to the given phase, the
+        durations of concurrent blocks are summed
+        """
+        start = perf_counter()
         try:
-            # The response attribute of the record has been added via the `extra` parameter
-            # type checking skipped for simplicity
-            response = record.response  # type: ignore
-            #                           # AttributeError if record has no response
-            record_class = ApiRecord
-            if record.name == "GN Session":
-                record_class = GnApiRecord
-            elif record.name == "GS Session":
-                record_class = GsApiRecord
-
-            api_record = record_class(
-                method=response.request.method,
-                status_code=response.status_code,
-                url=response.url,
-                data_type=self.context,
-            )
-            self.responses.append(api_record)
-        except AttributeError:
-            self.responses.append(
+            yield
+        finally:
+            with self._durations_lock:
+                self.durations[phase] = self.durations.get(phase, 0) + (
+                    perf_counter() - start
+                )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # The response attribute of the record has been added via the `extra` parameter
+        response = getattr(record, "response", None)
+        request = getattr(response, "request", None)
+        if response is None or request is None:
+            self.append(
                 InfoRecord(
-                    message=record.message,
+                    message=record.getMessage(),
                     detail={"src": "generic logger"},
+                    data_type=self.context,
                 )
             )
+            return
+        elapsed = getattr(response, "elapsed", None)
+        self.append(
+            ApiEntry(
+                API_RECORD_CLASSES.get(record.name, ApiRecord),
+                request.method,
+                response.status_code,
+                response.url,
+                self.context,
+                (
+                    round(elapsed.total_seconds() * 1000, 1)
+                    if elapsed is not None
+                    else None
+                ),
+                get_response_size(response),
+            )
+        )
 
     def log_info(self, info: InfoRecord) -> None:
         info.data_type = self.context
-        self.responses.append(info)
+        self.append(info)
 
     def set_property(self, key: str, value: Any) -> None:
         self.properties[key] = value
@@ -86,5 +235,54 @@ class LogCollectionHandler(Handler):
     def get_properties(self) -> dict[str, Any]:
         return self.properties
 
+    def get_timings(self) -> dict[str, Any]:
+        """
+        Totals per phase (log contexts and timers) and per API type, in ms
+        """
+        api: dict[str, dict[str, Any]] = {}
+        for record in self.responses:
+            if isinstance(record, (ApiRecord, ApiEntry)):
+                api_totals = api.setdefault(
+                    record.type, {"count": 0, "duration_ms": 0.0, "bytes": 0}
+                )
+                api_totals["count"] += 1
+                api_totals["duration_ms"] += record.duration_ms or 0
+                api_totals["bytes"] += record.size or 0
+        for api_totals in api.values():
+            api_totals["duration_ms"] = round(api_totals["duration_ms"], 1)
+        return {
+            "total_ms": round((perf_counter() - self.start) * 1000, 1),
+            "phases": {
+                phase: round(duration * 1000, 1)
+                for phase, duration in self.durations.items()
+            },
+            "api": api,
+        }
+
+    def log_timings(self) -> dict[str, Any]:
+        timings = self.get_timings()
+        self.append(TimingRecord(detail=timings))
+        return timings
+
+    def get_records(self) -> list[OperationsRecord]:
+        return [r.to_record() if isinstance(r, ApiEntry) else r for r in self.responses]
+
     def get_json_responses(self) -> list[dict[str, Any]]:
-        return [r.model_dump() for r in self.responses]
+        return [record_to_dict(r) for r in self.responses]
+
+
+def record_to_dict(record: OperationsRecord | ApiEntry) -> dict[str, Any]:
+    if isinstance(record, ApiEntry):
+        return record.to_dict()
+    return record.model_dump()
+
+
+def current_collector() -> LogCollectionHandler | None:
+    """
+    Collector of the current request, for operational messages logged outside
+    of the CopyManager (throttling, retries)
+    """
+    current_uuid = logger_uuid.get(None)
+    if current_uuid is None:
+        return None
+    return log_dispatcher.collectors.get(current_uuid)
@@ -0,0 +1,169 @@
+"""
+Short-lived cache of the source records
+
+The usual UI flow (layers, copy_preview, copy) fetches the same record three
+times in a row. Entries are keyed by source, uuid and change date of the
+record: the current change date is read from the index of the source (a small
+search request) unless the caller already knows it (e.g. sync), so that an
+edited record is always fetched again. The parsed Meta objects are kept in
+memory, each caller gets its own clone, and the MEF archives are optionally
+kept on disk.
+"""
+
+import logging
+import os
+from datetime import datetime
+from functools import cache
+from hashlib import sha256
+from time import time
+from geonetwork import GnApi
+from geonetwork.exceptions import GnException
+from requests.exceptions import RequestException
+from maelstro.metadata import Meta
+from maelstro.config import app_config as config
+from maelstro.common.cache import TtlCache
+from maelstro.common.types import CacheConfig
+
+logger = logging.getLogger(__name__)
+
+# change date of the records in the index of geonetwork
+CHANGE_DATE_FIELD = "dateStamp"
+
+# source, uuid and normalized change date
+RecordKey = tuple[str, str, str]
+
+
+def normalize_date(date: str) -> str:
+    """
+    The index and the MEF archive do not format dates the same way
+    (e.g. 2024-08-22T08:47:43.000Z and 2024-08-22T08:47:43Z)
+    """
+    try:
+        return datetime.fromisoformat(date).replace(microsecond=0).isoformat()
+    except ValueError:
+        return date
+
+
+def get_index_change_date(gn: GnApi, uuid: str) -> str | None:
+    """
+    Current change date of the record in the index of the source, None when
+    the record is not indexed or the index cannot be searched
+    """
+    try:
+        response = gn.search(
+            {
+                "query": {"term": {"uuid": uuid}},
+                "_source": [CHANGE_DATE_FIELD],
+                "size": 1,
+            }
+        )
+    except (GnException, RequestException) as err:
+        logger.warning("Change date of %s not found in the index: %s", uuid, err)
+        return None
+    hits = response.get("hits", {}).get("hits", [])
+    if not hits:
+        return None
+    change_date = hits[0].get("_source", {}).get(CHANGE_DATE_FIELD)
+    return change_date if isinstance(change_date, str) else None
+
+
+def sizeof_meta(meta: Meta) -> int:
+    return len(meta.get_zip()) + len(meta.xml_bytes)
+
+
+class RecordCache:
+    def __init__(self, cache_config: CacheConfig):
+        self.ttl = cache_config.ttl
+        self.directory = cache_config.directory
+        self.records: TtlCache[RecordKey, Meta] = TtlCache(
+            cache_config.ttl,
+            max_entries=cache_config.max_entries,
+            max_bytes=cache_config.max_bytes,
+            sizeof=sizeof_meta,
+            name="records",
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_meta(
+        self, gn: GnApi, src_name: str, uuid: str, change_date: str | None = None
+    ) -> Meta:
+        """
+        The returned Meta is a clone for the caller, who may modify it.
+        change_date is the current change date of the record if known, it is
+        read from the index otherwise. A record without change date is never
+        cached.
+        """
+        if not self.enabled:
+            return Meta(gn.get_record_zip(uuid).read())
+        if change_date is None:
+            change_date = get_index_change_date(gn, uuid)
+        if change_date is None:
+            return Meta(gn.get_record_zip(uuid).read())
+        key = (src_name, uuid, normalize_date(change_date))
+        meta = self.records.get(key)
+        if meta is None:
+            zipfile = self.read_from_disk(key)
+            if zipfile is None:
+                zipfile = gn.get_record_zip(uuid).read()
+                self.write_to_disk(key, zipfile)
+            meta = Meta(zipfile)
+            self.records.set(key, meta)
+        return meta.clone()
+
+    def get_file_path(self, key: RecordKey) -> str:
+        assert self.directory is not None
+        return os.path.join(
+            self.directory, sha256(repr(key).encode()).hexdigest() + ".zip"
+        )
+
+    def read_from_disk(self, key: RecordKey) -> bytes | None:
+        if self.directory is None:
+            return None
+        file_path = self.get_file_path(key)
+        try:
+            if os.path.getmtime(file_path) + self.ttl < time():
+                return None
+            with open(file_path, "rb") as zf:
+                return zf.read()
+        except OSError:
+            return None
+
+    def write_to_disk(self, key: RecordKey, zipfile: bytes) -> None:
+        if self.directory is None or not self.enabled:
+            return
+        file_path = self.get_file_path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.prune_disk()
+            with open(f"{file_path}.tmp", "wb") as zf:
+                zf.write(zipfile)
+            os.replace(f"{file_path}.tmp", file_path)
+        except OSError:
+            pass
+
+    def prune_disk(self) -> None:
+        """
+        Remove expired files from the disk cache
+        """
+        assert self.directory is not None
+        expiry = time() - self.ttl
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.name.endswith(".zip") and entry.stat().st_mtime < expiry:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        self.records.clear()
+
+
+@cache
+def get_record_cache() -> RecordCache:
+    return RecordCache(
+        config.get_cache_config("records", ttl=300, max_bytes=200 * 1024 * 1024)
+    )
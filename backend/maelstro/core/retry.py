@@ -0,0 +1,143 @@
+"""
+Retries of upstream calls with jittered exponential backoff
+
+Calls whose failed request is idempotent (GET, HEAD, PUT, DELETE) are retried
+on transient errors: 429/502/503/504 status, timeouts and connection errors.
+Other calls (POST, or a request which cannot be identified) are only retried
+when the server cannot have processed them: connection timeout, 429 or 503
+status. The method is read from the request of the response or of the error.
+"""
+
+import random
+from time import sleep
+from typing import Any, Callable
+from geonetwork.exceptions import GnException
+from requests import HTTPError, Response
+from requests.exceptions import (
+    ConnectTimeout,
+    ConnectionError as RequestConnectionError,
+    RequestException,
+    Timeout,
+)
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.models import InfoRecord
+from maelstro.common.types import RetryConfig
+from maelstro.metrics import UPSTREAM_RETRIES
+from .operations import current_collector
+
+
+RETRY_STATUS = {429, 502, 503, 504}
+NOT_PROCESSED_STATUS = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+
+def get_error_status(err: BaseException) -> int | None:
+    if isinstance(err, GnException):
+        return err.code  # type: ignore
+    if isinstance(err, MaelstroException):
+        return err.details.status_code
+    if isinstance(err, HTTPError) and err.response is not None:
+        return err.response.status_code
+    return None
+
+
+def get_http_method(result: Any = None, err: BaseException | None = None) -> str:
+    """
+    HTTP method of the request which got the response or the error,
+    UNKNOWN when the error does not keep its request
+    """
+    request: Any = None
+    if isinstance(result, Response):
+        request = result.request
+    elif isinstance(err, GnException):
+        request = getattr(err, "parent_request", None)
+    elif isinstance(err, RequestException):
+        request = err.request
+        if request is None and err.response is not None:
+            request = err.response.request
+    method = getattr(request, "method", None)
+    return method.upper() if isinstance(method, str) else "UNKNOWN"
+
+
+class RetryPolicy:
+    def __init__(self, url: str, retry_config: RetryConfig):
+        self.url = url
+        self.config = retry_config
+
+    def is_retryable(
+        self, result: Any = None, err: BaseException | None = None
+    ) -> bool:
+        method = get_http_method(result, err)
+        if err is not None:
+            if isinstance(err, ConnectTimeout):
+                # the request has not been sent
+                return True
+            if method not in IDEMPOTENT_METHODS:
+                return get_error_status(err) in NOT_PROCESSED_STATUS
+            return (
+                isinstance(err, (Timeout, RequestConnectionError))
+                or get_error_status(err) in RETRY_STATUS
+            )
+        if not isinstance(result, Response):
+            return False
+        if method not in IDEMPOTENT_METHODS:
+            return result.status_code in NOT_PROCESSED_STATUS
+        return result.status_code in RETRY_STATUS
+
+    def get_delay(self, attempt: int) -> float:
+        """
+        Full jitter: random delay up to the exponential backoff of the attempt
+        """
+        return random.uniform(
+            0, min(self.config.max_backoff, self.config.backoff * 2 ** (attempt - 1))
+        )
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        attempt = 1
+        while True:
+            result = None
+            error: BaseException | None = None
+            try:
+                result = func(*args, **kwargs)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                error = err
+            if attempt >= self.config.max_attempts or not self.is_retryable(
+                result, error
+            ):
+                if error is not None:
+                    raise error
+                return result
+
+            delay = self.get_delay(attempt)
+            self.log_retry(attempt, delay, result, error)
+            sleep(delay)
+            attempt += 1
+
+    def log_retry(
+        self,
+        attempt: int,
+        delay: float,
+        result: Any,
+        error: BaseException | None,
+    ) -> None:
+        method = get_http_method(result, error)
+        UPSTREAM_RETRIES.labels(self.url, method).inc()
+        collector = current_collector()
+        if collector is None:
+            return
+        collector.log_info(
+            InfoRecord(
+                message=f"Retry [{method}] call to {self.url}",
+                detail={
+                    "attempt": attempt,
+                    "max_attempts": self.config.max_attempts,
+                    "delay_s": round(delay, 3),
+                    "status_code": (
+                        result.status_code
+                        if isinstance(result, Response)
+                        else get_error_status(error) if error is not None else None
+                    ),
+                    "error": str(error) if error is not None else None,
+                },
+            )
+        )
@@ -0,0 +1,42 @@
+import json
+from functools import cache
+from typing import Any, Callable
+from geonetwork import GnApi
+from maelstro.config import app_config as config
+from maelstro.common.cache import TtlCache
+from maelstro.common.models import SearchQuery
+
+
+# fields of the index documents used by the frontend
+DEFAULT_SOURCE_FIELDS = ["resourceTitleObject", "resourceAbstractObject", "uuid"]
+
+
+@cache
+def get_search_cache() -> TtlCache[str, Any]:
+    cache_config = config.get_cache_config("search", ttl=30, max_entries=256)
+    return TtlCache(
+        cache_config.ttl, max_entries=cache_config.max_entries, name="search"
+    )
+
+
+def normalize_query(search_query: SearchQuery) -> dict[str, Any]:
+    """
+    Query sent to the source server: without projection, only the default fields
+    of the index documents are returned
+    """
+    query = search_query.model_dump(by_alias=True, exclude_unset=True)
+    if not query.get("_source"):
+        query["_source"] = DEFAULT_SOURCE_FIELDS
+    return query
+
+
+def search(
+    src_name: str, search_query: SearchQuery, get_gn: Callable[[], GnApi]
+) -> Any:
+    """
+    Cached search on the source server, identical concurrent searches are sent only once.
+    The geonetwork service is only opened if the search result is not in cache.
+    """
+    query = normalize_query(search_query)
+    cache_key = json.dumps([src_name, query], sort_keys=True)
+    return get_search_cache().get_or_compute(cache_key, lambda: get_gn().search(query))
@@ -0,0 +1,368 @@
+"""
+Incremental synchronisation of a destination with a source catalogue
+
+The change date of the newest record copied to a destination is stored as a
+watermark, a sync only copies the records of the source which changed since.
+"""
+
+import json
+from contextvars import copy_context
+from datetime import datetime
+from functools import cache
+from hashlib import sha256
+from itertools import groupby, takewhile
+from typing import Any, Callable
+from geonetwork import GnApi
+from geonetwork.exceptions import GnException
+from maelstro.config import app_config as config
+from maelstro.common.sqlite import SqliteStore
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.models import InfoRecord, SearchQuery, SyncRecord, SyncResponse
+from maelstro.logging.psql_logger import (
+    DbNotReady,
+    clear_db_watermark,
+    get_db_watermark,
+    log_copy_to_db,
+    set_db_watermark,
+)
+from maelstro.metrics import observe_copy
+from .copy_manager import CopyManager
+from .georchestra import GeorchestraHandler
+from .operations import LogCollectionHandler
+from .record_cache import CHANGE_DATE_FIELD
+
+
+class WatermarkStore(SqliteStore):
+    """
+    Change date of the newest record synchronised per sync key, in a local
+    sqlite file
+    """
+
+    create_table_sql = (
+        "CREATE TABLE IF NOT EXISTS watermarks ("
+        "sync_key TEXT PRIMARY KEY, change_date TEXT NOT NULL, "
+        "updated_at TEXT NOT NULL)"
+    )
+
+    def __init__(self, path: str):
+        super().__init__(path)
+
+    def get(self, sync_key: str) -> str | None:
+        with self._lock, self.connection:
+            row = self.connection.execute(
+                "SELECT change_date FROM watermarks WHERE sync_key = ?", (sync_key,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, sync_key: str, change_date: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)",
+                (sync_key, change_date, datetime.now().isoformat()),
+            )
+
+    def clear(self, sync_key: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM watermarks WHERE sync_key = ?", (sync_key,)
+            )
+
+
+class DbWatermarkStore:
+    """
+    Change date of the newest record synchronised per sync key, in the DB of
+    the logs, shared by all the processes of the backend
+    """
+
+    def get(self, sync_key: str) -> str | None:
+        return self.call(get_db_watermark, sync_key)  # type: ignore
+
+    def set(self, sync_key: str, change_date: str) -> None:
+        self.call(set_db_watermark, sync_key, change_date)
+
+    def clear(self, sync_key: str) -> None:
+        self.call(clear_db_watermark, sync_key)
+
+    @staticmethod
+    def call(func: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return func(*args)
+        except DbNotReady:
+            raise MaelstroException(
+                err="The DB of the sync watermarks is not ready yet, retry later",
+                status_code=503,
+            ) from None
+
+
+@cache
+def get_watermark_store() -> WatermarkStore | DbWatermarkStore:
+    """
+    The watermarks must survive a restart, otherwise the next sync copies all
+    the records again: they are kept in the DB of the logs when configured,
+    else in the sqlite file of the sync section
+    """
+    if config.has_db_logging():
+        return DbWatermarkStore()
+    sync_config = config.get_sync_config()
+    if sync_config.path is None:
+        raise MaelstroException(
+            err="Sync needs db_logging or sync.path in the config "
+            "to keep its watermarks",
+            status_code=500,
+        )
+    return WatermarkStore(sync_config.path)
+
+
+def get_sync_key(
+    src_name: str,
+    dst_name: str,
+    query: dict[str, Any] | None,
+    include_meta: bool,
+    include_layers: bool,
+    include_styles: bool,
+) -> str:
+    """
+    The watermark depends on the selected records and on the copied parts:
+    a sync with layers does not skip records synchronised without layers
+    """
+    return sha256(
+        json.dumps(
+            [src_name, dst_name, query, include_meta, include_layers, include_styles],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+
+
+def search_changed_records(
+    gn: GnApi, bool_query: dict[str, Any], start: int, size: int
+) -> list[SyncRecord]:
+    hits = (
+        gn.search(
+            {
+                "query": {"bool": bool_query},
+                "_source": ["uuid", CHANGE_DATE_FIELD],
+                "sort": [{CHANGE_DATE_FIELD: "asc"}],
+                "from": start,
+                "size": size,
+            }
+        )
+        .get("hits", {})
+        .get("hits", [])
+    )
+    return [
+        SyncRecord(
+            uuid=hit.get("_source", {}).get("uuid", hit.get("_id")),
+            change_date=hit.get("_source", {}).get(CHANGE_DATE_FIELD),
+        )
+        for hit in hits
+    ]
+
+
+def get_changed_records(
+    gn: GnApi,
+    query: dict[str, Any] | None,
+    since: str | None,
+    page_size: int,
+    max_records: int,
+) -> list[SyncRecord]:
+    """
+    Records matching the query which changed after `since`, oldest first.
+    When max_records is reached, the records changed at the same date as the
+    last one are added: the next sync starts after this date and would skip them.
+    """
+    filters: list[dict[str, Any]] = []
+    if since is not None:
+        filters.append({"range": {CHANGE_DATE_FIELD: {"gt": since}}})
+    bool_query: dict[str, Any] = {"filter": filters}
+    if query is not None:
+        bool_query["must"] = [query]
+    records: list[SyncRecord] = []
+    while len(records) < max_records:
+        size = min(page_size, max_records - len(records))
+        page = search_changed_records(gn, bool_query, len(records), size)
+        records += page
+        if len(page) < size:
+            return records
+    if not records:
+        return records
+    last_date = records[-1].change_date
+    while True:
+        page = search_changed_records(gn, bool_query, len(records), page_size)
+        same_date = list(takewhile(lambda rec: rec.change_date == last_date, page))
+        records += same_date
+        if len(same_date) < page_size:
+            return records
+
+
+def get_new_watermark(records: list[SyncRecord]) -> str | None:
+    """
+    Newest change date up to which all the records have been copied.
+    Records with the same change date are committed together, so that a failed
+    record is not skipped by the next sync.
+    """
+    watermark = None
+    for change_date, group in groupby(records, key=lambda rec: rec.change_date):
+        if any(rec.status != "copied" for rec in group):
+            break
+        watermark = change_date
+    return watermark
+
+
+def get_error_status(err: Exception) -> tuple[int, str]:
+    if isinstance(err, MaelstroException):
+        return err.details.status_code, err.details.err
+    if isinstance(err, GnException):
+        return err.code, f"{err.__class__.__name__}: {err.detail.message}"
+    return 500, f"{err.__class__.__name__}: {err}"
+
+
+class SyncManager:
+    """
+    Copy the records of a source which changed since the last sync
+    to a destination, one after the other
+    """
+
+    def __init__(
+        self,
+        src_name: str,
+        dst_name: str,
+        geo_hnd: GeorchestraHandler,
+        search_query: SearchQuery | None = None,
+        user: tuple[str | None, str | None] = (None, None),
+    ):
+        self.src_name = src_name
+        self.dst_name = dst_name
+        self.geo_hnd = geo_hnd
+        self.query = (
+            search_query.query
+            if search_query is not None and search_query.query is not None
+            else None
+        )
+        self.user = user
+        self.sync_config = config.get_sync_config()
+
+    def sync(
+        self,
+        include_meta: bool,
+        include_layers: bool,
+        include_styles: bool,
+        since: str | None = None,
+        dry_run: bool = False,
+    ) -> SyncResponse:
+        sync_key = get_sync_key(
+            self.src_name,
+            self.dst_name,
+            self.query,
+            include_meta,
+            include_layers,
+            include_styles,
+        )
+        # fails before any copy if the watermark cannot be kept
+        watermark_store = get_watermark_store()
+        if since is None:
+            since = watermark_store.get(sync_key)
+        with self.geo_hnd.log_handler.timer("Search"):
+            records = get_changed_records(
+                self.geo_hnd.get_gn_service(self.src_name, True),
+                self.query,
+                since,
+                self.sync_config.page_size,
+                self.sync_config.max_records,
+            )
+        self.geo_hnd.log_handler.log_info(
+            InfoRecord(
+                message=f"{len(records)} records changed since {since or 'ever'}",
+                detail={
+                    "src": self.src_name,
+                    "dst": self.dst_name,
+                    "since": since,
+                    "dry_run": dry_run,
+                },
+            )
+        )
+        if dry_run:
+            return SyncResponse(
+                since=since, watermark=since, changed=len(records), records=records
+            )
+
+        copied = self.copy_records(
+            records, include_meta, include_layers, include_styles
+        )
+        response = SyncResponse(
+            since=since,
+            watermark=get_new_watermark(records) or since,
+            changed=len(records),
+            copied=copied,
+            failed=len(records) - copied,
+            records=records,
+        )
+        if response.watermark is not None and response.watermark != since:
+            watermark_store.set(sync_key, response.watermark)
+        self.geo_hnd.log_handler.log_info(
+            InfoRecord(
+                message=f"Sync watermark: {response.watermark}",
+                detail={"copied": response.copied, "failed": response.failed},
+            )
+        )
+        return response
+
+    def copy_records(
+        self,
+        records: list[SyncRecord],
+        include_meta: bool,
+        include_layers: bool,
+        include_styles: bool,
+    ) -> int:
+        """
+        Copy the records one after the other, return the number of copied records
+        """
+        for record in records:
+            # each record is copied with its own collector, as a separate /copy
+            copy_context().run(
+                self.copy_record, record, include_meta, include_layers, include_styles
+            )
+        return sum(rec.status == "copied" for rec in records)
+
+    def copy_record(
+        self,
+        record: SyncRecord,
+        include_meta: bool,
+        include_layers: bool,
+        include_styles: bool,
+    ) -> None:
+        geo_hnd = GeorchestraHandler(LogCollectionHandler())
+        status_code = 200
+        try:
+            record.summary = CopyManager(
+                self.src_name, self.dst_name, record.uuid, geo_hnd, record.change_date
+            ).copy_dataset(include_meta, include_layers, include_styles)
+            record.status = "copied"
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            # e.g. an invalid record, the sync goes on with the next ones
+            status_code, record.summary = get_error_status(err)
+            record.status = "failed"
+        finally:
+            timings = geo_hnd.log_handler.log_timings()
+            if record.status == "copied":
+                observe_copy(self.src_name, self.dst_name, timings)
+            log_copy_to_db(
+                status_code,
+                {
+                    "dataset_uuid": record.uuid,
+                    "src_name": self.src_name,
+                    "dst_name": self.dst_name,
+                    "copy_meta": include_meta,
+                    "copy_layers": include_layers,
+                    "copy_styles": include_styles,
+                },
+                geo_hnd.log_handler.get_properties(),
+                geo_hnd.log_handler.get_json_responses(),
+                *self.user,
+            )
+            geo_hnd.log_handler.close()
+        self.geo_hnd.log_handler.log_info(
+            InfoRecord(
+                message=f"Sync {record.uuid}: {record.status}",
+                detail={"change_date": record.change_date, "summary": record.summary},
+            )
+        )
@@ -0,0 +1,200 @@
+"""
+Per-upstream rate limiting and adaptive concurrency
+
+Each host of the configured servers gets a HostLimiter shared by all requests
+of the backend.
+The number of concurrent calls adapts to the server: it is halved when the
+server is overloaded (429/503 status or timeout) and increased again after a
+series of successful calls. An optional token bucket limits the request rate.
+"""
+
+from threading import Condition, Lock
+from time import monotonic, sleep
+from typing import Any, Callable
+from urllib.parse import urlparse
+from requests import Response
+from requests.exceptions import ConnectionError as RequestConnectionError, Timeout
+from maelstro.common.models import InfoRecord
+from maelstro.common.types import ThrottlingConfig
+from maelstro.metrics import UPSTREAM_THROTTLED
+from .operations import current_collector
+from .retry import RetryPolicy, get_error_status
+
+
+OVERLOAD_STATUS = {429, 503}
+# waits shorter than this are not reported in the operations log
+REPORT_WAIT = 0.5
+
+
+def is_overload(result: Any = None, err: BaseException | None = None) -> bool:
+    if err is not None:
+        return (
+            isinstance(err, (Timeout, RequestConnectionError))
+            or get_error_status(err) in OVERLOAD_STATUS
+        )
+    return isinstance(result, Response) and result.status_code in OVERLOAD_STATUS
+
+
+def log_throttling(message: str, detail: dict[str, Any]) -> None:
+    collector = current_collector()
+    if collector is not None:
+        collector.log_info(InfoRecord(message=message, detail=detail))
+
+
+class HostLimiter:
+    def __init__(self, url: str, throttling_config: ThrottlingConfig):
+        self.url = url
+        self.host = urlparse(url).netloc
+        self.config = throttling_config
+        self.limit = throttling_config.max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.backoff = 0.0
+        self.blocked_until = 0.0
+        self.tokens = float(throttling_config.burst)
+        self.last_refill = monotonic()
+        self._cond = Condition()
+        self._bucket_lock = Lock()
+
+    def acquire(self) -> float:
+        """
+        Wait for a free slot (and token), return the waiting time in seconds
+        """
+        start = monotonic()
+        with self._cond:
+            while self.in_flight >= self.limit or monotonic() < self.blocked_until:
+                self._cond.wait(
+                    timeout=max(self.blocked_until - monotonic(), 0) or None
+                )
+            self.in_flight += 1
+        sleep(self.take_token())
+        return monotonic() - start
+
+    def take_token(self) -> float:
+        """
+        Token bucket: return the delay before the request may be sent
+        """
+        if not self.config.rate:
+            return 0
+        with self._bucket_lock:
+            now = monotonic()
+            self.tokens = min(
+                float(self.config.burst),
+                self.tokens + (now - self.last_refill) * self.config.rate,
+            )
+            self.last_refill = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.config.rate
+
+    def release(self, overloaded: bool) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                # multiplicative decrease and pause of all calls to the host
+                self.limit = max(self.config.min_concurrency, self.limit // 2)
+                self.successes = 0
+                self.backoff = min(
+                    self.config.max_backoff,
+                    self.backoff * 2 if self.backoff else self.config.backoff,
+                )
+                self.blocked_until = monotonic() + self.backoff
+            else:
+                self.backoff = 0
+                self.successes += 1
+                if self.successes >= self.limit:
+                    # additive increase
+                    self.limit = min(self.config.max_concurrency, self.limit + 1)
+                    self.successes = 0
+            self._cond.notify_all()
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        waited = self.acquire()
+        if waited >= REPORT_WAIT:
+            UPSTREAM_THROTTLED.labels(self.host, "wait").inc()
+            log_throttling(
+                f"Request to {self.url} delayed by throttling",
+                {"waited_ms": round(waited * 1000, 1), "concurrency": self.limit},
+            )
+        result = None
+        error: BaseException | None = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            overloaded = is_overload(result, error)
+            self.release(overloaded)
+            if overloaded:
+                UPSTREAM_THROTTLED.labels(self.host, "backoff").inc()
+                log_throttling(
+                    f"{self.url} is overloaded, backing off",
+                    {
+                        "error": str(error) if error is not None else None,
+                        "status_code": (
+                            result.status_code
+                            if isinstance(result, Response)
+                            else get_error_status(error) if error else None
+                        ),
+                        "concurrency": self.limit,
+                        "backoff_s": self.backoff,
+                    },
+                )
+
+
+class ThrottledProxy:
+    """
+    Proxy of a client object (GnApi, RestClient) whose method calls go through a
+    limiter, and are retried according to the retry policy if any
+    """
+
+    def __init__(
+        self, target: Any, limiter: HostLimiter, retry: RetryPolicy | None = None
+    ):
+        self._target = target
+        self._limiter = limiter
+        self._retry = retry
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._target, name)
+        if not callable(value):
+            return value
+
+        def throttled(*args: Any, **kwargs: Any) -> Any:
+            return self.throttle(value, *args, **kwargs)
+
+        return throttled
+
+    def throttle(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Call func through the limiter and the retry policy of the client, for
+        the requests which are not sent by a method of the client (e.g. sent
+        with its session)
+        """
+        if self._retry is None:
+            return self._limiter.call(func, *args, **kwargs)
+        return self._retry.call(self._limiter.call, func, *args, **kwargs)
+
+
+_limiters: dict[str, HostLimiter] = {}
+_limiters_lock = Lock()
+
+
+def get_limiter(url: str, throttling_config: ThrottlingConfig) -> HostLimiter:
+    """
+    Limiter of the host of a server, shared between all requests and all the
+    servers of the host (e.g. geoserver and geonetwork behind the same proxy).
+    The limiter of a host keeps the throttling config of the first of its
+    servers used.
+    """
+    parsed_url = urlparse(url)
+    host = parsed_url.netloc
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = HostLimiter(f"{parsed_url.scheme}://{host}", throttling_config)
+            _limiters[host] = limiter
+        return limiter
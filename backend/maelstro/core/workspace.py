@@ -0,0 +1,307 @@
+"""
+Copy of a whole workspace of a source geoserver
+
+The layers, styles and stores of the workspace are enumerated with the list
+routes of the REST API instead of being discovered from the links of a record,
+then written with the same publish graph as the copies of records.
+A digest of the source description of each copied style and layer is kept per
+destination, so that the next copy of the workspace skips what did not change.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import cache, partial
+from hashlib import sha256
+from typing import Any, Callable, Iterator, Literal
+from geoservercloud.services import RestService  # type: ignore
+from geonetwork.exceptions import GnException
+from requests.exceptions import RequestException
+from maelstro.config import app_config as config
+from maelstro.common.concurrency import submit_in_context
+from maelstro.common.exceptions import MaelstroException, ParamError
+from maelstro.common.models import InfoRecord, WorkspaceCopyResponse, WorkspaceItem
+from maelstro.common.sqlite import SqliteStore
+from maelstro.common.types import CheckpointConfig, GsLayer, WorkspaceCopyConfig
+from requests import Response
+from .catalog import get_catalog_snapshots, get_list
+from .checkpoints import CheckpointStore, CopyCheckpoint
+from .copy_manager import CopyManager
+from .copy_plan import GsServerPlan
+from .georchestra import GeorchestraHandler
+from .operations import raise_for_status
+from .sync import get_error_status
+
+
+class DigestStore(SqliteStore):
+    """
+    Digest of the source description of the styles and layers last copied to
+    each destination, in a local sqlite database (in memory if no path is configured)
+    """
+
+    create_table_sql = (
+        "CREATE TABLE IF NOT EXISTS copy_digests ("
+        "dst_name TEXT NOT NULL, item TEXT NOT NULL, digest TEXT NOT NULL, "
+        "copied_at TEXT NOT NULL, PRIMARY KEY (dst_name, item))"
+    )
+
+    def __init__(self, workspace_config: WorkspaceCopyConfig):
+        super().__init__(workspace_config.path)
+
+    def get(self, dst_name: str, item: str) -> str | None:
+        with self._lock, self.connection:
+            row = self.connection.execute(
+                "SELECT digest FROM copy_digests WHERE dst_name = ? AND item = ?",
+                (dst_name, item),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, dst_name: str, item: str, digest: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO copy_digests VALUES (?, ?, ?, ?)",
+                (dst_name, item, digest, datetime.now().isoformat()),
+            )
+
+    def clear(self, dst_name: str, item: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM copy_digests WHERE dst_name = ? AND item = ?",
+                (dst_name, item),
+            )
+
+
+def get_digest(description: dict[str, Any], content: bytes, *params: Any) -> str:
+    """
+    Digest of the description and content of a source style or layer, and of
+    the parameters which change what is written on the destination
+    """
+    digest = sha256(json.dumps([description, *params], sort_keys=True).encode())
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def get_json(gs_src: RestService, route: str) -> dict[str, Any]:
+    resp = gs_src.rest_client.get(route)
+    raise_for_status(resp)
+    return dict(resp.json())
+
+
+class WorkspaceCopyManager(CopyManager):
+    """
+    Copy all the styles and layers of a workspace of a source geoserver to the
+    geoserver of a destination. The workspace and the stores of the layers must
+    exist on the destination.
+    """
+
+    def __init__(
+        self,
+        src_url: str,
+        dst_name: str,
+        workspace: str,
+        geo_hnd: GeorchestraHandler,
+        src_name: str | None = None,
+    ):
+        # the source geonetwork is only used to replace its links in the resources
+        super().__init__(src_name or "", dst_name, workspace, geo_hnd)
+        self.src_url = src_url
+        self.workspace = workspace
+        self.force = False
+        self.items: list[WorkspaceItem] = []
+        # unchanged styles and layers are skipped with their digests instead
+        self.checkpoint = CopyCheckpoint(no_checkpoints, workspace)
+
+    def copy_workspace(
+        self, include_layers: bool, include_styles: bool, force: bool = False
+    ) -> WorkspaceCopyResponse:
+        self.include_layers = include_layers
+        self.include_styles = include_styles
+        self.force = force
+
+        gs_src = self.geo_hnd.get_gs_service(self.src_url, True)
+        with self.geo_hnd.log_handler.timer("Discovery"):
+            server = self.get_workspace_plan(gs_src)
+
+        # resolve the services before they are used by concurrent tasks
+        _ = self.gs_dst
+        if self.src_name:
+            _ = self.gn_src, self.gn_dst
+        self.set_dst_snapshot(len(server.layers))
+        graph = self.get_publish_graph(gs_src, server)
+        with self.geo_hnd.log_handler.timer("Publish"):
+            graph.run(config.get_gs_max_workers(self.dst_name))
+
+        items = sorted(self.items, key=lambda item: (item.kind, item.name))
+        response = WorkspaceCopyResponse(
+            src_url=self.src_url,
+            dst_name=self.dst_name,
+            workspace=self.workspace,
+            copied=sum(item.status == "copied" for item in items),
+            skipped=sum(item.status == "skipped" for item in items),
+            failed=sum(item.status == "failed" for item in items),
+            items=items,
+        )
+        self.geo_hnd.log_handler.log_info(
+            InfoRecord(
+                message=f"Workspace {self.workspace}: {response.copied} copied, "
+                f"{response.skipped} unchanged, {response.failed} failed",
+                detail={"src": self.src_url, "dst": self.dst_name, "force": force},
+            )
+        )
+        return response
+
+    def get_workspace_plan(self, gs_src: RestService) -> GsServerPlan:
+        """
+        Layers, styles and stores of the workspace, with one list call per kind
+        of object (and per store for their resources)
+        """
+        workspace_route = f"/rest/workspaces/{self.workspace}"
+        resp = gs_src.rest_client.get(f"{workspace_route}.json")
+        if resp.status_code == 404:
+            raise ParamError(
+                context="src",
+                key=workspace_route,
+                err=f"Workspace {self.workspace} not found on source Geoserver {self.src_url}",
+            )
+        raise_for_status(resp)
+
+        layer_names = [
+            GsLayer(self.workspace, layer["name"])
+            for layer in get_list(
+                gs_src, f"{workspace_route}/layers.json", "layers", "layer"
+            )
+        ]
+        server = GsServerPlan(
+            self.src_url, layer_names, workspaces={self.workspace: None}
+        )
+        server.layers = self.get_layers(gs_src, layer_names)
+
+        if self.include_styles:
+            for style in get_list(
+                gs_src, f"{workspace_route}/styles.json", "styles", "style"
+            ):
+                # same naming as the styles referenced by the layers
+                style_name = f"{self.workspace}:{style['name']}"
+                server.styles[style_name] = {
+                    **style,
+                    "name": style_name,
+                    "workspace": self.workspace,
+                }
+            # global styles used by the layers of the workspace
+            for layer_data in server.layers.values():
+                for style_name, style in self.get_styles_from_layer(layer_data).items():
+                    server.styles.setdefault(style_name, style)
+
+        if self.include_layers:
+            snapshot = get_catalog_snapshots().get(gs_src, self.workspace)
+            server.resource_stores = dict(snapshot.resource_stores)
+            # only the stores of the layers must exist on the destination
+            used_stores = {
+                server.resource_stores.get(layer_data["layer"]["resource"]["name"])
+                for layer_data in server.layers.values()
+            }
+            server.stores = {
+                name: store
+                for name, store in snapshot.stores.items()
+                if name in used_stores
+            }
+        return server
+
+    def get_layers(
+        self, gs_src: RestService, layer_names: list[GsLayer]
+    ) -> dict[GsLayer, dict[str, Any]]:
+        """
+        Descriptions of the layers, fetched concurrently within the limits of
+        the source geoserver
+        """
+        max_workers = config.get_throttling_config(
+            True, False, self.src_url
+        ).max_concurrency
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                layer_name: submit_in_context(
+                    executor, get_json, gs_src, f"/rest/layers/{layer_name}.json"
+                )
+                for layer_name in layer_names
+            }
+        return {layer_name: future.result() for layer_name, future in futures.items()}
+
+    def get_gn_urls(self) -> tuple[str, str]:
+        if not self.src_name:
+            return "", ""
+        return super().get_gn_urls()
+
+    @contextmanager
+    def publish_item(
+        self, kind: Literal["style", "layer"], name: str
+    ) -> Iterator[WorkspaceItem]:
+        """
+        Status of the copy of a style or layer: a failure is reported in the
+        response and does not stop the copy of the other items
+        """
+        item = WorkspaceItem(kind=kind, name=name)
+        self.items.append(item)
+        try:
+            yield item
+        except (MaelstroException, GnException, RequestException) as err:
+            _, item.summary = get_error_status(err)
+            item.status = "failed"
+            # the item may be partially written on the destination
+            get_digest_store().clear(self.dst_name, self.get_item_key(item))
+
+    def get_item_key(self, item: WorkspaceItem) -> str:
+        return f"{self.src_url}|{item.kind}|{item.name}"
+
+    def publish_if_changed(
+        self, item: WorkspaceItem, digest: str, publish: Callable[[], None]
+    ) -> None:
+        item_key = self.get_item_key(item)
+        if not self.force and get_digest_store().get(self.dst_name, item_key) == digest:
+            item.status = "skipped"
+            return
+        publish()
+        get_digest_store().set(self.dst_name, item_key, digest)
+        item.status = "copied"
+
+    def copy_style(
+        self,
+        gs_src: RestService,
+        style: dict[str, Any],
+        source_style: tuple[dict[str, Any], str, Response] | None = None,
+    ) -> None:
+        if gs_src.url not in style["href"]:
+            # styles of another server are not copied
+            return
+        with self.publish_item("style", style["name"]) as item:
+            source_style = source_style or self.get_source_style(gs_src, style)
+            style_info, _, style_def = source_style
+            self.publish_if_changed(
+                item,
+                get_digest(style_info, style_def.content, self.src_name),
+                partial(super().copy_style, gs_src, style, source_style),
+            )
+
+    def copy_layer(
+        self,
+        gs_src: RestService,
+        layer_name: GsLayer,
+        layer_data: dict[str, Any],
+        resource: Response | None = None,
+    ) -> None:
+        with self.publish_item("layer", str(layer_name)) as item:
+            if resource is None:
+                resource = self.get_source_resource(gs_src, layer_data)
+            self.publish_if_changed(
+                item,
+                get_digest(layer_data, resource.content, self.src_name),
+                partial(super().copy_layer, gs_src, layer_name, layer_data, resource),
+            )
+
+
+no_checkpoints = CheckpointStore(CheckpointConfig(ttl=0))
+
+
+@cache
+def get_digest_store() -> DigestStore:
+    return DigestStore(config.get_workspace_copy_config())
@@ -0,0 +1,152 @@
+"""
+Optional process pool running the XSLT transformations of the copies
+
+Without pool (`xslt_pool.workers: 0`), the transformations run with Saxon in
+the thread of the request. With a pool, they run in worker processes which keep
+the compiled stylesheets, so that the transformations of concurrent copies use
+several cores. Each transformation is limited in duration and in memory: when
+it exceeds its timeout, or its worker dies (e.g. on the memory limit), the
+workers of the pool are stopped and the copy fails. The transformations of
+other copies stopped with them are retried once on a new pool.
+"""
+
+import multiprocessing
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import cache
+from threading import BoundedSemaphore, Lock
+from typing import Callable
+from maelstro.config import app_config as config
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.types import XsltPoolConfig
+from maelstro.metadata.xslt_worker import XsltError, init_worker, transform
+from maelstro.metrics import XSLT_DURATION
+
+
+class XsltPool:
+    def __init__(self, pool_config: XsltPoolConfig, xslt_paths: list[str]):
+        self.workers = pool_config.workers
+        self.timeout = pool_config.timeout
+        self.max_memory = (
+            pool_config.max_memory_mb * 1024 * 1024
+            if pool_config.max_memory_mb
+            else None
+        )
+        # compiled by each worker when it starts
+        self.xslt_paths = xslt_paths
+        self.lock = Lock()
+        self.executor: ProcessPoolExecutor | None = None
+        # no transformation waits in the queue of the pool, so that the
+        # timeout only covers its execution
+        self.slots = BoundedSemaphore(max(self.workers, 1))
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def get_transform(self) -> Callable[[bytes, str], bytes] | None:
+        """
+        Transform for MetaXml.apply_xslt_chain, None without pool
+        """
+        return self.transform if self.enabled else None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                # workers are not forked from the threads of the API process
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(self.xslt_paths, self.max_memory),
+                )
+            return self.executor
+
+    def stop_executor(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Stop the workers of a stuck or broken pool. The transformations of
+        other copies running in the pool are retried once on a new pool.
+        """
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        terminate_workers = getattr(executor, "terminate_workers", None)
+        if terminate_workers is not None:
+            # python >= 3.14
+            terminate_workers()
+            return
+        # the workers must be killed, shutdown waits for the running tasks
+        processes = getattr(executor, "_processes", None) or {}
+        for process in list(processes.values()):
+            try:
+                process.terminate()
+            except (OSError, ValueError):
+                # already ended or closed
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, xml_bytes: bytes, xslt_path: str) -> tuple[bytes, float, float]:
+        """
+        Run a transformation in the pool, raise BrokenProcessPool when the pool
+        was stopped, by this transformation or by another one
+        """
+        executor = self.get_executor()
+        try:
+            future: Future[tuple[bytes, float, float]] = executor.submit(
+                transform, xml_bytes, xslt_path
+            )
+        except RuntimeError:
+            # broken, or shut down by another transformation
+            raise BrokenProcessPool("XSLT pool stopped") from None
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.stop_executor(executor)
+            raise MaelstroException(
+                err=f"XSL transformation {xslt_path} stopped after {self.timeout}s",
+                status_code=500,
+            ) from None
+        except (BrokenProcessPool, CancelledError):
+            self.stop_executor(executor)
+            raise BrokenProcessPool("XSLT pool stopped") from None
+        except XsltError as err:
+            raise MaelstroException(err=str(err), status_code=500) from None
+
+    def transform(self, xml_bytes: bytes, xslt_path: str) -> bytes:
+        with self.slots:
+            try:
+                result = self.run(xml_bytes, xslt_path)
+            except BrokenProcessPool:
+                # the worker may have been stopped for another transformation,
+                # which is not retried when it stops the new pool as well
+                try:
+                    result = self.run(xml_bytes, xslt_path)
+                except BrokenProcessPool:
+                    raise MaelstroException(
+                        err=f"XSL transformation {xslt_path} stopped: worker "
+                        "process died, e.g. on its memory limit",
+                        status_code=500,
+                    ) from None
+        output, compile_duration, transform_duration = result
+        if compile_duration:
+            XSLT_DURATION.labels("compile").observe(compile_duration)
+        XSLT_DURATION.labels("transform").observe(transform_duration)
+        return output
+
+    def shutdown(self) -> None:
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+@cache
+def get_xslt_pool() -> XsltPool:
+    return XsltPool(
+        config.get_xslt_pool_config(),
+        [
+            trans["xsl_path"]
+            for trans in config.get_transformations().values()
+            if "xsl_path" in trans
+        ],
+    )
@@ -0,0 +1,113 @@
+"""
+SQLAlchemy models and engine of the DB logs, sync watermarks and job runs
+
+This module is only imported when DB logging is configured, so that sqlalchemy
+is not loaded otherwise. The schema of the table is read from the config when
+the engine is created, not when the model is defined.
+"""
+
+from datetime import datetime
+from functools import cache
+from typing import Any
+from sqlalchemy import (
+    Engine,
+    Column,
+    Integer,
+    String,
+    Boolean,
+    DateTime,
+    create_engine,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.schema import CreateSchema
+from maelstro.config import app_config as config
+from maelstro.common.types import DbConfig
+
+Base = declarative_base()
+
+
+class Log(Base):  # type: ignore
+    # the schema is mapped to the configured one by the engine
+    __tablename__ = "logs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    start_time = Column(DateTime, nullable=False, default=datetime.now)
+    end_time = Column(DateTime, nullable=False, default=datetime.now)
+    first_name = Column(String, nullable=False, default="")
+    last_name = Column(String, nullable=False, default="")
+    status_code = Column(Integer, nullable=False, default=200)
+    dataset_uuid = Column(String, nullable=False, default="")
+    src_name = Column(String, nullable=False, default="")
+    dst_name = Column(String, nullable=False, default="")
+    src_title = Column(String, nullable=False, default="")
+    dst_title = Column(String, nullable=False, default="")
+    # src_link = Column(String, nullable=False, default="")
+    # dst_link = Column(String, nullable=False, default="")
+    copy_meta = Column(Boolean, nullable=False, default=False)
+    copy_layers = Column(Boolean, nullable=False, default=False)
+    copy_styles = Column(Boolean, nullable=False, default=False)
+    details = Column(JSONB, nullable=True)
+
+    def to_dict(self, get_details=False) -> dict[str, Any]:  # type: ignore
+        return {
+            field.name: getattr(self, field.name)
+            for field in self.__table__.c
+            if get_details or field.name != "details"
+        }
+
+
+class Watermark(Base):  # type: ignore
+    """
+    Change date of the newest record synchronised per sync key (see core/sync.py)
+    """
+
+    __tablename__ = "sync_watermarks"
+
+    sync_key = Column(String, primary_key=True)
+    change_date = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+
+class JobRun(Base):  # type: ignore
+    """
+    Last scheduled run of each job started by a process of the backend
+    (see core/jobs.py)
+    """
+
+    __tablename__ = "job_runs"
+
+    job_name = Column(String, primary_key=True)
+    scheduled_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=False, default=datetime.now)
+
+
+def build_url(db_config: DbConfig) -> str:
+    return (
+        f"postgresql://{db_config.login}:{db_config.password}@{db_config.host}:"
+        f"{db_config.port}/{db_config.database}"
+    )
+
+
+@cache
+def get_engine() -> Engine:
+    """
+    Single engine (and connection pool) of the process
+    """
+    db_config = config.get_db_config()
+    return create_engine(build_url(db_config), pool_pre_ping=True).execution_options(
+        schema_translate_map={None: db_config.schema}
+    )
+
+
+def create_schema() -> None:
+    with get_engine().connect() as connection:
+        connection.execute(
+            CreateSchema(config.get_db_config().schema, if_not_exists=True)
+        )
+        connection.commit()
+
+
+def create_db_table() -> None:
+    # by default sqlalchemy checks first if the table exists
+    Base.metadata.create_all(get_engine())
@@ -1,34 +1,38 @@
+"""
+Operation logs of the copies in a postgres DB
+
+sqlalchemy and the DB model (see db.py) are only imported when DB logging is
+configured. The schema and table are created in the background at startup,
+retrying until the DB is reachable, so that the backend starts even if the DB
+is down.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import logging
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any
+from threading import Event, Thread
+from typing import Any, Iterator
 from fastapi import Request
-from sqlalchemy import (
-    Engine,
-    Column,
-    Table,
-    Integer,
-    String,
-    Boolean,
-    DateTime,
-    create_engine,
-    MetaData,
-)
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.schema import CreateSchema
-from sqlalchemy.orm import Session
 from pydantic import TypeAdapter
 from maelstro.config import app_config as config
-from maelstro.common.types import DbConfig
 from maelstro.common.models import JsonLogRecord
+from maelstro.metrics import DB_LOG_WRITES_IN_PROGRESS
 from base64 import b64decode
 from json import loads
 
+logger = logging.getLogger(__name__)
+
 
 class DbNotSetup(Exception):
     pass
 
 
-Base = declarative_base()
+class DbNotReady(Exception):
+    """
+    The schema and tables are still being created (see setup_db_logging)
+    """
 
 
 DB_DEFAULT_CONFIG = {
@@ -40,50 +44,21 @@ DB_DEFAULT_CONFIG = {
     "schema": "maelstro",
     "table": "logs",
 }
-LOGGING_ACTIVE = config.has_db_logging()
-DB_CONFIG = config.get_db_config()
-
-
-class Log(Base):  # type: ignore
-    __tablename__ = "logs"
-    __table_args__ = {"schema": DB_CONFIG.schema}
-
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    start_time = Column(DateTime, nullable=False, default=datetime.now())
-    end_time = Column(DateTime, nullable=False, default=datetime.now())
-    first_name = Column(String, nullable=False, default="")
-    last_name = Column(String, nullable=False, default="")
-    status_code = Column(Integer, nullable=False, default=200)
-    dataset_uuid = Column(String, nullable=False, default="")
-    src_name = Column(String, nullable=False, default="")
-    dst_name = Column(String, nullable=False, default="")
-    src_title = Column(String, nullable=False, default="")
-    dst_title = Column(String, nullable=False, default="")
-    # src_link = Column(String, nullable=False, default="")
-    # dst_link = Column(String, nullable=False, default="")
-    copy_meta = Column(Boolean, nullable=False, default=False)
-    copy_layers = Column(Boolean, nullable=False, default=False)
-    copy_styles = Column(Boolean, nullable=False, default=False)
-    details = Column(JSONB, nullable=True)
-
-    def to_dict(self, get_details=False) -> dict[str, Any]:  # type: ignore
-        return {
-            field.name: getattr(self, field.name)
-            for field in self.__table__.c
-            if get_details or field.name != "details"
-        }
+# first key of the advisory locks of the jobs, the second one is the job name
+JOB_LOCK_NAMESPACE = 0x6D61
+# delays in seconds between the attempts to setup the DB
+SETUP_BACKOFF = 1
+SETUP_MAX_BACKOFF = 60
+
+db_ready = Event()
+_stop_setup = Event()
 
 
 def to_bool(param: str | None) -> bool:
     return TypeAdapter(bool).validate_python(param)
 
 
-def log_request_to_db(
-    status_code: int,
-    request: Request,
-    properties: dict[str, Any],
-    operations: list[dict[str, Any]],
-) -> None:
+def get_request_user(request: Request) -> tuple[str | None, str | None]:
     # Security proxy headers
     firstname = request.headers.get("sec-firstname")
     lastname = request.headers.get("sec-lastname")
@@ -98,35 +73,82 @@ def log_request_to_db(
             except:
                 # ignore if errors
                 pass
+    return firstname, lastname
+
 
+def log_request_to_db(
+    status_code: int,
+    request: Request,
+    properties: dict[str, Any],
+    operations: list[dict[str, Any]],
+) -> None:
+    firstname, lastname = get_request_user(request)
+    log_copy_to_db(
+        status_code,
+        {
+            "dataset_uuid": request.query_params.get("metadataUuid"),
+            "src_name": request.query_params.get("src_name"),
+            "dst_name": request.query_params.get("dst_name"),
+            "copy_meta": to_bool(request.query_params.get("copy_meta")),
+            "copy_layers": to_bool(request.query_params.get("copy_layers")),
+            "copy_styles": to_bool(request.query_params.get("copy_styles")),
+        },
+        properties,
+        operations,
+        firstname,
+        lastname,
+    )
+
+
+def log_copy_to_db(
+    status_code: int,
+    copy_params: dict[str, Any],
+    properties: dict[str, Any],
+    operations: list[dict[str, Any]],
+    firstname: str | None = None,
+    lastname: str | None = None,
+) -> None:
+    """
+    copy_params contains the dataset_uuid, src_name, dst_name and copy_* flags
+    """
     record = {
         "start_time": properties.get("start_time"),
         "end_time": datetime.now(),
         "first_name": firstname,
         "last_name": lastname,
         "status_code": status_code,
-        "dataset_uuid": request.query_params.get("metadataUuid"),
-        "src_name": request.query_params.get("src_name"),
-        "dst_name": request.query_params.get("dst_name"),
+        **copy_params,
         "src_title": properties.get("src_title"),
         "dst_title": properties.get("dst_title"),
-        "copy_meta": to_bool(request.query_params.get("copy_meta")),
-        "copy_layers": to_bool(request.query_params.get("copy_layers")),
-        "copy_styles": to_bool(request.query_params.get("copy_styles")),
         "details": operations,
     }
     log_to_db(record)
 
 
 def log_to_db(record: dict[str, Any]) -> None:
-    if not LOGGING_ACTIVE:
+    if not config.has_db_logging():
         return
-    with Session(get_engine()) as session:
-        session.add(Log(**record))
-        session.commit()
+    if not db_ready.is_set():
+        # the schema and table may not exist yet, see setup_db_logging
+        logger.warning(
+            "DB logging not ready, log of %s dropped", record.get("dataset_uuid")
+        )
+        return
+    from sqlalchemy.orm import Session
+    from .db import Log, get_engine
+
+    with DB_LOG_WRITES_IN_PROGRESS.track_inprogress():
+        with Session(get_engine()) as session:
+            session.add(Log(**record))
+            session.commit()
 
 
 def get_log_count() -> int:
+    if not config.has_db_logging():
+        raise DbNotSetup
+    from sqlalchemy.orm import Session
+    from .db import Log, get_engine
+
     with Session(get_engine()) as session:
         return session.query(Log).count()
 
@@ -134,8 +156,11 @@ def get_log_count() -> int:
 def get_raw_logs(
     size: int, offset: int, get_details: bool = False
 ) -> list[JsonLogRecord]:
-    if not LOGGING_ACTIVE:
+    if not config.has_db_logging():
         raise DbNotSetup
+    from sqlalchemy.orm import Session
+    from .db import Log, get_engine
+
     with Session(get_engine()) as session:
         return [
             JsonLogRecord(**row.to_dict(get_details))
@@ -146,7 +171,7 @@ def get_raw_logs(
         ]
 
 
-def format_log(row: Log) -> str:
+def format_log(row: Any) -> str:
     user = f"{row.first_name} {row.last_name}"
     status = "<succes>" if row.status_code == 200 else "<echec> "
     operations = (
@@ -164,8 +189,11 @@ def format_log(row: Log) -> str:
 
 
 def format_logs(size: int, offset: int) -> list[str]:
-    if not LOGGING_ACTIVE:
+    if not config.has_db_logging():
         raise DbNotSetup
+    from sqlalchemy.orm import Session
+    from .db import Log, get_engine
+
     with Session(get_engine()) as session:
         return [
             format_log(row)
@@ -176,37 +204,125 @@ def format_logs(size: int, offset: int) -> list[str]:
         ]
 
 
-def build_url(db_config: DbConfig) -> str:
-    return (
-        f"postgresql://{db_config.login}:{db_config.password}@{db_config.host}:"
-        f"{db_config.port}/{db_config.database}"
-    )
+def check_db_ready() -> None:
+    if not config.has_db_logging():
+        raise DbNotSetup
+    if not db_ready.is_set():
+        raise DbNotReady
 
 
-def get_engine() -> Engine:
-    return create_engine(build_url(DB_CONFIG))
+def get_db_watermark(sync_key: str) -> str | None:
+    check_db_ready()
+    from sqlalchemy.orm import Session
+    from .db import Watermark, get_engine
 
+    with Session(get_engine()) as session:
+        watermark = session.get(Watermark, sync_key)
+        return str(watermark.change_date) if watermark is not None else None
 
-def read_db_table(name: str = "logs") -> Table:
-    engine = get_engine()
-    return Table("logs", MetaData(schema=DB_CONFIG.schema), autoload_with=engine)
+
+def set_db_watermark(sync_key: str, change_date: str) -> None:
+    check_db_ready()
+    from sqlalchemy.orm import Session
+    from .db import Watermark, get_engine
+
+    with Session(get_engine()) as session:
+        session.merge(
+            Watermark(
+                sync_key=sync_key, change_date=change_date, updated_at=datetime.now()
+            )
+        )
+        session.commit()
+
+
+def clear_db_watermark(sync_key: str) -> None:
+    check_db_ready()
+    from sqlalchemy.orm import Session
+    from .db import Watermark, get_engine
+
+    with Session(get_engine()) as session:
+        session.query(Watermark).filter_by(sync_key=sync_key).delete()
+        session.commit()
+
+
+@contextmanager
+def db_job_lock(job_name: str, scheduled: datetime | None) -> Iterator[bool]:
+    """
+    Advisory lock of a job run, shared by all the processes of the backend.
+    It is held by a connection during the run, so that it is released if the
+    process dies. A scheduled run is also claimed in the job_runs table: the
+    processes which wake up after the end of a short run do not run it again.
+    Yields whether the run can start.
+    """
+    check_db_ready()
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+    from .db import JobRun, get_engine
+
+    lock_params = {"namespace": JOB_LOCK_NAMESPACE, "name": job_name}
+    with get_engine().connect() as connection:
+        locked = connection.execute(
+            text("SELECT pg_try_advisory_lock(:namespace, hashtext(:name))"),
+            lock_params,
+        ).scalar()
+        connection.commit()
+        if not locked:
+            yield False
+            return
+        try:
+            with Session(bind=connection) as session:
+                last_run = session.get(JobRun, job_name)
+                claimed = bool(
+                    scheduled is None
+                    or last_run is None
+                    or last_run.scheduled_at < scheduled
+                )
+                if scheduled is not None and claimed:
+                    session.merge(
+                        JobRun(
+                            job_name=job_name,
+                            scheduled_at=scheduled,
+                            started_at=datetime.now(),
+                        )
+                    )
+                session.commit()
+            yield claimed
+        finally:
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:namespace, hashtext(:name))"),
+                lock_params,
+            )
+            connection.commit()
 
 
 def setup_db_logging() -> None:
-    if not LOGGING_ACTIVE:
+    """
+    Create the schema and the tables of the logs, sync watermarks and job runs
+    if needed, retried with an exponential backoff until the DB is reachable or
+    the backend stops
+    """
+    if not config.has_db_logging():
         return
-    # this call is safe in init: by default sqlalchemy checks first if the table exists
-    create_schema()
-    create_db_table()
+    from sqlalchemy.exc import SQLAlchemyError
+    from .db import create_db_table, create_schema
 
+    delay = SETUP_BACKOFF
+    while not _stop_setup.is_set():
+        try:
+            create_schema()
+            create_db_table()
+            db_ready.set()
+            return
+        except SQLAlchemyError as err:
+            logger.warning("DB logging setup failed, retry in %ss: %s", delay, err)
+            _stop_setup.wait(delay)
+            delay = min(delay * 2, SETUP_MAX_BACKOFF)
 
-def create_db_table() -> None:
-    engine = get_engine()
-    Base.metadata.create_all(engine)
 
+def start_db_logging_setup() -> None:
+    _stop_setup.clear()
+    Thread(target=setup_db_logging, name="maelstro-db-setup", daemon=True).start()
 
-def create_schema() -> None:
-    engine = get_engine()
-    with engine.connect() as connection:
-        connection.execute(CreateSchema(DB_CONFIG.schema, if_not_exists=True))
-        connection.commit()
+
+def stop_db_logging_setup() -> None:
+    _stop_setup.set()
@@ -3,7 +3,8 @@ Main backend app setup
 """
 
 import os
-from typing import Annotated, Any
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator
 from fastapi import (
     FastAPI,
     HTTPException,
@@ -15,29 +16,47 @@ from fastapi import (
     Header,
     Body,
 )
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from maelstro.config import app_config as config
-from maelstro.metadata import Meta
+from maelstro.config.check import check_all_servers
 from maelstro.core import CopyManager
+from maelstro.core.georchestra import setup_log_dispatch
+from maelstro.core.jobs import get_job_scheduler
+from maelstro.core.xslt_pool import get_xslt_pool
+from maelstro.core.layers import get_query_uuids, iter_records_layers_ndjson
+from maelstro.core.record_cache import get_record_cache
+from maelstro.core.search import search
+from maelstro.core.sync import SyncManager
+from maelstro.core.workspace import WorkspaceCopyManager
 from maelstro.middleware import setup_middleware
+from maelstro.streaming import STREAM_MEDIA_TYPES, iter_copy_events, iter_sync_events
+from maelstro.metrics import setup_metrics, observe_copy
 from maelstro.logging.psql_logger import (
-    setup_db_logging,
+    start_db_logging_setup,
+    stop_db_logging_setup,
     get_log_count,
     log_request_to_db,
+    get_request_user,
     get_raw_logs,
     format_logs,
     DbNotSetup,
 )
 from maelstro.common.models import (
     SearchQuery,
+    ConfigCheckResponse,
     UserResponse,
     user_response_description,
     SourcesResponseElement,
     DestinationsResponseElement,
     RegisteredTransformation,
     LinkedLayer,
+    LayersQuery,
     CopyPreview,
     DetailedResponse,
+    SyncResponse,
+    WorkspaceCopyResponse,
+    JobStatus,
     JsonLogRecord,
     sample_json_log_records,
 )
@@ -45,9 +64,21 @@ from maelstro.common.models import (
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
 
-app = FastAPI(root_path="/maelstro-backend")
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # the DB is set up in the background, startup does not wait for it
+    start_db_logging_setup()
+    get_job_scheduler().start()
+    yield
+    get_job_scheduler().stop()
+    get_xslt_pool().shutdown()
+    stop_db_logging_setup()
+
+
+app = FastAPI(root_path="/maelstro-backend", lifespan=lifespan)
 setup_middleware(app)
-setup_db_logging()
+setup_log_dispatch()
+setup_metrics()
 
 
 @app.head("/")
@@ -143,18 +174,17 @@ def check_config(
             )
         ),
     ] = True
-) -> dict[str, bool]:
+) -> ConfigCheckResponse:
     """
     This entrypoint is meant to validate the configuration.
-    - path of the config file (tbc. security issue ??)
-    - check that the format is correct
-    - check that all mandatory information is given
-    - tell which default values are used
-    To be implemented
+    All configured geonetwork and geoserver instances (sources and destinations)
+    are contacted concurrently, each with a timeout, and reported with:
+    - reachability and latency
+    - server version
+    - status of the configured credentials
+    The result is cached for a short time (see `check_config` in the config file)
     """
-    # pylint: disable=fixme
-    # TODO: implement check of all servers configured in the config file
-    return {"test_conf.yaml": True, "check_credentials": check_credentials}
+    return check_all_servers(check_credentials)
 
 
 @app.get(
@@ -205,9 +235,16 @@ def post_search(
 ) -> Any:
     """
     Transmit search query to selected Geonetwork server select among the sources
+
+    If no `_source` projection is given, only the fields used by the UI are returned
+    (use `["*"]` to get the full documents).
+    Results are cached for a short time (see `caching.search` in the config file).
     """
-    gn = request.state.geo_handler.get_gn_service(src_name, True)
-    return gn.search(search_query.model_dump(by_alias=True, exclude_unset=True))
+    return search(
+        src_name,
+        search_query,
+        lambda: request.state.geo_handler.get_gn_service(src_name, True),
+    )
 
 
 @app.get("/sources/{src_name}/data/{uuid}/layers")
@@ -222,11 +259,45 @@ def get_layers(
     Extract linked layers from a dataset on the source Geonetwork server
     """
     gn = request.state.geo_handler.get_gn_service(src_name, True)
-    zipdata = gn.get_record_zip(uuid).read()
-    meta = Meta(zipdata)
+    meta = get_record_cache().get_meta(gn, src_name, uuid)
     return meta.get_ogc_geoserver_layers()
 
 
+@app.post(
+    "/sources/{src_name}/layers",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"uuid": "uuid1", "layers": [], "error": null}\n'
+                },
+            }
+        },
+    },
+)
+def post_layers(
+    request: Request,
+    src_name: Annotated[
+        str, Path(description="Name of the source Geonetwork to be used for the search")
+    ],
+    layers_query: Annotated[LayersQuery, Body()],
+) -> StreamingResponse:
+    """
+    Extract linked layers from several datasets on the source Geonetwork server.
+    The datasets are given as a list of uuids and/or a search query.
+    Only the xml of each record is fetched (concurrently), and one json line per
+    record is streamed as soon as available. The line of a failed record
+    contains its error and the operations logged while fetching it.
+    At most 500 records (uuids and search size) are accepted per request.
+    """
+    gn = request.state.geo_handler.get_gn_service(src_name, True)
+    uuids = get_query_uuids(gn, layers_query)
+    return StreamingResponse(
+        iter_records_layers_ndjson(gn, uuids), media_type="application/x-ndjson"
+    )
+
+
 @app.get(
     "/copy_preview",
     responses={
@@ -280,6 +351,14 @@ def get_copy_preview(
             "content": {
                 "text/plain": {"example": "string1\nstring2"},
                 "application/json": {"example": [{}]},
+                "text/event-stream": {
+                    "example": 'event: operation\ndata: {"message": "..."}\n\n'
+                    'event: result\ndata: {"status_code": 200, "summary": "..."}\n\n'
+                },
+                "application/x-ndjson": {
+                    "example": '{"event": "operation", "data": {"message": "..."}}\n'
+                    '{"event": "result", "data": {"status_code": 200, "summary": "..."}}\n'
+                },
             },
         },
         400: {
@@ -317,22 +396,60 @@ def put_dataset_copy(
             description="Enable copying styles of linked layers to destination Geoserver"
         ),
     ] = True,
+    plan_id: Annotated[
+        str | None,
+        Query(
+            description="Id of the plan returned by copy_preview, "
+            "it is used instead of querying the source servers again when still available"
+        ),
+    ] = None,
+    resume: Annotated[
+        bool,
+        Query(
+            description="Skip the styles and layers already copied by a failed copy "
+            "of the same dataset with the same parameters"
+        ),
+    ] = True,
     accept: Annotated[str, Header(include_in_schema=False)] = "text/plain",
-) -> DetailedResponse | PlainTextResponse:
+) -> DetailedResponse | PlainTextResponse | StreamingResponse:
     """
     Complex operation: copy source dataset to destination including:
     - metadata (if copy_meta == true)
     - all linked geoserver layers (if copy_layers == true)
     - all styles of linked layers (if copy_styles == true)
+
+    With `Accept: text/event-stream` (Server-Sent Events) or `application/x-ndjson`,
+    each operation is streamed as soon as it is done, followed by a `result` event
+    with the summary and timings of the copy.
     """
-    if accept not in ["text/plain", "application/json"]:
+    if accept not in ["text/plain", "application/json", *STREAM_MEDIA_TYPES]:
         raise HTTPException(
             status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             f"Unsupported media type: {accept}. "
-            'Accepts "text/plain" or "application/json"',
+            'Accepts "text/plain", "application/json", '
+            '"text/event-stream" or "application/x-ndjson"',
+        )
+    if accept in STREAM_MEDIA_TYPES:
+        copy_params = {
+            "dataset_uuid": metadataUuid,
+            "src_name": src_name,
+            "dst_name": dst_name,
+            "copy_meta": copy_meta,
+            "copy_layers": copy_layers,
+            "copy_styles": copy_styles,
+        }
+        return StreamingResponse(
+            iter_copy_events(request, accept, copy_params, plan_id, resume),
+            media_type=accept,
+            # disable the buffering of nginx proxies
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
     copy_mgr = CopyManager(src_name, dst_name, metadataUuid, request.state.geo_handler)
-    success = copy_mgr.copy_dataset(copy_meta, copy_layers, copy_styles)
+    success = copy_mgr.copy_dataset(
+        copy_meta, copy_layers, copy_styles, plan_id, resume
+    )
+    timings = request.state.geo_handler.log_handler.log_timings()
+    observe_copy(src_name, dst_name, timings)
     operations = request.state.geo_handler.log_handler.get_json_responses()
     log_request_to_db(
         200,
@@ -341,8 +458,177 @@ def put_dataset_copy(
         operations,
     )
     if accept == "application/json":
-        return DetailedResponse(summary=success, operations=operations)
-    return PlainTextResponse("\n".join(op.string_format() for op in operations))
+        return DetailedResponse(summary=success, operations=operations, timings=timings)
+    return PlainTextResponse(
+        "\n".join(
+            op.string_format()
+            for op in request.state.geo_handler.log_handler.get_records()
+        )
+    )
+
+
+@app.put(
+    "/sync",
+    response_model=SyncResponse,
+    responses={
+        200: {
+            "content": {
+                "application/json": {},
+                "text/event-stream": {
+                    "example": 'event: operation\ndata: {"message": "..."}\n\n'
+                    'event: result\ndata: {"status_code": 200, "changed": 1, ...}\n\n'
+                },
+                "application/x-ndjson": {
+                    "example": '{"event": "operation", "data": {"message": "..."}}\n'
+                    '{"event": "result", "data": {"status_code": 200, "changed": 1, ...}}\n'
+                },
+            },
+        },
+    },
+)
+def put_sync(
+    request: Request,
+    src_name: Annotated[
+        str,
+        Query(description="Name of the source Geonetwork to be synchronised"),
+    ],
+    dst_name: Annotated[
+        str,
+        Query(description="Name of the destination to be synchronised"),
+    ],
+    copy_meta: Annotated[
+        bool, Query(description="Enable copying metadata to destination Geonetwork")
+    ] = True,
+    copy_layers: Annotated[
+        bool, Query(description="Enable copying linked layers to destination Geoserver")
+    ] = True,
+    copy_styles: Annotated[
+        bool,
+        Query(
+            description="Enable copying styles of linked layers to destination Geoserver"
+        ),
+    ] = True,
+    since: Annotated[
+        str | None,
+        Query(
+            description="Copy the records changed after this date (ISO format) "
+            "instead of those changed since the last sync"
+        ),
+    ] = None,
+    dry_run: Annotated[
+        bool, Query(description="Only list the changed records, without copying")
+    ] = False,
+    search_query: Annotated[SearchQuery | None, Body()] = None,
+    accept: Annotated[str, Header(include_in_schema=False)] = "application/json",
+) -> SyncResponse | StreamingResponse:
+    """
+    Incremental sync: copy the source records (optionally restricted by a search query)
+    which changed since the last sync with the same parameters, oldest first.
+    Each record is copied as with /copy and logged separately in the DB.
+    The watermark only moves up to the change date of the oldest failed record,
+    so that failed records are copied again by the next sync.
+
+    With `Accept: text/event-stream` (Server-Sent Events) or `application/x-ndjson`,
+    the sync runs in the background and goes on if the client disconnects: the
+    result of each record is streamed as soon as it is copied, followed by a
+    `result` event with the response of the sync.
+    """
+    if accept in STREAM_MEDIA_TYPES:
+        sync_params = {
+            "src_name": src_name,
+            "dst_name": dst_name,
+            "copy_meta": copy_meta,
+            "copy_layers": copy_layers,
+            "copy_styles": copy_styles,
+            "since": since,
+            "dry_run": dry_run,
+        }
+        return StreamingResponse(
+            iter_sync_events(request, accept, sync_params, search_query),
+            media_type=accept,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    sync_mgr = SyncManager(
+        src_name,
+        dst_name,
+        request.state.geo_handler,
+        search_query,
+        get_request_user(request),
+    )
+    return sync_mgr.sync(copy_meta, copy_layers, copy_styles, since, dry_run)
+
+
+@app.put("/workspace_copy")
+def put_workspace_copy(
+    request: Request,
+    src_url: Annotated[
+        str,
+        Query(description="URL of the source Geoserver, as in the config file"),
+    ],
+    dst_name: Annotated[
+        str,
+        Query(description="Name of the destination to be used for the copy"),
+    ],
+    workspace: Annotated[
+        str, Query(description="Name of the workspace on the source Geoserver")
+    ],
+    copy_layers: Annotated[
+        bool, Query(description="Enable copying the layers of the workspace")
+    ] = True,
+    copy_styles: Annotated[
+        bool,
+        Query(
+            description="Enable copying the styles of the workspace "
+            "and the global styles of its layers"
+        ),
+    ] = True,
+    src_name: Annotated[
+        str | None,
+        Query(
+            description="Name of the source Geonetwork whose links in the resources "
+            "are replaced by links to the destination Geonetwork"
+        ),
+    ] = None,
+    force: Annotated[
+        bool,
+        Query(description="Copy again the styles and layers which did not change"),
+    ] = False,
+) -> WorkspaceCopyResponse:
+    """
+    Copy all the styles and layers of a workspace of a source Geoserver to the
+    Geoserver of a destination, where the workspace and the stores of the layers
+    must exist. The styles and layers are written concurrently, those which did not
+    change on the source since they were last copied to the destination are skipped.
+    A failed style or layer is reported in the response and does not stop the copy.
+    """
+    copy_mgr = WorkspaceCopyManager(
+        src_url, dst_name, workspace, request.state.geo_handler, src_name
+    )
+    return copy_mgr.copy_workspace(copy_layers, copy_styles, force)
+
+
+@app.get("/jobs")
+def get_jobs() -> list[JobStatus]:
+    """
+    List the recurring jobs of the config file with their next run and the result
+    of their last run
+    """
+    return get_job_scheduler().get_status()
+
+
+@app.put("/jobs/{job_name}/run", responses={404: {}, 409: {}})
+def put_job_run(
+    job_name: Annotated[str, Path(description="Name of the job in the config file")],
+) -> JobStatus:
+    """
+    Start a run of the job now, in the background
+    """
+    job = get_job_scheduler().jobs.get(job_name)
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Unknown job: {job_name}")
+    if not get_job_scheduler().trigger(job):
+        raise HTTPException(status.HTTP_409_CONFLICT, f"Job {job_name} is running")
+    return job.status
 
 
 @app.get(
@@ -383,6 +669,19 @@ def get_logs(
         raise HTTPException(500, "DB logging not configured") from err
 
 
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    responses={200: {"content": {CONTENT_TYPE_LATEST: {}}}},
+)
+def get_metrics() -> Response:
+    """
+    Metrics in Prometheus text format: copy durations, upstream latency and errors,
+    xslt durations, cache hits and DB log writes in progress
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 def health_check(
     sec_username: Annotated[str | None, Header(include_in_schema=False)] = None,
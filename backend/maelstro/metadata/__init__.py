@@ -1,3 +1,4 @@
 from .meta import MetaZip as Meta
+from .meta import MetaXml as MetaXml
 
-__all__ = ["Meta"]
+__all__ = ["Meta", "MetaXml"]
@@ -1,72 +1,100 @@
+from copy import copy
 from io import BytesIO, StringIO
+from typing import Any, Callable, Self
 from zipfile import ZipFile
 from csv import DictReader
 from maelstro.common.types import GsLayer
 from maelstro.common.models import LinkedLayer
+from maelstro.metrics import XSLT_DURATION
 from html import escape as url_escape_encode
 
+# only loads the library, the Saxon processor of a record is created on first use.
+# saxonche is not loaded lazily: loading it late can make GraalVM abort the
+# process when a worker of the xslt pool is stopped.
 from saxonche import PySaxonProcessor, PyXdmNode  # type: ignore
-
-NS_PREFIXES = {
-    "iso19139": "gmd",
-    "iso19115-3.2018": "cit",
-}
-
-NS_TITLE_PREFIXES = {
-    "iso19139": "gmd",
-    "iso19115-3.2018": "mri",
-}
-
-NS_REGISTRIES = {
-    "iso19139": {
-        "gmd": "http://www.isotc211.org/2005/gmd",
-        "gco": "http://www.isotc211.org/2005/gco",
-    },
-    "iso19115-3.2018": {
-        "mri": "http://standards.iso.org/iso/19115/-3/mri/1.0",
-        "cit": "http://standards.iso.org/iso/19115/-3/cit/2.0",
-        "gco": "http://standards.iso.org/iso/19115/-3/gco/1.0",
-        "gmd": "http://standards.iso.org/iso/19115/-3/gmd/1.0",
-    },
-}
+from .queries import (
+    DEFAULT_QUERY_BACKEND,
+    NS_PREFIXES,
+    NS_REGISTRIES,
+    NS_TITLE_PREFIXES,
+    QUERY_BACKENDS,
+    QueryBackend,
+)
 
 
 class MetaXml:
-    def __init__(self, xml_bytes: bytes, schema: str = "iso19139"):
+    def __init__(
+        self,
+        xml_bytes: bytes,
+        schema: str | None = "iso19139",
+        query_backend: str = DEFAULT_QUERY_BACKEND,
+    ):
         self.xml_bytes = xml_bytes
-        self.schema = schema
-        self.namespaces = NS_REGISTRIES.get(schema, {})
-        self.prefix = NS_PREFIXES.get(schema)
-        self.title_prefix = NS_TITLE_PREFIXES.get(schema)
-
-        # Initialize Saxon Processor
-        self.proc = PySaxonProcessor(license=False)
-        self.xpath_processor = self.proc.new_xpath_processor()
-        for prefix, uri in self.namespaces.items():
-            self.xpath_processor.declare_namespace(prefix, uri)
+        # backend of the read-only queries (see maelstro.metadata.queries)
+        self.query_backend = query_backend
+        self.queries: QueryBackend = QUERY_BACKENDS[query_backend]()
+
+        # Saxon processors, created on first use by the xslt transformations
+        # and the url replacements: the queries do not need them
+        self._proc: PySaxonProcessor | None = None
+        self._xpath_processor: Any = None
+
+        self.schema = schema or ""
+        if schema is None:
+            # e.g. plain xml records fetched without the MEF index.csv
+            self.schema = self.detect_schema()
+
+    @property
+    def namespaces(self) -> dict[str, str]:
+        return NS_REGISTRIES.get(self.schema, {})
+
+    @property
+    def prefix(self) -> str | None:
+        return NS_PREFIXES.get(self.schema)
+
+    @property
+    def title_prefix(self) -> str | None:
+        return NS_TITLE_PREFIXES.get(self.schema)
+
+    @property
+    def proc(self) -> PySaxonProcessor:
+        if self._proc is None:
+            self._proc = PySaxonProcessor(license=False)
+        return self._proc
+
+    @property
+    def xpath_processor(self) -> Any:
+        if self._xpath_processor is None:
+            self._xpath_processor = self.proc.new_xpath_processor()
+            # keep compiled xpath expressions for repeated queries
+            self._xpath_processor.set_caching(True)
+            for prefix, uri in self.namespaces.items():
+                self._xpath_processor.declare_namespace(prefix, uri)
+        return self._xpath_processor
+
+    def clone(self) -> Self:
+        """
+        Copy of the parsed metadata with its own processors, which can be
+        modified (xslt, url replacement) without affecting the original
+        """
+        cloned = copy(self)
+        # pylint: disable=protected-access
+        cloned._proc = cloned._xpath_processor = None
+        cloned.queries = QUERY_BACKENDS[self.query_backend]()
+        return cloned
 
     def _get_root(self) -> PyXdmNode:
         """Parses current xml_bytes into a Saxon XdmNode."""
         return self.proc.parse_xml(xml_text=self.xml_bytes.decode("utf-8"))
 
+    def detect_schema(self) -> str:
+        return self.queries.detect_schema(self.xml_bytes)
+
     def get_title(self) -> str:
-        root = self._get_root()
-        self.xpath_processor.set_context(xdm_item=root)
-        query = f"//{self.title_prefix}:MD_DataIdentification//{self.prefix}:title//gco:CharacterString"
-        title_node = self.xpath_processor.evaluate_single(query)
-        return title_node.string_value if title_node else ""
+        return self.queries.get_title(self.xml_bytes, self.schema)
 
     def get_ogc_geoserver_layers(self) -> list[LinkedLayer]:
-        root = self._get_root()
-        self.xpath_processor.set_context(xdm_item=root)
-        query = f"//{self.prefix}:CI_OnlineResource"
-        nodes = self.xpath_processor.evaluate(query)
-
-        return [
-            self.layerproperties_from_link(node)
-            for node in nodes
-            if self.is_ogc_layer(node)
-        ]
+        return self.queries.get_ogc_links(self.xml_bytes, self.schema)
 
     def get_gs_layers(
         self, gs_servers: list[str] | None = None
@@ -97,9 +125,11 @@ class MetaXml:
     def _apply_xslt(self, xslt_path: str) -> bytes:
         xsltproc = self.proc.new_xslt30_processor()
         root = self._get_root()
-        executable_xsl = xsltproc.compile_stylesheet(stylesheet_file=xslt_path)
+        with XSLT_DURATION.labels("compile").time():
+            executable_xsl = xsltproc.compile_stylesheet(stylesheet_file=xslt_path)
         output: str
-        output = executable_xsl.transform_to_string(xdm_node=root)
+        with XSLT_DURATION.labels("transform").time():
+            output = executable_xsl.transform_to_string(xdm_node=root)
         return output.encode("utf-8")
 
     def apply_xslt(self, xslt_path: str) -> tuple[str, str]:
@@ -108,10 +138,21 @@ class MetaXml:
         post = len(self.xml_bytes)
         return f"Before: {pre} bytes", f"After: {post} bytes"
 
-    def apply_xslt_chain(self, xslt_paths: list[str]) -> tuple[str, str]:
+    def apply_xslt_chain(
+        self,
+        xslt_paths: list[str],
+        transform: Callable[[bytes, str], bytes] | None = None,
+    ) -> tuple[str, str]:
+        """
+        Apply the stylesheets in order, with Saxon in the current thread unless
+        another transform (e.g. a process pool) is given
+        """
         pre = len(self.xml_bytes)
         for xslt_path in xslt_paths:
-            self.xml_bytes = self._apply_xslt(xslt_path)
+            if transform is None:
+                self.xml_bytes = self._apply_xslt(xslt_path)
+            else:
+                self.xml_bytes = transform(self.xml_bytes, xslt_path)
         post = len(self.xml_bytes)
         return f"Before: {pre} bytes", f"After: {post} bytes"
 
@@ -125,7 +166,7 @@ class MetaXml:
         query = (
             f"//{self.prefix}:CI_OnlineResource/{self.prefix}:linkage/{self.prefix}:URL"
         )
-        url_nodes = self.xpath_processor.evaluate(query)
+        url_nodes = self.xpath_processor.evaluate(query) or []
 
         xml_as_string = root.to_string()
 
@@ -152,45 +193,9 @@ class MetaXml:
         post = len(self.xml_bytes)
         return f"Before: {pre} bytes", f"After: {post} bytes"
 
-    def is_ogc_layer(self, link_node: PyXdmNode) -> bool:
-        protocol = self.protocol_from_link(link_node)
-        if not protocol:
-            return False
-        return protocol[:7].lower() in ["ogc:wms", "ogc:wfs", "ogc:wcs"]
-
-    def layerproperties_from_link(self, link_node: PyXdmNode) -> LinkedLayer:
-        return LinkedLayer(
-            **{
-                "server_url": self.url_from_link(link_node) or "",
-                "name": self.name_from_link(link_node) or "",
-                "description": self.desc_from_link(link_node) or "",
-                "protocol": self.protocol_from_link(link_node) or "",
-            }
-        )
-
-    def url_from_link(self, link_node: PyXdmNode) -> str | None:
-        return self.property_from_link(link_node, f"{self.prefix}:linkage")
-
-    def name_from_link(self, link_node: PyXdmNode) -> str | None:
-        return self.property_from_link(link_node, f"{self.prefix}:name")
-
-    def desc_from_link(self, link_node: PyXdmNode) -> str | None:
-        return self.property_from_link(link_node, f"{self.prefix}:description")
-
-    def protocol_from_link(self, link_node: PyXdmNode) -> str | None:
-        return self.property_from_link(link_node, f"{self.prefix}:protocol")
-
-    def property_from_link(self, link_node: PyXdmNode, tag: str) -> str | None:
-        self.xpath_processor.set_context(xdm_item=link_node)
-        # In Saxon, we query relative to the link_node
-        prop_node = self.xpath_processor.evaluate_single(
-            f"./{tag}//gco:CharacterString | ./{tag}//gmd:URL"
-        )
-        return prop_node.string_value if prop_node else None
-
 
 class MetaZip(MetaXml):
-    def __init__(self, zipfile: bytes):
+    def __init__(self, zipfile: bytes, query_backend: str = DEFAULT_QUERY_BACKEND):
         self.zipfile = zipfile
         with ZipFile(BytesIO(zipfile)) as zf:
             zip_properties = zf.read("index.csv").decode()
@@ -201,7 +206,12 @@ class MetaZip(MetaXml):
 
         schema = self.properties.get("schema", "iso19139")
 
-        super().__init__(xml_bytes, schema)
+        super().__init__(xml_bytes, schema, query_backend)
+
+    def clone(self) -> Self:
+        cloned = super().clone()
+        cloned.properties = dict(self.properties)
+        return cloned
 
     def replace_geoserver_src_by_dst_urls(
         self, mapping: dict[str, list[str]]
@@ -215,8 +225,12 @@ class MetaZip(MetaXml):
         self.update_zip()
         return ret
 
-    def apply_xslt_chain(self, xslt_paths: list[str]) -> tuple[str, str]:
-        ret = super().apply_xslt_chain(xslt_paths)
+    def apply_xslt_chain(
+        self,
+        xslt_paths: list[str],
+        transform: Callable[[bytes, str], bytes] | None = None,
+    ) -> tuple[str, str]:
+        ret = super().apply_xslt_chain(xslt_paths, transform)
         self.update_zip()
         return ret
 
@@ -0,0 +1,257 @@
+"""
+Read-only queries on metadata records: schema detection, title and OGC links
+
+The queries are evaluated by an interchangeable backend. `lxml` parses the
+record once per version of its xml and evaluates precompiled XPath 1.0
+expressions, which is much cheaper than going through the Saxon bridge for
+such simple lookups. `saxon` evaluates the same queries with Saxon, as the
+XSLT transformations and the url replacements of MetaXml always do.
+lxml is only loaded when the lxml backend first needs it.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+from threading import local
+from typing import Any, Callable
+from saxonche import PySaxonProcessor, PyXdmNode  # type: ignore
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.models import LinkedLayer
+
+SCHEMA_NAMESPACES = {
+    "http://www.isotc211.org/2005/gmd": "iso19139",
+    "http://standards.iso.org/iso/19115/-3/mdb/2.0": "iso19115-3.2018",
+}
+
+NS_PREFIXES = {
+    "iso19139": "gmd",
+    "iso19115-3.2018": "cit",
+}
+
+NS_TITLE_PREFIXES = {
+    "iso19139": "gmd",
+    "iso19115-3.2018": "mri",
+}
+
+NS_REGISTRIES = {
+    "iso19139": {
+        "gmd": "http://www.isotc211.org/2005/gmd",
+        "gco": "http://www.isotc211.org/2005/gco",
+    },
+    "iso19115-3.2018": {
+        "mri": "http://standards.iso.org/iso/19115/-3/mri/1.0",
+        "cit": "http://standards.iso.org/iso/19115/-3/cit/2.0",
+        "gco": "http://standards.iso.org/iso/19115/-3/gco/1.0",
+        "gmd": "http://standards.iso.org/iso/19115/-3/gmd/1.0",
+    },
+}
+
+OGC_PROTOCOLS = ["ogc:wms", "ogc:wfs", "ogc:wcs"]
+
+LINK_PROPERTIES = ["linkage", "name", "description", "protocol"]
+
+OGC_LINKS_QUERY = """
+for $link in //{prefix}:CI_OnlineResource
+return
+    let $protocol := {protocol}
+    return
+        if (lower-case(substring($protocol, 1, 7)) = ({protocols}))
+        then ({url}, {name}, {description}, $protocol)
+        else ()
+"""
+
+# XPath 1.0 version of the query, without lower-case() nor sequences of strings:
+# selects the OGC online resources, whose properties are read afterwards
+OGC_LINKS_XPATH = (
+    "//{prefix}:CI_OnlineResource[contains('{protocols}', concat('|',"
+    " translate(substring({protocol}, 1, 7), '{upper}', '{lower}'), '|'))]"
+)
+
+
+def detect_schema_from_namespace(namespace: str) -> str:
+    return SCHEMA_NAMESPACES.get(namespace, "iso19139")
+
+
+def title_query(schema: str) -> str:
+    prefix = NS_PREFIXES.get(schema)
+    title_prefix = NS_TITLE_PREFIXES.get(schema)
+    return (
+        f"//{title_prefix}:MD_DataIdentification//{prefix}:title//gco:CharacterString"
+    )
+
+
+def link_property_query(schema: str, tag: str, link: str = ".") -> str:
+    # first matching node in doc order
+    prefix = NS_PREFIXES.get(schema)
+    return (
+        f"string(({link}/{prefix}:{tag}//gco:CharacterString"
+        f" | {link}/{prefix}:{tag}//gmd:URL)[1])"
+    )
+
+
+class SaxonQueries:
+    """
+    Queries evaluated by a Saxon XPath processor, the record is parsed for
+    each query
+    """
+
+    def __init__(self) -> None:
+        self.proc = PySaxonProcessor(license=False)
+        self.xpath_processor = self.proc.new_xpath_processor()
+        # keep compiled xpath expressions for repeated queries
+        self.xpath_processor.set_caching(True)
+        self.schema: str | None = None
+
+    def set_context(self, xml_bytes: bytes, schema: str) -> None:
+        if schema != self.schema:
+            for prefix, uri in NS_REGISTRIES.get(schema, {}).items():
+                self.xpath_processor.declare_namespace(prefix, uri)
+            self.schema = schema
+        root: PyXdmNode = self.proc.parse_xml(xml_text=xml_bytes.decode("utf-8"))
+        self.xpath_processor.set_context(xdm_item=root)
+
+    def detect_schema(self, xml_bytes: bytes) -> str:
+        self.set_context(xml_bytes, "")
+        ns_node = self.xpath_processor.evaluate_single("namespace-uri(/*)")
+        return detect_schema_from_namespace(ns_node.string_value if ns_node else "")
+
+    def get_title(self, xml_bytes: bytes, schema: str) -> str:
+        self.set_context(xml_bytes, schema)
+        title_node = self.xpath_processor.evaluate_single(title_query(schema))
+        return title_node.string_value if title_node else ""
+
+    def get_ogc_links(self, xml_bytes: bytes, schema: str) -> list[LinkedLayer]:
+        self.set_context(xml_bytes, schema)
+        values = self.xpath_processor.evaluate(self.ogc_links_query(schema))
+        if values is None:
+            return []
+        # the query returns a flat sequence of 4 strings per OGC link
+        props = [item.string_value for item in values]
+        return [
+            LinkedLayer(
+                server_url=props[i],
+                name=props[i + 1],
+                description=props[i + 2],
+                protocol=props[i + 3],
+            )
+            for i in range(0, len(props), 4)
+        ]
+
+    @staticmethod
+    def ogc_links_query(schema: str) -> str:
+        """
+        Single XPath query returning url, name, description and protocol
+        of each OGC online resource, the protocol filtering is done in the query
+        """
+        url, name, description, protocol = (
+            link_property_query(schema, tag, "$link") for tag in LINK_PROPERTIES
+        )
+        return OGC_LINKS_QUERY.format(
+            prefix=NS_PREFIXES.get(schema),
+            protocols=", ".join(f"'{p}'" for p in OGC_PROTOCOLS),
+            url=url,
+            name=name,
+            description=description,
+            protocol=protocol,
+        )
+
+
+# lxml parsers and compiled XPath expressions must not be shared between threads
+_lxml_local = local()
+
+
+def get_lxml_parser() -> Any:
+    parser = getattr(_lxml_local, "parser", None)
+    if parser is None:
+        from lxml import etree  # type: ignore
+
+        parser = etree.XMLParser(
+            resolve_entities=False, no_network=True, huge_tree=True
+        )
+        _lxml_local.parser = parser
+    return parser
+
+
+def get_lxml_xpath(schema: str, query: str) -> Any:
+    xpaths = getattr(_lxml_local, "xpaths", None)
+    if xpaths is None:
+        xpaths = _lxml_local.xpaths = {}
+    xpath = xpaths.get((schema, query))
+    if xpath is None:
+        from lxml import etree
+
+        xpath = etree.XPath(query, namespaces=NS_REGISTRIES.get(schema, {}))
+        xpaths[(schema, query)] = xpath
+    return xpath
+
+
+class LxmlQueries:
+    """
+    Queries evaluated by lxml with precompiled XPath expressions, the record
+    is parsed once as long as its xml does not change
+    """
+
+    def __init__(self) -> None:
+        self.xml_bytes: bytes | None = None
+        self.root: Any = None
+
+    def get_root(self, xml_bytes: bytes) -> Any:
+        # xml_bytes is replaced, never modified in place, by transformations
+        if xml_bytes is not self.xml_bytes:
+            from lxml import etree
+
+            try:
+                self.root = etree.fromstring(xml_bytes, get_lxml_parser())
+            except etree.XMLSyntaxError as err:
+                raise MaelstroException(err=f"Invalid xml record: {err}") from err
+            self.xml_bytes = xml_bytes
+        return self.root
+
+    def detect_schema(self, xml_bytes: bytes) -> str:
+        from lxml import etree
+
+        namespace = etree.QName(self.get_root(xml_bytes)).namespace
+        return detect_schema_from_namespace(namespace or "")
+
+    def get_title(self, xml_bytes: bytes, schema: str) -> str:
+        title_xpath = get_lxml_xpath(schema, f"string(({title_query(schema)})[1])")
+        return str(title_xpath(self.get_root(xml_bytes)))
+
+    def get_ogc_links(self, xml_bytes: bytes, schema: str) -> list[LinkedLayer]:
+        links_xpath = get_lxml_xpath(schema, self.ogc_links_query(schema))
+        url_xpath, name_xpath, description_xpath, protocol_xpath = (
+            get_lxml_xpath(schema, link_property_query(schema, tag))
+            for tag in LINK_PROPERTIES
+        )
+        return [
+            LinkedLayer(
+                server_url=str(url_xpath(link)),
+                name=str(name_xpath(link)),
+                description=str(description_xpath(link)),
+                protocol=str(protocol_xpath(link)),
+            )
+            for link in links_xpath(self.get_root(xml_bytes))
+        ]
+
+    @staticmethod
+    def ogc_links_query(schema: str) -> str:
+        """
+        XPath query selecting the OGC online resources, the protocol filtering
+        is done in the query as in SaxonQueries.ogc_links_query
+        """
+        upper = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+        return OGC_LINKS_XPATH.format(
+            prefix=NS_PREFIXES.get(schema),
+            protocols="|" + "|".join(OGC_PROTOCOLS) + "|",
+            protocol=link_property_query(schema, "protocol"),
+            upper=upper,
+            lower=upper.lower(),
+        )
+
+
+QueryBackend = SaxonQueries | LxmlQueries
+
+QUERY_BACKENDS: dict[str, Callable[[], QueryBackend]] = {
+    "lxml": LxmlQueries,
+    "saxon": SaxonQueries,
+}
+DEFAULT_QUERY_BACKEND = "lxml"
@@ -0,0 +1,82 @@
+"""
+Functions run in the worker processes of the XSLT pool (see maelstro.core.xslt_pool)
+
+Each worker has its own Saxon processor and keeps the stylesheets it compiled,
+so that a stylesheet is compiled once per worker instead of once per record.
+This module does not depend on the config nor on the copy machinery, so that
+starting a worker does not load the rest of the backend.
+"""
+
+import os
+import resource
+from time import perf_counter
+from typing import Any
+from saxonche import PySaxonApiError, PySaxonProcessor  # type: ignore
+
+
+class XsltError(Exception):
+    """
+    Error of a stylesheet, Saxon errors cannot be sent back to the pool
+    """
+
+
+class WorkerState:
+    def __init__(self) -> None:
+        self.proc: Any = None
+        # xslt path -> modification time of the file, compiled stylesheet
+        self.stylesheets: dict[str, tuple[int, Any]] = {}
+
+
+_state = WorkerState()
+
+
+def init_worker(xslt_paths: list[str], max_memory: int | None) -> None:
+    if max_memory:
+        # saxon reserves a large address space at startup, only its
+        # allocations can be limited
+        resource.setrlimit(resource.RLIMIT_DATA, (max_memory, max_memory))
+    _state.proc = PySaxonProcessor(license=False)
+    for xslt_path in xslt_paths:
+        try:
+            get_stylesheet(xslt_path)
+        except XsltError:
+            # reported by the transformations using it
+            pass
+
+
+def get_stylesheet(xslt_path: str) -> tuple[Any, float]:
+    """
+    Compiled stylesheet, compiled again when the file was modified,
+    with the duration of its compilation
+    """
+    try:
+        mtime = os.stat(xslt_path).st_mtime_ns
+    except OSError as err:
+        raise XsltError(f"Stylesheet {xslt_path} not readable: {err}") from None
+    cached = _state.stylesheets.get(xslt_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], 0.0
+    start = perf_counter()
+    try:
+        executable = _state.proc.new_xslt30_processor().compile_stylesheet(
+            stylesheet_file=xslt_path
+        )
+    except PySaxonApiError as err:
+        raise XsltError(f"Stylesheet {xslt_path} not compiled: {err}") from None
+    _state.stylesheets[xslt_path] = (mtime, executable)
+    return executable, perf_counter() - start
+
+
+def transform(xml_bytes: bytes, xslt_path: str) -> tuple[bytes, float, float]:
+    """
+    Transformed xml, with the durations of the compilation and of the
+    transformation
+    """
+    executable, compile_duration = get_stylesheet(xslt_path)
+    start = perf_counter()
+    try:
+        root = _state.proc.parse_xml(xml_text=xml_bytes.decode("utf-8"))
+        output: str = executable.transform_to_string(xdm_node=root)
+    except PySaxonApiError as err:
+        raise XsltError(f"Transformation {xslt_path} failed: {err}") from None
+    return output.encode("utf-8"), compile_duration, perf_counter() - start
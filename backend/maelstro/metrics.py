@@ -0,0 +1,94 @@
+"""
+Prometheus metrics of the backend, exposed on /metrics
+"""
+
+import logging
+from typing import Any
+from urllib.parse import urlparse
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# logger names of the geonetwork and geoserver client libraries
+UPSTREAM_LOGGERS = {
+    "GN Session": "geonetwork",
+    "GS Session": "geoserver",
+}
+
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+COPY_DURATION = Histogram(
+    "maelstro_copy_duration_seconds",
+    "Duration of copy operations by phase (total for the whole copy)",
+    ["src", "dst", "phase"],
+    buckets=DURATION_BUCKETS,
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "maelstro_upstream_request_duration_seconds",
+    "Duration of requests to geonetwork and geoserver servers",
+    ["service", "host", "method"],
+)
+UPSTREAM_ERRORS = Counter(
+    "maelstro_upstream_errors_total",
+    "Requests to geonetwork and geoserver servers with an error status",
+    ["service", "host", "method", "status_code"],
+)
+XSLT_DURATION = Histogram(
+    "maelstro_xslt_duration_seconds",
+    "Duration of xslt stylesheet compilation and transformation",
+    ["step"],
+)
+UPSTREAM_THROTTLED = Counter(
+    "maelstro_upstream_throttled_total",
+    "Requests to geonetwork and geoserver servers delayed or backed off by the limiter",
+    ["host", "reason"],
+)
+UPSTREAM_RETRIES = Counter(
+    "maelstro_upstream_retries_total",
+    "Retried requests to geonetwork and geoserver servers",
+    ["server", "method"],
+)
+CACHE_REQUESTS = Counter(
+    "maelstro_cache_requests_total",
+    "Lookups in the internal caches",
+    ["cache", "result"],
+)
+DB_LOG_WRITES_IN_PROGRESS = Gauge(
+    "maelstro_db_log_writes_in_progress",
+    "Number of operation logs being written to the DB",
+)
+
+
+class MetricsHandler(logging.Handler):
+    """
+    Observe latency and errors of all API calls logged by the client libraries
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        response = getattr(record, "response", None)
+        elapsed = getattr(response, "elapsed", None)
+        request = getattr(response, "request", None)
+        if response is None or elapsed is None or request is None:
+            return
+        service = UPSTREAM_LOGGERS.get(record.name, record.name)
+        host = urlparse(response.url).netloc
+        UPSTREAM_REQUEST_DURATION.labels(service, host, request.method).observe(
+            elapsed.total_seconds()
+        )
+        if response.status_code >= 400:
+            UPSTREAM_ERRORS.labels(
+                service, host, request.method, str(response.status_code)
+            ).inc()
+
+
+def setup_metrics() -> None:
+    handler = MetricsHandler()
+    for logger_name in UPSTREAM_LOGGERS:
+        logging.getLogger(logger_name).addHandler(handler)
+
+
+def observe_copy(src_name: str, dst_name: str, timings: dict[str, Any]) -> None:
+    COPY_DURATION.labels(src_name, dst_name, "total").observe(
+        timings["total_ms"] / 1000
+    )
+    for phase, duration_ms in timings["phases"].items():
+        COPY_DURATION.labels(src_name, dst_name, phase).observe(duration_ms / 1000)
@@ -10,6 +10,45 @@ from maelstro.common.models import DetailedResponse
 from maelstro.common.exceptions import MaelstroException
 
 
+def get_error_response(
+    err: MaelstroException | GnException | RequestException, request: Any
+) -> tuple[int, dict[str, Any]]:
+    """
+    Status code, summary and info of the response to a failed request
+    """
+    response: dict[str, Any] = {}
+    status_code = 400
+    if isinstance(err, MaelstroException):
+        if err.details.status_code not in [400, 404]:
+            status_code = 500
+        response["summary"] = "MaelstroException"
+        response["info"] = err.details.dict()
+    if isinstance(err, GnException):
+        response["summary"] = "HTTPException"
+        response["info"] = {
+            "msg": err.detail.message,
+            "url": err.parent_request.url,
+            "content": err.detail.info,
+        }
+        if err.code != 404:
+            status_code = err.code
+    elif isinstance(err, RequestException):
+        response["summary"] = "RequestException"
+        gs_logger.debug(
+            "[%s] %s: %s",
+            request.method,
+            str(request.url),
+            err.__class__.__name__,
+            extra={"response": request},
+        )
+        response["info"] = {
+            "message": f"HTTP error {err.__class__.__name__} at {request.url}",
+            "info": str(err),
+        }
+        status_code = 500
+    return status_code, response
+
+
 def setup_middleware(app: FastAPI) -> None:
     @app.middleware("http")
     async def exception_wrapper(request: Any, call_next: Any) -> Any:
@@ -18,36 +57,9 @@ def setup_middleware(app: FastAPI) -> None:
                 request.state.geo_handler = geo_hnd
                 return await call_next(request)
             except (MaelstroException, GnException, RequestException) as err:
-                response: dict[str, Any] = {}
-                status_code = 400
-                if isinstance(err, MaelstroException):
-                    if err.details.status_code not in [400, 404]:
-                        status_code = 500
-                    response["summary"] = "MaelstroException"
-                    response["info"] = err.details.dict()
-                if isinstance(err, GnException):
-                    response["summary"] = "HTTPException"
-                    response["info"] = {
-                        "msg": err.detail.message,
-                        "url": err.parent_request.url,
-                        "content": err.detail.info,
-                    }
-                    if err.code != 404:
-                        status_code = err.code
-                elif isinstance(err, RequestException):
-                    response["summary"] = "RequestException"
-                    gs_logger.debug(
-                        "[%s] %s: %s",
-                        request.method,
-                        str(request.url),
-                        err.__class__.__name__,
-                        extra={"response": request},
-                    )
-                    response["info"] = {
-                        "message": f"HTTP error {err.__class__.__name__} at {request.url}",
-                        "info": str(err),
-                    }
-                    status_code = 500
+                status_code, response = get_error_response(err, request)
+                if "/copy" in str(request.url):
+                    response["timings"] = geo_hnd.log_handler.log_timings()
                 response["operations"] = geo_hnd.log_handler.get_json_responses()
                 if "/copy" in str(request.url):
                     log_request_to_db(
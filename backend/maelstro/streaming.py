@@ -0,0 +1,175 @@
+"""
+Progress of long copies and syncs streamed as Server-Sent Events or NDJSON
+
+The copy or sync runs in a background thread with its own collector, each
+operation is sent as soon as it is collected and the last event contains the
+result. Heartbeats keep the connection open while no operation is logged.
+"""
+
+import json
+from contextvars import copy_context
+from queue import Empty, Queue
+from threading import Thread
+from typing import Any, Callable, Iterator
+from fastapi import Request
+from geonetwork.exceptions import GnException
+from requests.exceptions import RequestException
+from maelstro.core import CopyManager
+from maelstro.core.georchestra import GeorchestraHandler
+from maelstro.core.sync import SyncManager
+from maelstro.core.operations import LogCollectionHandler, record_to_dict
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.models import SearchQuery
+from maelstro.logging.psql_logger import get_request_user, log_copy_to_db
+from maelstro.metrics import observe_copy
+from maelstro.middleware import get_error_response
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_MEDIA_TYPES = [SSE_MEDIA_TYPE, NDJSON_MEDIA_TYPE]
+HEARTBEAT_INTERVAL = 15
+
+
+def format_event(media_type: str, event: str, data: Any) -> str:
+    if media_type == SSE_MEDIA_TYPE:
+        if data is None:
+            # comment lines are ignored by the clients
+            return f": {event}\n\n"
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({"event": event, "data": data}, default=str) + "\n"
+
+
+EventQueue = Queue[tuple[str, Any]]
+
+
+def iter_events(media_type: str, run: Callable[[EventQueue], None]) -> Iterator[str]:
+    """
+    Start run in a background thread and yield the events it puts in the queue
+    up to the `result` event, which run must always send.
+    The run goes on if the client disconnects.
+    """
+    events: EventQueue = Queue()
+    Thread(target=copy_context().run, args=(run, events), daemon=True).start()
+    while True:
+        try:
+            event, data = events.get(timeout=HEARTBEAT_INTERVAL)
+        except Empty:
+            yield format_event(media_type, "heartbeat", None)
+            continue
+        yield format_event(media_type, event, data)
+        if event == "result":
+            return
+
+
+def get_collecting_handler(events: EventQueue) -> GeorchestraHandler:
+    """
+    Handler whose collector sends each operation as an event
+    """
+    geo_hnd = GeorchestraHandler(LogCollectionHandler())
+    geo_hnd.log_handler.add_listener(
+        lambda record: events.put(("operation", record_to_dict(record)))
+    )
+    return geo_hnd
+
+
+def iter_copy_events(
+    request: Request,
+    media_type: str,
+    copy_params: dict[str, Any],
+    plan_id: str | None,
+    resume: bool,
+) -> Iterator[str]:
+    """
+    Start the copy and yield its operations as events, then the result
+    """
+    user = get_request_user(request)
+
+    def run_copy(events: EventQueue) -> None:
+        geo_hnd = get_collecting_handler(events)
+        status_code = 500
+        result: dict[str, Any] = {"summary": "Internal Server Error"}
+        try:
+            result = {
+                "summary": CopyManager(
+                    copy_params["src_name"],
+                    copy_params["dst_name"],
+                    copy_params["dataset_uuid"],
+                    geo_hnd,
+                ).copy_dataset(
+                    copy_params["copy_meta"],
+                    copy_params["copy_layers"],
+                    copy_params["copy_styles"],
+                    plan_id,
+                    resume,
+                )
+            }
+            status_code = 200
+        except (MaelstroException, GnException, RequestException) as err:
+            status_code, result = get_error_response(err, request)
+        finally:
+            try:
+                result["timings"] = geo_hnd.log_handler.log_timings()
+                if status_code == 200:
+                    observe_copy(
+                        copy_params["src_name"],
+                        copy_params["dst_name"],
+                        result["timings"],
+                    )
+                log_copy_to_db(
+                    status_code,
+                    copy_params,
+                    geo_hnd.log_handler.get_properties(),
+                    geo_hnd.log_handler.get_json_responses(),
+                    *user,
+                )
+            finally:
+                geo_hnd.log_handler.close()
+                # always end the stream
+                events.put(("result", {"status_code": status_code, **result}))
+
+    return iter_events(media_type, run_copy)
+
+
+def iter_sync_events(
+    request: Request,
+    media_type: str,
+    sync_params: dict[str, Any],
+    search_query: SearchQuery | None,
+) -> Iterator[str]:
+    """
+    Start the sync and yield its operations (one per record) as events,
+    then the result. Each record is logged in the DB by the sync itself.
+    """
+    user = get_request_user(request)
+
+    def run_sync(events: EventQueue) -> None:
+        geo_hnd = get_collecting_handler(events)
+        status_code = 500
+        result: dict[str, Any] = {"summary": "Internal Server Error"}
+        try:
+            result = (
+                SyncManager(
+                    sync_params["src_name"],
+                    sync_params["dst_name"],
+                    geo_hnd,
+                    search_query,
+                    user,
+                )
+                .sync(
+                    sync_params["copy_meta"],
+                    sync_params["copy_layers"],
+                    sync_params["copy_styles"],
+                    sync_params["since"],
+                    sync_params["dry_run"],
+                )
+                .model_dump(mode="json")
+            )
+            status_code = 200
+        except (MaelstroException, GnException, RequestException) as err:
+            status_code, result = get_error_response(err, request)
+        finally:
+            geo_hnd.log_handler.close()
+            # always end the stream
+            events.put(("result", {"status_code": status_code, **result}))
+
+    return iter_events(media_type, run_sync)
@@ -0,0 +1,24 @@
+import pytest
+from maelstro.config.check import get_check_cache
+from maelstro.core.catalog import get_catalog_snapshots
+from maelstro.core.copy_plan import get_plan_cache
+from maelstro.core.descriptor_cache import get_descriptor_cache
+from maelstro.core.record_cache import get_record_cache
+from maelstro.core.search import get_search_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Each test starts with empty module-level caches, whatever the tests run before
+    """
+    for get_shared_cache in (
+        get_record_cache,
+        get_plan_cache,
+        get_search_cache,
+        get_descriptor_cache,
+        get_catalog_snapshots,
+        get_check_cache,
+    ):
+        get_shared_cache().clear()
+    yield
@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Event
+from unittest.mock import patch
+import pytest
+from maelstro.common.cache import TtlCache
+from maelstro.common.types import CacheConfig
+from requests.exceptions import ConnectionError
+from maelstro.core.record_cache import RecordCache, normalize_date
+
+
+def test_ttl():
+    cache = TtlCache(10)
+    with patch("maelstro.common.cache.monotonic", return_value=100):
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+    with patch("maelstro.common.cache.monotonic", return_value=111):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_no_ttl():
+    cache = TtlCache(0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_lru_by_size():
+    cache = TtlCache(60, max_bytes=10, sizeof=len)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.set("c", b"1234")
+    # "b" is the least recently used entry
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.total_bytes == 8
+    cache.set("d", b"12345678901")
+    assert cache.get("d") is None
+    assert cache.total_bytes == 8
+
+
+def test_max_entries():
+    cache = TtlCache(60, max_entries=2)
+    for key in "abc":
+        cache.set(key, key)
+    assert cache.get("a") is None
+    assert [cache.get(k) for k in "bc"] == ["b", "c"]
+
+
+def test_coalescing():
+    cache = TtlCache(60)
+    started = Event()
+    release = Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    with ThreadPoolExecutor(4) as executor:
+        first = executor.submit(cache.get_or_compute, "k", compute)
+        started.wait(5)
+        others = [executor.submit(cache.get_or_compute, "k", compute) for _ in range(3)]
+        release.set()
+        assert [f.result() for f in [first] + others] == ["value"] * 4
+    assert len(calls) == 1
+
+
+def test_compute_error():
+    cache = TtlCache(60)
+
+    def compute():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute("k", compute)
+    assert cache.get_or_compute("k", lambda: 1) == 1
+
+
+class FakeGn:
+    def __init__(self, zipfile, change_date):
+        self.zipfile = zipfile
+        # None when the index cannot be searched
+        self.change_date = change_date
+        self.fetches = 0
+        self.searches = 0
+
+    def get_record_zip(self, uuid):
+        self.fetches += 1
+        return BytesIO(self.zipfile)
+
+    def search(self, query):
+        self.searches += 1
+        if self.change_date is None:
+            raise ConnectionError("index down")
+        return {"hits": {"hits": [{"_source": {"dateStamp": self.change_date}}]}}
+
+
+def read_zip():
+    with open(os.path.join(os.path.dirname(__file__), "demo_iso19139.zip"), "rb") as zf:
+        return zf.read()
+
+
+def test_record_cache_change_date():
+    assert normalize_date("2024-08-22T08:47:43.000Z") == normalize_date(
+        "2024-08-22T08:47:43Z"
+    )
+    gn = FakeGn(read_zip(), "2024-08-22T08:47:43.000Z")
+    cache = RecordCache(CacheConfig(ttl=60))
+    first = cache.get_meta(gn, "src", "uuid")
+    second = cache.get_meta(gn, "src", "uuid")
+    assert gn.fetches == 1 and gn.searches == 2
+    # each caller gets its own parsed copy
+    assert first is not second
+    first.replace_geoserver_src_by_dst_urls(
+        {
+            "sources": ["https://public.sig.rennesmetropole.fr/geoserver"],
+            "destinations": ["https://prod.sig.rennesmetropole.fr/geoserver"],
+        }
+    )
+    assert cache.get_meta(gn, "src", "uuid").get_zip() == gn.zipfile
+    # same date as formatted by the MEF archive, known by the caller
+    cache.get_meta(gn, "src", "uuid", "2024-08-22T08:47:43Z")
+    assert gn.fetches == 1 and gn.searches == 3
+    # the record was modified since it was cached
+    gn.change_date = "2024-09-01T10:00:00.000Z"
+    cache.get_meta(gn, "src", "uuid")
+    assert gn.fetches == 2
+
+
+def test_record_cache_without_index():
+    gn = FakeGn(read_zip(), None)
+    cache = RecordCache(CacheConfig(ttl=60))
+    for _ in range(2):
+        assert cache.get_meta(gn, "src", "uuid").get_zip() == gn.zipfile
+    # a record without known change date is never cached
+    assert gn.fetches == 2
@@ -0,0 +1,133 @@
+from maelstro.common.types import CacheConfig, GsLayer
+from maelstro.core.catalog import (
+    CatalogSnapshots,
+    DestinationSnapshot,
+    get_list,
+    get_workspace_snapshot,
+)
+
+SRC_URL = "https://mastergs.rennesmetropole.fr/geoserver/"
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+
+class FakeRestService:
+    def __init__(self, routes):
+        self.url = SRC_URL
+        self.rest_client = self
+        self.routes = routes
+        self.calls = []
+
+    def get(self, route, headers=None):
+        self.calls.append(route)
+        if route not in self.routes:
+            return FakeResponse(None, 404)
+        return FakeResponse(self.routes[route])
+
+
+def workspace_routes():
+    return {
+        "/rest/workspaces/ws/datastores.json": {
+            "dataStores": {
+                "dataStore": {"name": "db", "href": f"{SRC_URL}rest/db.json"}
+            }
+        },
+        "/rest/workspaces/ws/datastores/db/featuretypes.json": {
+            "featureTypes": {"featureType": [{"name": "ft1"}, {"name": "ft2"}]}
+        },
+        "/rest/workspaces/ws/coveragestores.json": {
+            "coverageStores": {
+                "coverageStore": [{"name": "tif", "href": f"{SRC_URL}rest/tif.json"}]
+            }
+        },
+        "/rest/workspaces/ws/coveragestores/tif/coverages.json": {
+            "coverages": {"coverage": {"name": "cov"}}
+        },
+    }
+
+
+def test_get_list():
+    gs_src = FakeRestService(
+        {
+            "/empty.json": {"layers": ""},
+            "/single.json": {"layers": {"layer": {"name": "l1"}}},
+            "/several.json": {"layers": {"layer": [{"name": "l1"}, {"name": "l2"}]}},
+        }
+    )
+    assert get_list(gs_src, "/empty.json", "layers", "layer") == []
+    assert get_list(gs_src, "/single.json", "layers", "layer") == [{"name": "l1"}]
+    assert len(get_list(gs_src, "/several.json", "layers", "layer")) == 2
+
+
+def test_workspace_snapshot():
+    gs_src = FakeRestService(workspace_routes())
+    snapshot = get_workspace_snapshot(gs_src, "ws")
+    assert snapshot.stores == {
+        "ws:db": {
+            "@class": "dataStore",
+            "name": "ws:db",
+            "href": f"{SRC_URL}rest/db.json",
+        },
+        "ws:tif": {
+            "@class": "coverageStore",
+            "name": "ws:tif",
+            "href": f"{SRC_URL}rest/tif.json",
+        },
+    }
+    assert snapshot.resource_stores == {
+        "ws:ft1": "ws:db",
+        "ws:ft2": "ws:db",
+        "ws:cov": "ws:tif",
+    }
+    assert len(gs_src.calls) == 4
+
+
+def test_snapshot_lookups():
+    gs_src = FakeRestService(workspace_routes())
+    snapshots = CatalogSnapshots(CacheConfig(ttl=60))
+    assert snapshots.get_resource_store(gs_src, "ws:ft1")["name"] == "ws:db"
+    assert snapshots.get_resource_store(gs_src, "ws:cov")["name"] == "ws:tif"
+    # not in the snapshot: looked up by the caller
+    assert snapshots.get_resource_store(gs_src, "ws:new") is None
+    assert snapshots.get_store_workspace(gs_src, {"name": "ws:db"}) == "ws"
+    assert snapshots.get_store_workspace(gs_src, {"name": "ws:new"}) is None
+    # the workspace is listed once
+    assert len(gs_src.calls) == 4
+
+    gs_src = FakeRestService(workspace_routes())
+    snapshots = CatalogSnapshots(CacheConfig(ttl=0))
+    assert snapshots.get_resource_store(gs_src, "ws:ft1") is None
+    assert snapshots.get_store_workspace(gs_src, {"name": "ws:db"}) is None
+    assert gs_src.calls == []
+
+
+def test_destination_snapshot():
+    routes = workspace_routes()
+    routes["/rest/workspaces/ws/layers.json"] = {"layers": {"layer": {"name": "ft1"}}}
+    gs_dst = FakeRestService(routes)
+    snapshot = DestinationSnapshot(gs_dst)
+    ft_route = "/rest/workspaces/ws/datastores/db/featuretypes/{}.json"
+    assert snapshot.has_resource(ft_route.format("ft1"))
+    assert snapshot.has_resource(ft_route.format("ft2"))
+    assert not snapshot.has_resource(ft_route.format("ft3"))
+    assert snapshot.has_resource(
+        "/rest/workspaces/ws/coveragestores/tif/coverages/cov.json"
+    )
+    # missing store on the destination
+    assert not snapshot.has_resource(
+        "/rest/workspaces/ws/datastores/new/featuretypes/ft.json"
+    )
+    assert snapshot.has_resource("/rest/layers/ws:ft1") is None
+    assert snapshot.has_layer(GsLayer("ws", "ft1"))
+    assert not snapshot.has_layer(GsLayer("ws", "ft2"))
+    assert not snapshot.has_layer(GsLayer("other", "ft1"))
+    assert snapshot.has_layer(GsLayer(None, "ft1")) is None
+    # each list is fetched once
+    assert len(gs_dst.calls) == len(set(gs_dst.calls)) == 5
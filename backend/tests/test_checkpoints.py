@@ -0,0 +1,32 @@
+import os
+import time
+from maelstro.common.types import CheckpointConfig
+from maelstro.core.checkpoints import CheckpointStore, CopyCheckpoint
+
+
+def test_checkpoints(tmp_path):
+    path = os.path.join(tmp_path, "checkpoints", "checkpoints.db")
+    store = CheckpointStore(CheckpointConfig(path=path))
+    checkpoint = CopyCheckpoint(store, "copy1")
+    assert checkpoint.completed == set()
+    checkpoint.mark_completed("style|a")
+    checkpoint.mark_completed("layer|a")
+    CopyCheckpoint(store, "copy2").mark_completed("layer|b")
+
+    # checkpoints are persisted and read again by the next attempt
+    store = CheckpointStore(CheckpointConfig(path=path))
+    checkpoint = CopyCheckpoint(store, "copy1")
+    assert checkpoint.is_completed("style|a")
+    assert not checkpoint.is_completed("layer|b")
+
+    checkpoint.clear()
+    assert CopyCheckpoint(store, "copy1").completed == set()
+    assert CopyCheckpoint(store, "copy2", resume=False).completed == set()
+
+
+def test_checkpoints_expiry():
+    store = CheckpointStore(CheckpointConfig(ttl=0.05))
+    CopyCheckpoint(store, "copy1").mark_completed("style|a")
+    assert CopyCheckpoint(store, "copy1").completed == {"style|a"}
+    time.sleep(0.1)
+    assert CopyCheckpoint(store, "copy1").completed == set()
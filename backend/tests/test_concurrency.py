@@ -0,0 +1,52 @@
+import time
+from threading import Lock
+import pytest
+from maelstro.common.concurrency import TaskGraph
+
+
+def test_task_graph_order():
+    events = []
+    lock = Lock()
+
+    def task(name, duration=0.0):
+        def run():
+            with lock:
+                events.append(("start", name))
+            time.sleep(duration)
+            with lock:
+                events.append(("end", name))
+
+        return run
+
+    graph = TaskGraph()
+    graph.add("workspace", task("workspace"))
+    graph.add("style1", task("style1", 0.1), ["workspace"])
+    graph.add("style2", task("style2", 0.1), ["workspace"])
+    graph.add("layer", task("layer"), ["style1", "style2"])
+    graph.run(max_workers=4)
+
+    assert events.index(("end", "workspace")) < events.index(("start", "style1"))
+    assert events.index(("end", "style1")) < events.index(("start", "layer"))
+    assert events.index(("end", "style2")) < events.index(("start", "layer"))
+    # independent styles run concurrently
+    assert events.index(("start", "style2")) < events.index(("end", "style1"))
+
+
+def test_task_graph_error():
+    started = []
+
+    def fail():
+        raise RuntimeError("check failed")
+
+    graph = TaskGraph()
+    graph.add("check", fail)
+    graph.add("write", lambda: started.append("write"), ["check"])
+    with pytest.raises(RuntimeError, match="check failed"):
+        graph.run(max_workers=2)
+    assert started == []
+
+    graph = TaskGraph()
+    graph.add("a", lambda: None, ["b"])
+    graph.add("b", lambda: None, ["a"])
+    with pytest.raises(ValueError, match="Cyclic"):
+        graph.run(max_workers=2)
@@ -1,6 +1,8 @@
 import os
 import pytest
+import requests_mock
 from maelstro.config import Config, ConfigError
+from maelstro.config.check import check_servers
 from maelstro.common.types import Credentials, DbConfig
 
 
@@ -171,3 +173,43 @@ def test_doc_sample():
         },
         "destinations": {},
     }
+
+
+def test_all_servers():
+    conf = Config("CONFIG_PATH")
+    servers = conf.get_all_servers()
+    assert len(servers) == 11
+    assert [(s["role"], s["kind"], s["name"]) for s in servers[:3]] == [
+        ("source", "geonetwork", "GeonetworkMaster"),
+        ("source", "geonetwork", "GeonetworkRennes"),
+        ("source", "geoserver", "https://mastergs.rennesmetropole.fr/geoserver/"),
+    ]
+    assert servers[-1]["url"] == "https://public.sig.rennesmetropole.fr/geoserver"
+    assert servers[-1]["auth"] == Credentials("toto2", "Str0ng_passW0rd")
+
+
+def test_check_servers():
+    conf = Config("CONFIG_PATH")
+    servers = [
+        s for s in conf.get_all_servers()
+        if s["name"] in ["GeonetworkRennes", "PlateformePublique"]
+    ]
+    with requests_mock.Mocker() as m:
+        m.get(
+            "https://public.sig.rennesmetropole.fr/geonetwork/srv/api/site",
+            json={"system/platform/version": "4.2.2"},
+        )
+        m.get(
+            "https://public.sig.rennesmetropole.fr/geonetwork/srv/api/me",
+            status_code=204,
+        )
+        m.get(
+            "https://public.sig.rennesmetropole.fr/geoserver/rest/about/version.json",
+            status_code=401,
+        )
+        results = check_servers(servers, True, 1)
+    assert [(r.name, r.kind, r.reachable, r.auth, r.version) for r in results] == [
+        ("GeonetworkRennes", "geonetwork", True, "anonymous", "4.2.2"),
+        ("PlateformePublique", "geonetwork", True, "invalid", "4.2.2"),
+        ("PlateformePublique", "geoserver", True, "invalid", None),
+    ]
@@ -1,4 +1,5 @@
 import os
+import pytest
 import requests_mock
 
 from maelstro.core import CopyManager
@@ -70,3 +71,48 @@ def test_copy_123_iso19115():
         copy_mgr = CopyManager('GeonetworkMaster', 'CompoLocale', '123', geo_hnd)
         success = copy_mgr.copy_dataset(True, False, False)
         assert success == "Metadata creation successful (dummy_uuid)"
+
+
+@pytest.mark.usefixtures("clear_caches")
+def test_copy_with_plan():
+    # counts the fetches of the record: the record cache must start empty
+    log_handler = LogCollectionHandler()
+    geo_hnd = GeorchestraHandler(log_handler)
+
+    with open(os.path.join(os.path.dirname(__file__), 'demo_iso19139.zip'), 'rb') as zf:
+        zbytes = zf.read()
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            "https://demo.georchestra.org/geonetwork/srv/api/site",
+            json={'system/platform/version': '4.2.2'}
+        )
+        m.get(
+            "https://georchestra-127-0-0-1.nip.io/geonetwork/srv/api/site",
+            json={'system/platform/version': '4.2.2'}
+        )
+        m.get(
+            "https://demo.georchestra.org/geonetwork/srv/api/records/123",
+            content=zbytes,
+        )
+        m.post(
+            "https://georchestra-127-0-0-1.nip.io/geonetwork/srv/api/records?metadataType=METADATA&uuidProcessing=OVERWRITE",
+            json={"errors": [], "metadataInfos": {101: [{"uuid": "101"}]}}
+        )
+        m.get(
+            "https://georchestra-127-0-0-1.nip.io/geonetwork/srv/api/records/101",
+            json={"gmd:fileIdentifier": {"gco:CharacterString": {"#text": "dummy_uuid"}}}
+        )
+        copy_mgr = CopyManager('GeonetworkMaster', 'CompoLocale', '123', geo_hnd)
+        preview = copy_mgr.copy_preview(True, False, False)
+        assert preview.plan_id is not None
+        assert preview.expected_writes == ["metadata 123"]
+
+        copy_mgr = CopyManager('GeonetworkMaster', 'CompoLocale', '123', geo_hnd)
+        success = copy_mgr.copy_dataset(True, False, False, preview.plan_id)
+        assert success == "Metadata creation successful (dummy_uuid)"
+        # the record is fetched once for the preview and the copy
+        record_requests = [
+            req for req in m.request_history if req.path.endswith("/records/123")
+        ]
+        assert len(record_requests) == 1
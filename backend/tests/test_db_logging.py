@@ -0,0 +1,37 @@
+from sqlalchemy.exc import OperationalError
+from maelstro.config import app_config
+from maelstro.logging import db, psql_logger
+
+
+def test_setup_retry(monkeypatch):
+    attempts = []
+
+    def create_schema():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OperationalError("CREATE SCHEMA", {}, Exception("DB is down"))
+
+    monkeypatch.setattr(app_config, "has_db_logging", lambda: True)
+    monkeypatch.setattr(db, "create_schema", create_schema)
+    monkeypatch.setattr(db, "create_db_table", lambda: None)
+    monkeypatch.setattr(psql_logger, "SETUP_BACKOFF", 0.01)
+    psql_logger.db_ready.clear()
+    psql_logger.start_db_logging_setup()
+    assert psql_logger.db_ready.wait(5)
+    assert len(attempts) == 3
+
+
+def test_no_db_logging(monkeypatch):
+    monkeypatch.setattr(app_config, "has_db_logging", lambda: False)
+    psql_logger.setup_db_logging()
+    psql_logger.log_to_db({})
+
+
+def test_log_before_setup(monkeypatch):
+    def get_engine():
+        raise AssertionError("no DB access before the setup")
+
+    monkeypatch.setattr(app_config, "has_db_logging", lambda: True)
+    monkeypatch.setattr(db, "get_engine", get_engine)
+    psql_logger.db_ready.clear()
+    psql_logger.log_to_db({"dataset_uuid": "uuid"})
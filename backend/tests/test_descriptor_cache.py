@@ -0,0 +1,78 @@
+from requests import Response
+from maelstro.common.types import CacheConfig
+from maelstro.core.descriptor_cache import CachedRestClient, DescriptorCache
+
+
+def make_response(status_code, content=b"", headers=None):
+    response = Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeRestClient:
+    url = "https://mastergs.rennesmetropole.fr/geoserver/"
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, path, params=None, headers=None):
+        self.requests.append((path, headers))
+        return self.responses.pop(0)
+
+
+def test_revalidation():
+    rest_client = FakeRestClient(
+        [
+            make_response(200, b'{"layer": 1}', {"ETag": '"v1"'}),
+            make_response(304),
+            make_response(200, b'{"layer": 2}', {"ETag": '"v2"'}),
+        ]
+    )
+    client = CachedRestClient(rest_client, DescriptorCache(CacheConfig(ttl=60)))
+    assert client.get("/rest/layers/ws:l1.json").json() == {"layer": 1}
+    assert client.get("/rest/layers/ws:l1.json").json() == {"layer": 1}
+    assert client.get("/rest/layers/ws:l1.json").json() == {"layer": 2}
+    assert [headers for _, headers in rest_client.requests] == [
+        None,
+        {"If-None-Match": '"v1"'},
+        {"If-None-Match": '"v1"'},
+    ]
+    assert client.url == rest_client.url
+
+
+def test_ttl_without_validators():
+    rest_client = FakeRestClient(
+        [
+            make_response(200, b"<sld/>"),
+            make_response(200, b"<sld/>", {"Last-Modified": "Mon, 06 Jan 2025"}),
+            make_response(200, b"{}"),
+            make_response(200, b"<se/>"),
+        ]
+    )
+    client = CachedRestClient(rest_client, DescriptorCache(CacheConfig(ttl=60)))
+    assert client.get("/rest/styles/s1.sld").content == b"<sld/>"
+    assert client.get("/rest/styles/s1.sld").content == b"<sld/>"
+    assert len(rest_client.requests) == 1
+    # the headers of the request are part of the key
+    client.get("/rest/styles/s1.sld", headers={"Accept": "application/vnd.ogc.se+xml"})
+    assert client.get("/rest/styles/s1.sld").content == b"<sld/>"
+    assert len(rest_client.requests) == 2
+
+    # not a description, or cache deactivated
+    client.get("/rest/about/version.json")
+    client = CachedRestClient(rest_client, DescriptorCache(CacheConfig(ttl=0)))
+    assert client.get("/rest/styles/s1.sld").content == b"<se/>"
+    assert len(rest_client.requests) == 4
+
+
+def test_errors_not_cached():
+    rest_client = FakeRestClient(
+        [make_response(404), make_response(200, b"{}", {"ETag": '"v1"'})]
+    )
+    client = CachedRestClient(rest_client, DescriptorCache(CacheConfig(ttl=60)))
+    assert client.get("/rest/layers/ws:l1.json").status_code == 404
+    assert client.get("/rest/layers/ws:l1.json").status_code == 200
+    assert rest_client.requests[1] == ("/rest/layers/ws:l1.json", None)
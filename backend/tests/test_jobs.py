@@ -0,0 +1,134 @@
+from datetime import datetime
+import pytest
+from maelstro.common.types import JobConfig
+from maelstro.core.jobs import (
+    CronSchedule,
+    FileJobLock,
+    Job,
+    get_job_lock,
+    parse_cron_field,
+)
+
+
+def test_parse_cron_field():
+    assert parse_cron_field("*", 0, 3) == {0, 1, 2, 3}
+    assert parse_cron_field("*/15", 0, 59) == {0, 15, 30, 45}
+    assert parse_cron_field("1-5/2,10", 0, 59) == {1, 3, 5, 10}
+    assert parse_cron_field("50/5", 0, 59) == {50, 55}
+    with pytest.raises(ValueError):
+        parse_cron_field("60", 0, 59)
+    with pytest.raises(ValueError):
+        CronSchedule("0 2 * *")
+
+
+def test_parse_cron_ranges_steps_lists():
+    # ranges
+    assert parse_cron_field("1-5", 0, 59) == {1, 2, 3, 4, 5}
+    assert parse_cron_field("0-0", 0, 59) == {0}
+    # steps over ranges, the whole range, or from a start to the end
+    assert parse_cron_field("10-20/5", 0, 59) == {10, 15, 20}
+    assert parse_cron_field("0-10/4", 0, 59) == {0, 4, 8}
+    assert parse_cron_field("*/5", 1, 12) == {1, 6, 11}
+    assert parse_cron_field("*/1", 0, 3) == {0, 1, 2, 3}
+    # lists of values, ranges and steps
+    assert parse_cron_field("1,3,5", 0, 59) == {1, 3, 5}
+    assert parse_cron_field("5,1,5", 0, 59) == {1, 5}
+    assert parse_cron_field("1-3,20-30/5,59", 0, 59) == {1, 2, 3, 20, 25, 30, 59}
+    for invalid in ["5-1", "*/0", "1-60", "-1", "1,", "a", "1-2-3", "*/x"]:
+        with pytest.raises(ValueError):
+            parse_cron_field(invalid, 0, 59)
+    # 0 and 7 are both sunday
+    assert CronSchedule("0 0 * * 5-7").weekdays == {0, 5, 6}
+
+
+def test_next_run():
+    now = datetime(2025, 1, 31, 10, 30, 12)
+    assert CronSchedule("*/15 * * * *").next_run(now) == datetime(2025, 1, 31, 10, 45)
+    assert CronSchedule("@daily").next_run(now) == datetime(2025, 2, 1, 0, 0)
+    assert CronSchedule("0 2 * * *").next_run(now) == datetime(2025, 2, 1, 2, 0)
+    # 2025-02-03 is a monday
+    assert CronSchedule("0 2 * * 1").next_run(now) == datetime(2025, 2, 3, 2, 0)
+    assert CronSchedule("0 2 31 * *").next_run(now) == datetime(2025, 3, 31, 2, 0)
+    # day or weekday when both are restricted
+    assert CronSchedule("0 2 15 * 1").next_run(now) == datetime(2025, 2, 3, 2, 0)
+    assert CronSchedule("0 0 1 7 *").next_run(now) == datetime(2025, 7, 1, 0, 0)
+    # sunday is 0 or 7
+    assert CronSchedule("0 0 * * 7").next_run(now) == datetime(2025, 2, 2, 0, 0)
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 30 2 *").next_run(now)
+
+
+def test_day_or_weekday():
+    # 2025-06-13 is a friday
+    now = datetime(2025, 6, 1, 12, 0)
+    # both restricted: the 13th of each month or every friday
+    schedule = CronSchedule("0 0 13 * 5")
+    runs = []
+    for _ in range(4):
+        now = schedule.next_run(now)
+        runs.append(now)
+    assert runs == [
+        datetime(2025, 6, 6),
+        datetime(2025, 6, 13),
+        datetime(2025, 6, 20),
+        datetime(2025, 6, 27),
+    ]
+    assert schedule.next_run(datetime(2025, 7, 5)) == datetime(2025, 7, 11)
+    assert schedule.next_run(datetime(2025, 7, 11, 1)) == datetime(2025, 7, 13)
+    # a single restricted field
+    assert CronSchedule("0 0 13 * *").next_run(datetime(2025, 6, 1)) == datetime(
+        2025, 6, 13
+    )
+    assert CronSchedule("0 0 * * 5").next_run(datetime(2025, 6, 7)) == datetime(
+        2025, 6, 13
+    )
+    # a field starting with * is not restricted: every other day which is a monday
+    schedule = CronSchedule("0 0 */2 * 1")
+    assert schedule.next_run(datetime(2025, 6, 1)) == datetime(2025, 6, 9)
+    assert schedule.next_run(datetime(2025, 6, 9)) == datetime(2025, 6, 23)
+    # weekday ranges and lists, monday to friday
+    schedule = CronSchedule("30 8 * * 1-5")
+    assert schedule.next_run(datetime(2025, 6, 6, 9)) == datetime(2025, 6, 9, 8, 30)
+    schedule = CronSchedule("0 12 1,15 * 0,6")
+    assert schedule.next_run(datetime(2025, 6, 2)) == datetime(2025, 6, 7, 12)
+
+
+def test_file_job_lock(tmp_path):
+    lock = FileJobLock(str(tmp_path))
+    scheduled = datetime(2025, 6, 13, 2, 0)
+    with lock.acquire("nightly", scheduled) as acquired:
+        assert acquired
+        # another process runs the job (flock locks are per open file)
+        with lock.acquire("nightly", datetime(2025, 6, 14, 2, 0)) as acquired:
+            assert not acquired
+        with lock.acquire("nightly", None) as acquired:
+            assert not acquired
+        with lock.acquire("weekly", scheduled) as acquired:
+            assert acquired
+    # a process which wakes up after the end of the run does not run it again
+    with lock.acquire("nightly", scheduled) as acquired:
+        assert not acquired
+    with lock.acquire("nightly", None) as acquired:
+        assert acquired
+    with lock.acquire("nightly", datetime(2025, 6, 14, 2, 0)) as acquired:
+        assert acquired
+
+
+def test_job_locked_by_other_process():
+    job = Job(JobConfig("locked job", "src", "dst", "@daily", uuids=["uuid1"]))
+    with get_job_lock().acquire("locked job", None) as acquired:
+        assert acquired
+        assert job.try_start()
+        # the copy is not started, the job is released
+        job.run(datetime(2025, 6, 13))
+    assert not job.status.running
+    assert job.status.last_start is None
+    assert job.try_start()
+
+
+def test_job_overlap():
+    job = Job(JobConfig("nightly", "src", "dst", "@daily", uuids=["uuid1"]))
+    assert job.try_start()
+    assert job.status.running
+    assert not job.try_start()
+    assert job.status.skipped_runs == 1
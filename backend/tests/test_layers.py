@@ -0,0 +1,109 @@
+import json
+import os
+import pytest
+from zipfile import ZipFile
+from requests import Request, Response
+from maelstro.common.exceptions import ParamError
+from maelstro.common.models import LayersQuery
+from maelstro.common.types import RetryConfig, ThrottlingConfig
+from maelstro.core.layers import (
+    MAX_RECORDS,
+    get_query_uuids,
+    iter_records_layers_ndjson,
+)
+from maelstro.core.operations import LogCollectionHandler
+from maelstro.core.retry import RetryPolicy
+from maelstro.core.throttling import HostLimiter, ThrottledProxy
+
+GN_URL = "http://gn/geonetwork/srv/api"
+
+
+def read_xml():
+    with ZipFile(os.path.join(os.path.dirname(__file__), "demo_iso19139.zip")) as zf:
+        return zf.read("422a6ed5-619a-4156-8785-174d786ec95c/metadata/metadata.xml")
+
+
+class FakeSession:
+    """
+    Session answering with the queued status codes of each uuid, then 200,
+    and with the given body of each uuid, by default a valid record
+    """
+
+    def __init__(self, statuses, bodies=None):
+        self.statuses = statuses
+        self.bodies = bodies or {}
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        uuid = url.split("/")[-3]
+        response = Response()
+        queued = self.statuses.get(uuid, [])
+        response.status_code = queued.pop(0) if queued else 200
+        response.request = Request("GET", url, headers=headers).prepare()
+        response.url = url
+        response._content = (
+            self.bodies.get(uuid, read_xml()) if response.status_code == 200 else b""
+        )
+        return response
+
+
+class FakeGn:
+    def __init__(self, session):
+        self.session = session
+        self.api_url = GN_URL
+
+
+def test_layers_stream():
+    session = FakeSession({"busy": [503], "down": [503, 503, 503]})
+    gn = ThrottledProxy(
+        FakeGn(session),
+        HostLimiter("http://gn", ThrottlingConfig(backoff=0.01)),
+        RetryPolicy(GN_URL, RetryConfig(max_attempts=3, backoff=0.01)),
+    )
+    request_handler = LogCollectionHandler()
+    stream = iter_records_layers_ndjson(gn, ["busy", "down"])
+    # the stream goes on after the collector of the request is closed
+    request_handler.close()
+    lines = {line["uuid"]: line for line in (json.loads(line) for line in stream)}
+
+    # the requests of the session go through the retry policy of the client
+    assert len(lines["busy"]["layers"]) == 2
+    assert lines["busy"]["error"] is None
+    assert lines["busy"]["operations"] == []
+    assert len([url for url in session.urls if "/busy/" in url]) == 2
+
+    assert lines["down"]["layers"] == []
+    assert "/records/down/formatters/xml" in lines["down"]["error"]
+    retries = [
+        op["message"]
+        for op in lines["down"]["operations"]
+        if op["message"].startswith("Retry")
+    ]
+    assert retries == [f"Retry [GET] call to {GN_URL}"] * 2
+    assert request_handler.get_json_responses() == []
+
+
+def test_layers_stream_invalid_records():
+    session = FakeSession({}, {"empty": b"", "invalid": b"<gmd:MD_Metadata"})
+    gn = ThrottledProxy(
+        FakeGn(session),
+        HostLimiter("http://gn", ThrottlingConfig()),
+        RetryPolicy(GN_URL, RetryConfig(max_attempts=1)),
+    )
+    stream = iter_records_layers_ndjson(gn, ["empty", "invalid", "valid"])
+    lines = {line["uuid"]: line for line in (json.loads(line) for line in stream)}
+
+    # a record which cannot be parsed does not abort the stream
+    assert len(lines) == 3
+    for uuid in ("empty", "invalid"):
+        assert lines[uuid]["layers"] == []
+        assert lines[uuid]["error"].startswith("Invalid xml record")
+    assert len(lines["valid"]["layers"]) == 2
+
+
+def test_query_uuids_limit():
+    uuids = [f"uuid{i}" for i in range(MAX_RECORDS)]
+    assert get_query_uuids(None, LayersQuery(uuids=uuids)) == uuids
+    with pytest.raises(ParamError):
+        get_query_uuids(None, LayersQuery(uuids=uuids, search={"size": 1}))
@@ -1,6 +1,8 @@
 import os
-from maelstro.metadata import Meta
+from zipfile import ZipFile
+from maelstro.metadata import Meta, MetaXml
 from maelstro.common.models import LinkedLayer
+from maelstro.metadata.queries import QUERY_BACKENDS
 
 
 def test_iso19139():
@@ -86,3 +88,87 @@ def test_xslt_chain():
     )
     assert mm.xml_bytes.find(b"https://final_prod.sig.rennesmetropole.fr/geoserver") >= 0
     assert mm.xml_bytes.find("Lien de téléchargement direct (GML3 EPSG:3948)".encode()) == -1
+
+
+def test_detect_schema():
+    for zip_name, schema in [
+        ('demo_iso19139.zip', 'iso19139'),
+        ('lille_iso19115-3.zip', 'iso19115-3.2018'),
+    ]:
+        with ZipFile(os.path.join(os.path.dirname(__file__), zip_name)) as zf:
+            xml_path = next(n for n in zf.namelist() if n.endswith('/metadata.xml'))
+            mx = MetaXml(zf.read(xml_path), schema=None)
+        assert mx.schema == schema
+        assert len(mx.get_ogc_geoserver_layers()) == 2
+
+
+def test_clone():
+    with open(os.path.join(os.path.dirname(__file__), 'demo_iso19139.zip'), 'rb') as zf:
+        mm = Meta(zf.read())
+    cloned = mm.clone()
+    cloned.apply_xslt(os.path.join(os.path.dirname(__file__), "test_public_to_prod.xsl"))
+    assert cloned.xml_bytes.find(b"https://prod.sig.rennesmetropole.fr/geoserver") >= 0
+    assert mm.xml_bytes.find(b"https://prod.sig.rennesmetropole.fr/geoserver") == -1
+    assert mm.get_zip() != cloned.get_zip()
+    assert cloned.get_title() == mm.get_title()
+
+
+def test_query_backends():
+    for zip_name in ['demo_iso19139.zip', 'lille_iso19115-3.zip']:
+        with open(os.path.join(os.path.dirname(__file__), zip_name), 'rb') as zf:
+            mef = zf.read()
+        lxml_meta = Meta(mef, query_backend="lxml")
+        saxon_meta = Meta(mef, query_backend="saxon")
+        assert lxml_meta.get_title() == saxon_meta.get_title()
+        assert lxml_meta.get_ogc_geoserver_layers() == saxon_meta.get_ogc_geoserver_layers()
+        assert lxml_meta.detect_schema() == saxon_meta.detect_schema()
+
+        # queries see the xml modified by the transformations
+        cloned = lxml_meta.clone()
+        assert cloned.get_title() == lxml_meta.get_title()
+        cloned.replace_geoserver_src_by_dst_urls(
+            {
+                "sources": ["https://public.sig.rennesmetropole.fr/geoserver"],
+                "destinations": ["https://prod.sig.rennesmetropole.fr/geoserver"],
+            }
+        )
+        saxon_meta.replace_geoserver_src_by_dst_urls(
+            {
+                "sources": ["https://public.sig.rennesmetropole.fr/geoserver"],
+                "destinations": ["https://prod.sig.rennesmetropole.fr/geoserver"],
+            }
+        )
+        assert cloned.get_ogc_geoserver_layers() == saxon_meta.get_ogc_geoserver_layers()
+
+
+def test_query_backends_protocols():
+    links = "".join(
+        f"""
+        <gmd:onLine><gmd:CI_OnlineResource>
+            <gmd:linkage><gmd:URL>https://example.org/geoserver/ows</gmd:URL></gmd:linkage>
+            <gmd:protocol><gco:CharacterString>{protocol}</gco:CharacterString></gmd:protocol>
+            <gmd:name><gco:CharacterString>ws:layer{i}</gco:CharacterString></gmd:name>
+        </gmd:CI_OnlineResource></gmd:onLine>"""
+        for i, protocol in enumerate(
+            ["OGC:WMS-1.3.0-http-get-map", "ogc:wfs", "WWW:LINK", "OGC:WM", ""]
+        )
+    )
+    xml_bytes = f"""<gmd:MD_Metadata
+        xmlns:gmd="http://www.isotc211.org/2005/gmd"
+        xmlns:gco="http://www.isotc211.org/2005/gco">{links}
+    </gmd:MD_Metadata>""".encode()
+    lxml_links = QUERY_BACKENDS["lxml"]().get_ogc_links(xml_bytes, "iso19139")
+    assert [link.name for link in lxml_links] == ["ws:layer0", "ws:layer1"]
+    assert lxml_links == QUERY_BACKENDS["saxon"]().get_ogc_links(xml_bytes, "iso19139")
+
+
+def test_saxon_processor_on_demand():
+    with open(os.path.join(os.path.dirname(__file__), 'demo_iso19139.zip'), 'rb') as zf:
+        mm = Meta(zf.read())
+    xml = MetaXml(mm.xml_bytes, schema=None)
+    cloned = mm.clone()
+    assert xml.get_ogc_geoserver_layers() == cloned.get_ogc_geoserver_layers()
+    # the lxml queries need no Saxon processor
+    assert mm._proc is None and xml._proc is None and cloned._proc is None
+    cloned.replace_geoserver_src_by_dst_urls({"sources": [], "destinations": []})
+    assert cloned._proc is not None and mm._proc is None
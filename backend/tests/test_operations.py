@@ -0,0 +1,98 @@
+import logging
+from datetime import timedelta
+from requests import PreparedRequest, Response
+from maelstro.core.operations import (
+    LogCollectionHandler,
+    log_dispatcher,
+    record_to_dict,
+)
+from maelstro.common.models import InfoRecord, TimingRecord
+
+
+def make_response(method, url, status_code=200, content=b"", elapsed_ms=0):
+    response = Response()
+    response.request = PreparedRequest()
+    response.request.prepare(method=method, url=url)
+    response.url = url
+    response.status_code = status_code
+    response._content = content
+    response.elapsed = timedelta(milliseconds=elapsed_ms)
+    return response
+
+
+def emit_response(handler, logger_name, response):
+    record = logging.LogRecord(logger_name, logging.DEBUG, "", 0, "", (), None)
+    record.response = response
+    handler.emit(record)
+
+
+def test_timings():
+    handler = LogCollectionHandler()
+    emit_response(
+        handler,
+        "GN Session",
+        make_response("GET", "http://gn/api/records/1", content=b"1234", elapsed_ms=20),
+    )
+    with handler.logger_context("Layer"):
+        emit_response(
+            handler,
+            "GS Session",
+            make_response("PUT", "http://gs/rest/layers/a", elapsed_ms=30),
+        )
+        emit_response(
+            handler,
+            "GS Session",
+            make_response("PUT", "http://gs/rest/layers/b", elapsed_ms=12.5),
+        )
+
+    operations = handler.get_json_responses()
+    assert operations[0]["duration_ms"] == 20
+    assert operations[0]["size"] == 4
+    assert operations[1]["data_type"] == "Layer"
+
+    timings = handler.log_timings()
+    assert set(timings["phases"].keys()) == {"Layer"}
+    assert timings["api"] == {
+        "gn_api": {"count": 1, "duration_ms": 20, "bytes": 4},
+        "gs_api": {"count": 2, "duration_ms": 42.5, "bytes": 0},
+    }
+    assert isinstance(handler.responses[-1], TimingRecord)
+    assert handler.get_json_responses()[-1]["detail"] == timings
+
+
+def test_dispatch():
+    handler = LogCollectionHandler()
+    other_handler = LogCollectionHandler()
+    # the current context belongs to the last created collector
+    emit_response(
+        log_dispatcher, "GS Session", make_response("GET", "http://gs/rest/about")
+    )
+    assert handler.get_json_responses() == []
+    assert other_handler.get_json_responses()[0]["type"] == "gs_api"
+    assert (
+        other_handler.get_records()[0].string_format()
+        == "[GET] - (200) : http://gs/rest/about (0.0 ms)"
+    )
+
+    other_handler.close()
+    emit_response(
+        log_dispatcher, "GS Session", make_response("GET", "http://gs/rest/about")
+    )
+    assert len(other_handler.get_json_responses()) == 1
+
+    record = logging.LogRecord(
+        "GS Session", logging.INFO, "", 0, "Session %s", ("opened",), None
+    )
+    handler.emit(record)
+    assert handler.get_json_responses()[0]["message"] == "Session opened"
+
+
+def test_listener():
+    handler = LogCollectionHandler()
+    received = []
+    handler.add_listener(lambda record: received.append(record_to_dict(record)))
+    emit_response(handler, "GN Session", make_response("GET", "http://gn/api/site"))
+    handler.log_info(InfoRecord(message="Copy layer", detail={}))
+    handler.log_timings()
+    assert received == handler.get_json_responses()
+    assert [op.get("message") for op in received] == [None, "Copy layer", "Timings"]
@@ -0,0 +1,104 @@
+from requests import HTTPError, Request, Response
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+import pytest
+from maelstro.common.types import RetryConfig
+from maelstro.core.georchestra import SessionRestClient
+from maelstro.core.operations import LogCollectionHandler
+from maelstro.core.retry import RetryPolicy, get_http_method
+
+
+def make_request(method):
+    return Request(method, "http://gs/rest").prepare()
+
+
+def make_response(status_code, method="GET"):
+    response = Response()
+    response.status_code = status_code
+    response.request = make_request(method)
+    return response
+
+
+def sequence(method, *outcomes):
+    """
+    Call sending requests with the method, failing or answering in turn
+    with the outcomes (status codes or errors classes)
+    """
+    calls = []
+
+    def call():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if outcome is HTTPError:
+            raise HTTPError(response=make_response(502, method))
+        if isinstance(outcome, type):
+            raise outcome(request=make_request(method))
+        return make_response(outcome, method)
+
+    return call, calls
+
+
+def test_retry_idempotent():
+    handler = LogCollectionHandler()
+    policy = RetryPolicy("http://gs", RetryConfig(max_attempts=3, backoff=0.01))
+
+    call, calls = sequence("GET", 503, ReadTimeout, 200)
+    assert policy.call(call).status_code == 200
+    assert len(calls) == 3
+    retries = [
+        op for op in handler.get_json_responses() if op["message"].startswith("Retry")
+    ]
+    assert [op["detail"]["attempt"] for op in retries] == [1, 2]
+    assert retries[0]["detail"]["status_code"] == 503
+
+    # the last outcome is returned when all attempts failed
+    call, calls = sequence("PUT", 502, 502, 502, 200)
+    assert policy.call(call).status_code == 502
+    assert len(calls) == 3
+
+    # errors which are not transient are not retried
+    call, calls = sequence("GET", 500, 200)
+    assert policy.call(call).status_code == 500
+    assert len(calls) == 1
+
+
+def test_retry_post():
+    policy = RetryPolicy("http://gs", RetryConfig(max_attempts=3, backoff=0.01))
+
+    # the request may have been processed
+    call, calls = sequence("POST", ReadTimeout, 201)
+    with pytest.raises(ReadTimeout):
+        policy.call(call)
+    call, calls = sequence("POST", HTTPError, 201)
+    with pytest.raises(HTTPError):
+        policy.call(call)
+
+    # the request has not been processed
+    call, calls = sequence("POST", ConnectTimeout, 503, 201)
+    assert policy.call(call).status_code == 201
+    assert len(calls) == 3
+
+    # a client method sending POST requests is not retried as a GET
+    call, calls = sequence("POST", 502, 201)
+    assert policy.call(call).status_code == 502
+    assert len(calls) == 1
+
+
+def test_http_method():
+    assert get_http_method(make_response(200, "put")) == "PUT"
+    assert get_http_method(err=ReadTimeout(request=make_request("DELETE"))) == "DELETE"
+    assert get_http_method(err=HTTPError(response=make_response(502, "POST"))) == "POST"
+    # an unknown request is not considered as idempotent
+    assert get_http_method(err=ReadTimeout()) == "UNKNOWN"
+    policy = RetryPolicy("http://gs", RetryConfig(max_attempts=3, backoff=0.01))
+    assert not policy.is_retryable(err=ReadTimeout())
+
+
+def test_rest_client_timeout():
+    fast = SessionRestClient("http://127.0.0.1:9", ("user", "pwd"), timeout=2)
+    slow = SessionRestClient("http://127.0.0.1:9", ("user", "pwd"), timeout=60)
+    assert fast.session.get_adapter("http://127.0.0.1:9").timeout == 2
+    assert slow.session.get_adapter("http://127.0.0.1:9").timeout == 60
+    # the method of a failed request is read from the error
+    with pytest.raises(ConnectionError) as err:
+        fast.put("/rest/workspaces/ws.json", json={})
+    assert get_http_method(err=err.value) == "PUT"
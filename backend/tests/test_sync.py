@@ -0,0 +1,113 @@
+import os
+from unittest.mock import patch
+import pytest
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.models import SyncRecord
+from maelstro.common.types import SyncConfig
+from maelstro.core.georchestra import GeorchestraHandler
+from maelstro.core.operations import LogCollectionHandler
+from maelstro.core.sync import (
+    SyncManager,
+    WatermarkStore,
+    get_changed_records,
+    get_new_watermark,
+    get_sync_key,
+    get_watermark_store,
+)
+
+
+class SearchRecorder:
+    def __init__(self, change_dates):
+        self.change_dates = change_dates
+        self.queries = []
+
+    def search(self, query):
+        self.queries.append(query)
+        page = self.change_dates[query["from"] : query["from"] + query["size"]]
+        return {
+            "hits": {
+                "hits": [
+                    {"_id": f"uuid{i}", "_source": {"uuid": f"uuid{i}", "dateStamp": d}}
+                    for i, d in enumerate(page, query["from"])
+                ]
+            }
+        }
+
+
+def test_watermark_store(tmp_path):
+    path = os.path.join(tmp_path, "sync", "sync.db")
+    store = WatermarkStore(path)
+    assert store.get("key") is None
+    store.set("key", "2025-01-01T00:00:00")
+    store = WatermarkStore(path)
+    assert store.get("key") == "2025-01-01T00:00:00"
+    store.clear("key")
+    assert store.get("key") is None
+
+
+def test_sync_key():
+    key = get_sync_key("src", "dst", {"match_all": {}}, True, True, True)
+    assert key == get_sync_key("src", "dst", {"match_all": {}}, True, True, True)
+    assert key != get_sync_key("src", "dst", {"match_all": {}}, True, False, True)
+    assert key != get_sync_key("src", "dst", None, True, True, True)
+
+
+def test_changed_records_pages():
+    gn = SearchRecorder([f"2025-01-{day:02d}" for day in range(1, 6)])
+    records = get_changed_records(gn, None, "2024-12-31", page_size=2, max_records=4)
+    assert [rec.uuid for rec in records] == ["uuid0", "uuid1", "uuid2", "uuid3"]
+    # the next record has another change date
+    assert len(gn.queries) == 3
+    assert gn.queries[0]["query"] == {
+        "bool": {"filter": [{"range": {"dateStamp": {"gt": "2024-12-31"}}}]}
+    }
+    assert gn.queries[0]["sort"] == [{"dateStamp": "asc"}]
+
+    gn = SearchRecorder(["2025-01-01"])
+    records = get_changed_records(gn, {"match_all": {}}, None, 2, 10)
+    assert len(records) == 1
+    assert gn.queries[0]["query"] == {
+        "bool": {"filter": [], "must": [{"match_all": {}}]}
+    }
+
+
+def test_new_watermark():
+    def records(*statuses):
+        dates = ["d1", "d2", "d2", "d3"]
+        return [
+            SyncRecord(uuid=str(i), change_date=date, status=status)
+            for i, (date, status) in enumerate(zip(dates, statuses))
+        ]
+
+    assert get_new_watermark([]) is None
+    assert get_new_watermark(records("copied", "copied", "copied", "copied")) == "d3"
+    assert get_new_watermark(records("copied", "copied", "failed", "copied")) == "d1"
+    assert get_new_watermark(records("copied", "failed", "copied", "copied")) == "d1"
+    assert get_new_watermark(records("failed", "copied", "copied", "copied")) is None
+
+
+def test_changed_records_same_date():
+    gn = SearchRecorder(["d1", "d2", "d2", "d2", "d2", "d3"])
+    records = get_changed_records(gn, None, None, page_size=2, max_records=2)
+    # the next sync starts after d2, all its records are in this sync
+    assert [rec.change_date for rec in records] == ["d1", "d2", "d2", "d2", "d2"]
+
+
+def test_watermark_store_required(monkeypatch):
+    monkeypatch.setattr("maelstro.config.app_config.has_db_logging", lambda: False)
+    monkeypatch.setattr(
+        "maelstro.config.app_config.get_sync_config", lambda: SyncConfig()
+    )
+    get_watermark_store.cache_clear()
+    with pytest.raises(MaelstroException):
+        get_watermark_store()
+    get_watermark_store.cache_clear()
+
+
+def test_copy_record_error():
+    sync_mgr = SyncManager("src", "dst", GeorchestraHandler(LogCollectionHandler()))
+    record = SyncRecord(uuid="uuid0")
+    with patch("maelstro.core.sync.CopyManager", side_effect=KeyError("schema")):
+        sync_mgr.copy_record(record, True, True, True)
+    assert record.status == "failed"
+    assert record.summary == "KeyError: 'schema'"
@@ -0,0 +1,82 @@
+import time
+from threading import Thread
+from requests import Response
+from maelstro.common.types import ThrottlingConfig
+from maelstro.core.operations import LogCollectionHandler
+from maelstro.core.throttling import HostLimiter, ThrottledProxy, get_limiter
+
+
+def make_response(status_code):
+    response = Response()
+    response.status_code = status_code
+    return response
+
+
+def test_adaptive_concurrency():
+    limiter = HostLimiter("http://gs", ThrottlingConfig(max_concurrency=4, backoff=0.1))
+    handler = LogCollectionHandler()
+    client = type(
+        "Client", (), {"get": staticmethod(make_response), "url": "http://gs"}
+    )
+    proxy = ThrottledProxy(client, limiter)
+    assert proxy.url == "http://gs"
+
+    assert proxy.get(503).status_code == 503
+    assert limiter.limit == 2
+    assert limiter.backoff == 0.1
+    assert (
+        handler.get_json_responses()[-1]["message"]
+        == "http://gs is overloaded, backing off"
+    )
+
+    start = time.monotonic()
+    proxy.get(200)
+    # calls are paused during the backoff
+    assert time.monotonic() - start >= 0.09
+    proxy.get(200)
+    assert limiter.limit == 3
+    assert limiter.backoff == 0
+
+
+def test_max_concurrency():
+    limiter = HostLimiter("http://gn", ThrottlingConfig(max_concurrency=2))
+    running = []
+    max_running = []
+
+    def call():
+        running.append(1)
+        max_running.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+
+    threads = [Thread(target=limiter.call, args=(call,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(max_running) <= 2
+
+
+def test_rate():
+    limiter = HostLimiter("http://gn", ThrottlingConfig(rate=20, burst=1))
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.call(lambda: None)
+    # the first call uses the burst token, the next ones wait 50 ms each
+    assert time.monotonic() - start >= 0.19
+
+
+def test_limiter_per_host():
+    gs_limiter = get_limiter(
+        "https://per-host.example.org/geoserver", ThrottlingConfig(max_concurrency=2)
+    )
+    gn_limiter = get_limiter(
+        "https://per-host.example.org/geonetwork", ThrottlingConfig(max_concurrency=4)
+    )
+    assert gn_limiter is gs_limiter
+    assert gn_limiter.limit == 2
+    assert gn_limiter.url == "https://per-host.example.org"
+    other_limiter = get_limiter(
+        "https://other.example.org/geoserver", ThrottlingConfig(max_concurrency=2)
+    )
+    assert other_limiter is not gs_limiter
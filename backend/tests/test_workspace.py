@@ -0,0 +1,179 @@
+import os
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.types import GsLayer, WorkspaceCopyConfig
+from maelstro.core.copy_plan import GsServerPlan
+from maelstro.core.georchestra import GeorchestraHandler
+from maelstro.core.operations import LogCollectionHandler
+from maelstro.core.workspace import (
+    DigestStore,
+    WorkspaceCopyManager,
+    get_digest_store,
+    get_digest,
+)
+
+SRC_URL = "https://mastergs.rennesmetropole.fr/geoserver/"
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeRestService:
+    def __init__(self, routes):
+        self.url = SRC_URL
+        self.rest_client = self
+        self.routes = routes
+        self.calls = []
+
+    def get(self, route, headers=None):
+        self.calls.append(route)
+        return FakeResponse(self.routes[route])
+
+
+def layer(name, style):
+    return {
+        "layer": {
+            "name": name,
+            "defaultStyle": style,
+            "resource": {"@class": "featureType", "name": f"ws:{name}"},
+        }
+    }
+
+
+def test_digest_store(tmp_path):
+    path = os.path.join(tmp_path, "workspace", "digests.db")
+    store = DigestStore(WorkspaceCopyConfig(path=path))
+    assert store.get("dst", "item") is None
+    store.set("dst", "item", "digest")
+    store = DigestStore(WorkspaceCopyConfig(path=path))
+    assert store.get("dst", "item") == "digest"
+    assert store.get("other_dst", "item") is None
+    store.clear("dst", "item")
+    assert store.get("dst", "item") is None
+
+
+def test_digest():
+    digest = get_digest({"style": {"name": "s"}}, b"<sld/>", None)
+    assert digest == get_digest({"style": {"name": "s"}}, b"<sld/>", None)
+    assert digest != get_digest({"style": {"name": "s"}}, b"<sld />", None)
+    assert digest != get_digest({"style": {"name": "s"}}, b"<sld/>", "GeonetworkMaster")
+
+
+def test_workspace_plan():
+    ws_style = {"name": "ws:s1", "workspace": "ws", "href": f"{SRC_URL}rest/s1.json"}
+    global_style = {"name": "point", "href": f"{SRC_URL}rest/styles/point.json"}
+    gs_src = FakeRestService(
+        {
+            "/rest/workspaces/ws.json": {"workspace": {"name": "ws"}},
+            "/rest/workspaces/ws/layers.json": {
+                "layers": {"layer": [{"name": "l1"}, {"name": "l2"}]}
+            },
+            "/rest/layers/ws:l1.json": layer("l1", ws_style),
+            "/rest/layers/ws:l2.json": layer("l2", global_style),
+            "/rest/workspaces/ws/styles.json": {
+                "styles": {"style": {"name": "s1", "href": f"{SRC_URL}rest/s1.json"}}
+            },
+            "/rest/workspaces/ws/datastores.json": {
+                "dataStores": {
+                    "dataStore": [
+                        {"name": "db", "href": f"{SRC_URL}rest/db.json"},
+                        {"name": "unused", "href": f"{SRC_URL}rest/unused.json"},
+                    ]
+                }
+            },
+            "/rest/workspaces/ws/datastores/db/featuretypes.json": {
+                "featureTypes": {"featureType": [{"name": "l1"}, {"name": "l2"}]}
+            },
+            "/rest/workspaces/ws/datastores/unused/featuretypes.json": {
+                "featureTypes": ""
+            },
+            "/rest/workspaces/ws/coveragestores.json": {"coverageStores": ""},
+        }
+    )
+    copy_mgr = WorkspaceCopyManager(
+        SRC_URL, "CompoLocale", "ws", GeorchestraHandler(LogCollectionHandler())
+    )
+    copy_mgr.include_layers = True
+    copy_mgr.include_styles = True
+    server = copy_mgr.get_workspace_plan(gs_src)
+
+    assert server.layer_names == [GsLayer("ws", "l1"), GsLayer("ws", "l2")]
+    assert set(server.styles) == {"ws:s1", "point"}
+    assert server.styles["ws:s1"]["workspace"] == "ws"
+    assert server.workspaces == {"ws": None}
+    assert list(server.stores) == ["ws:db"]
+    assert server.resource_stores == {"ws:l1": "ws:db", "ws:l2": "ws:db"}
+    # a single call per list and per layer
+    assert len(gs_src.calls) == len(set(gs_src.calls))
+
+
+def test_skip_unchanged():
+    copy_mgr = WorkspaceCopyManager(
+        SRC_URL, "CompoLocale", "ws", GeorchestraHandler(LogCollectionHandler())
+    )
+    published = []
+
+    def publish():
+        published.append(True)
+
+    with copy_mgr.publish_item("layer", "ws:unchanged") as item:
+        copy_mgr.publish_if_changed(item, "digest1", publish)
+    assert item.status == "copied"
+    with copy_mgr.publish_item("layer", "ws:unchanged") as item:
+        copy_mgr.publish_if_changed(item, "digest1", publish)
+    assert item.status == "skipped"
+    assert len(published) == 1
+
+    copy_mgr.force = True
+    with copy_mgr.publish_item("layer", "ws:unchanged") as item:
+        copy_mgr.publish_if_changed(item, "digest1", publish)
+    assert item.status == "copied"
+    assert len(published) == 2
+
+    def fail():
+        raise MaelstroException(err="Write failed", status_code=500)
+
+    with copy_mgr.publish_item("layer", "ws:unchanged") as item:
+        copy_mgr.publish_if_changed(item, "digest2", fail)
+    assert item.status == "failed"
+    assert item.summary == "Write failed"
+    assert get_digest_store().get("CompoLocale", copy_mgr.get_item_key(item)) is None
+
+
+def test_publish_task_timings():
+    handler = LogCollectionHandler()
+    copy_mgr = WorkspaceCopyManager(
+        SRC_URL, "CompoLocale", "ws", GeorchestraHandler(handler)
+    )
+    copy_mgr.publish_task("Style", "style_step", lambda: None)()
+    copy_mgr.publish_task("Layer", "layer_step", lambda: None)()
+    assert set(handler.get_timings()["phases"]) == {"Style", "Layer"}
+
+
+def test_checks_before_writes():
+    copy_mgr = WorkspaceCopyManager(
+        SRC_URL, "CompoLocale", "ws", GeorchestraHandler(LogCollectionHandler())
+    )
+    copy_mgr.include_layers = True
+    copy_mgr.include_styles = True
+    server = GsServerPlan(
+        SRC_URL,
+        [GsLayer("ws", "l1")],
+        layers={GsLayer("ws", "l1"): layer("l1", {"name": "point"})},
+        styles={"point": {"name": "point"}, "unused": {"name": "unused"}},
+        stores={"ws:db": {"name": "ws:db"}},
+        workspaces={"ws": None},
+    )
+    graph = copy_mgr.get_publish_graph(None, server)
+    checks = {("workspace", "ws"), ("store", "ws:db")}
+    # styles which no layer depends on also wait for all the checks
+    assert graph.tasks[("style", "unused")][1] == checks
+    assert graph.tasks[("layer", GsLayer("ws", "l1"))][1] == checks | {
+        ("style", "point")
+    }
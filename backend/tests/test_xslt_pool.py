@@ -0,0 +1,104 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from maelstro.common.exceptions import MaelstroException
+from maelstro.common.types import XsltPoolConfig
+from maelstro.core.xslt_pool import XsltPool
+from maelstro.metadata import Meta
+
+TESTS_DIR = os.path.dirname(__file__)
+XSLT_CHAIN = [
+    os.path.join(TESTS_DIR, "test_public_to_prod.xsl"),
+    os.path.join(TESTS_DIR, "test_prod_to_final_prod.xsl"),
+]
+XSL_TEMPLATE = """<xsl:stylesheet version="3.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:template match="/">
+    <out><xsl:value-of select="{select}"/></out>
+  </xsl:template>
+</xsl:stylesheet>"""
+# a string of 700MB, over the memory limit
+HUNGRY_SELECT = "string-join(for $i in 1 to 100000000 return 'runaway', '')"
+# 10^12 iterations in constant memory, over the timeout
+ENDLESS_SELECT = (
+    "sum(for $i in 1 to 1000000, $j in 1 to 1000000 return ($i * $j) mod 7)"
+)
+
+# about 1.5s
+SLOW_SELECT = "sum(for $i in 1 to 12000, $j in 1 to 1000 return ($i * $j) mod 7)"
+
+
+def write_xsl(tmp_path, name, select):
+    xsl_path = os.path.join(tmp_path, name)
+    with open(xsl_path, "w", encoding="utf8") as xf:
+        xf.write(XSL_TEMPLATE.format(select=select))
+    return xsl_path
+
+
+def read_mef():
+    with open(os.path.join(TESTS_DIR, "demo_iso19139.zip"), "rb") as zf:
+        return zf.read()
+
+
+def test_pool_transform():
+    pool = XsltPool(XsltPoolConfig(workers=2), XSLT_CHAIN)
+    assert XsltPool(XsltPoolConfig(), XSLT_CHAIN).get_transform() is None
+    try:
+        in_thread = Meta(read_mef())
+        in_thread.apply_xslt_chain(XSLT_CHAIN)
+        in_pool = Meta(read_mef())
+        in_pool.apply_xslt_chain(XSLT_CHAIN, pool.get_transform())
+        assert in_pool.xml_bytes == in_thread.xml_bytes
+        assert in_pool.get_zip() == in_thread.get_zip()
+
+        with pytest.raises(MaelstroException) as err:
+            pool.transform(in_pool.xml_bytes, os.path.join(TESTS_DIR, "missing.xsl"))
+        assert "missing.xsl" in err.value.details.err
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.parametrize("select", [HUNGRY_SELECT, ENDLESS_SELECT])
+def test_pool_limits(tmp_path, select):
+    runaway_path = os.path.join(tmp_path, "runaway.xsl")
+    with open(runaway_path, "w", encoding="utf8") as xf:
+        xf.write(XSL_TEMPLATE.format(select=select))
+    pool = XsltPool(XsltPoolConfig(workers=1, max_memory_mb=256), XSLT_CHAIN)
+    xml_bytes = Meta(read_mef()).xml_bytes
+    try:
+        # the worker is started before the timeout is shortened
+        pool.transform(xml_bytes, XSLT_CHAIN[0])
+        pool.timeout = 1
+        with pytest.raises(MaelstroException) as err:
+            pool.transform(xml_bytes, runaway_path)
+        assert "stopped" in err.value.details.err
+        # a new pool is started for the next transformations
+        pool.timeout = 60
+        assert pool.transform(xml_bytes, XSLT_CHAIN[0]) != xml_bytes
+    finally:
+        pool.shutdown()
+
+
+def test_retry_stopped_transforms(tmp_path):
+    endless_path = write_xsl(tmp_path, "endless.xsl", ENDLESS_SELECT)
+    slow_path = write_xsl(tmp_path, "slow.xsl", SLOW_SELECT)
+    pool = XsltPool(XsltPoolConfig(workers=2, timeout=3), XSLT_CHAIN)
+    xml_bytes = Meta(read_mef()).xml_bytes
+
+    def slow_transform():
+        # still running when the endless transform times out
+        time.sleep(2)
+        return pool.transform(xml_bytes, slow_path)
+
+    try:
+        # the workers are started before the timeouts
+        pool.transform(xml_bytes, XSLT_CHAIN[0])
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            endless = executor.submit(pool.transform, xml_bytes, endless_path)
+            slow = executor.submit(slow_transform)
+            with pytest.raises(MaelstroException):
+                endless.result()
+            # stopped with the endless transform, then retried on a new pool
+            assert slow.result().startswith(b"<?xml")
+    finally:
+        pool.shutdown()
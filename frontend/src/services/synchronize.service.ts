@@ -8,6 +8,7 @@ export type SynchronizeParams = {
   copy_layers: boolean
   copy_styles: boolean
   dry_run: boolean
+  plan_id?: string
 }
 
 export type CopyPreviewMetadata = {
@@ -18,6 +19,7 @@ export type CopyPreviewGeonetwork = {
   src: string
   dst: string
   metadata: CopyPreviewMetadata[]
+  transformations?: string[]
 }
 
 export type CopyPreviewGeoserver = {
@@ -25,9 +27,13 @@ export type CopyPreviewGeoserver = {
   dst: string
   layers: string[]
   styles: string[]
+  stores?: string[]
+  workspaces?: string[]
 }
 
 export type CopyPreview = {
+  plan_id?: string
+  expected_writes?: string[]
   geonetwork_resources?: CopyPreviewGeonetwork[]
   geoserver_resources?: CopyPreviewGeoserver[]
   info?: {[k: string]: string}
@@ -39,9 +45,16 @@ export type CopyResponse = {
   operations: LogDetail[]
 }
 
+type CopyEvent =
+  | { event: 'operation'; data: LogDetail }
+  | { event: 'result'; data: { summary: string; info?: {[k: string]: string} } }
+  | { event: 'heartbeat'; data: null }
+
 function toSynchronizeParams(params: SynchronizeParams): URLSearchParams {
   const stringParams: Record<string, string> = Object.fromEntries(
-    Object.entries(params).map(([key, value]) => [key, String(value)]),
+    Object.entries(params)
+      .filter(([, value]) => value !== undefined)
+      .map(([key, value]) => [key, String(value)]),
   )
   return new URLSearchParams(stringParams)
 }
@@ -54,14 +67,43 @@ export const synchronizeService = {
     return await response.json()
   },
 
-  async synchronize(params: SynchronizeParams): Promise<CopyResponse> {
+  async synchronize(
+    params: SynchronizeParams,
+    onOperation?: (operation: LogDetail) => void,
+  ): Promise<CopyResponse> {
     const response = await fetch('/maelstro-backend/copy?' + toSynchronizeParams(params), {
       method: 'PUT',
       headers: {
-        Accept: 'application/json',
+        Accept: 'application/x-ndjson',
         'Content-Type': 'application/json',
       },
     })
-    return await response.json()
+    if (!response.ok || !response.body) {
+      // errors raised before the copy starts are returned as a json response
+      return await response.json()
+    }
+    // one event per line, operations are received as soon as they are done
+    const copyResponse: CopyResponse = { info: {}, operations: [] }
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+    for (;;) {
+      const { done, value } = await reader.read()
+      if (done) {
+        break
+      }
+      buffer += value
+      const lines = buffer.split('\n')
+      buffer = lines.pop() ?? ''
+      for (const line of lines.filter((line) => line.trim())) {
+        const copyEvent = JSON.parse(line) as CopyEvent
+        if (copyEvent.event === 'operation') {
+          copyResponse.operations.push(copyEvent.data)
+          onOperation?.(copyEvent.data)
+        } else if (copyEvent.event === 'result') {
+          copyResponse.info = copyEvent.data.info ?? {}
+        }
+      }
+    }
+    return copyResponse
   },
 }